@@ -0,0 +1,67 @@
+"""
+Compares the pd.json_normalize decoding path with borsdata.decode on synthetic
+stock price payloads. Run from the repository root:
+    python benchmarks/bench_decode.py
+"""
+import json
+import os
+import sys
+import time
+# runnable as a script from the repository root without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+from borsdata import decode
+from borsdata.borsdata_api import STOCK_PRICE_COLUMNS
+
+
+def synthetic_stock_prices(rows, seed=0):
+    """
+    :param rows: Number of rows (one per instrument, like instruments/stockprices/last)
+    :return: JSON body (bytes)
+    """
+    rng = np.random.default_rng(seed)
+    close = rng.uniform(1, 500, rows).round(2)
+    records = [{"i": i, "d": "2024-01-31", "h": float(c * 1.01), "l": float(c * 0.99), "c": float(c),
+                "o": float(c), "v": int(v)} for i, (c, v) in enumerate(zip(close, rng.integers(0, 10 ** 7, rows)))]
+    return json.dumps({"stockPricesList": records}).encode()
+
+
+def json_normalize_path(body):
+    json_data = json.loads(body)
+    df = pd.json_normalize(json_data["stockPricesList"])
+    df.rename(columns=STOCK_PRICE_COLUMNS, inplace=True)
+    df["date"] = pd.to_datetime(df["date"])
+    df.set_index("insId", inplace=True)
+    df.sort_index(inplace=True)
+    return df
+
+
+def decode_path(body):
+    json_data = decode.loads(body)
+    columns = decode.records_to_columns(json_data["stockPricesList"], STOCK_PRICE_COLUMNS)
+    df = decode.columns_to_frame(columns, date_columns=["date"])
+    return decode.set_index(df, "insId")
+
+
+def best_of(function, body, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(body)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    print(f"{'rows':>8} {'json_normalize':>16} {'decode':>10} {'speedup':>8}")
+    for rows in [1_000, 10_000, 100_000]:
+        body = synthetic_stock_prices(rows)
+        pd.testing.assert_frame_equal(decode_path(body), json_normalize_path(body))
+        reference = best_of(json_normalize_path, body)
+        fast = best_of(decode_path, body)
+        print(f"{rows:>8} {rows / reference:>12,.0f} r/s {rows / fast:>6,.0f} r/s {reference / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+Benchmarks of the fetch, decode and client analytics hot paths, run offline against the local
+stand-in for the API (borsdata.mock_server). Run from the repository root:
+    python benchmarks/run_benchmarks.py                        # universe of 100 instruments
+    python benchmarks/run_benchmarks.py --sizes 100 1000 10000
+    python benchmarks/run_benchmarks.py --sizes 1000 --skip create_excel_files
+    python benchmarks/run_benchmarks.py --fixtures fixtures/   # answer from recorded fixtures first
+
+The call_api benchmarks run under a limiter at the API quota (QUOTA), and without one to time the
+client alone. The Excel export runs on a universe of at most EXCEL_UNIVERSE_SIZE instruments and is
+reported under that size.
+Every benchmark runs once untimed (the stand-in fills its caches), then reports its best time of
+--repeat runs (short ones run until MIN_TIMED_SECONDS) and its peak traced memory (tracemalloc,
+measured in a separate run). Results are compared with benchmarks/baseline.json: the run fails
+(exit code 1) when a time or peak memory is more than --threshold above the baseline. Every timed
+run follows a short calibration loop, and baseline times are first scaled by the calibration of the
+same benchmark, so a slower or busier machine (also one that only slows down during part of the run)
+does not show up as a regression, except for the call_api benchmarks under the limiter, whose times
+are set by QUOTA. Increases below MIN_REGRESSION_SECONDS and MIN_REGRESSION_MB are ignored, and the
+regressed benchmarks run again (RECHECKS times) before the run fails.
+Baselines are machine specific, record one with --save-baseline before comparing. The one in the
+repository covers sizes 100, 1000 and 10000, except top_performers and breadth_large_cap_sweden at
+10000: their panels of the whole Large Cap universe peak at about 4 GB under tracemalloc, so they
+were recorded with --skip top_performers breadth_large_cap_sweden for that size.
+"""
+import argparse
+import contextlib
+import datetime as dt
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+# runnable as a script from the repository root without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import matplotlib
+matplotlib.use("Agg")
+from borsdata import constants, replay
+from borsdata.borsdata_api import BorsdataAPI
+from borsdata.borsdata_client import BorsdataClient
+from borsdata.excel_exporter import ExcelExporter
+from borsdata.mock_server import MockBorsdataServer, SyntheticUniverse
+from borsdata.rate_limiter import TokenBucket
+from borsdata.singleflight import SingleFlight
+from borsdata.transport import HttpTransport
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+# limiter that never throttles, so the benchmarks measure the client and not the API quota
+UNLIMITED = dict(rate=1e9, capacity=1e9)
+# the API quota, 100 calls per 10 seconds
+QUOTA = dict(rate=10, capacity=10)
+# calls per run under the quota, a few seconds of requests after the burst
+QUOTA_REQUESTS = 30
+# (connect, read) seconds, no read timeout: the stand-in runs in this process and answers a lot slower
+# while tracemalloc traces it
+TIMEOUT = (5, None)
+# timings of a few milliseconds vary more than the threshold between runs, smaller slowdowns are not regressions
+MIN_REGRESSION_SECONDS = 0.01
+# peaks below a megabyte vary by their rounding alone
+MIN_REGRESSION_MB = 1
+# short benchmarks run more than --repeat times, until their timed runs add up to this many seconds
+MIN_TIMED_SECONDS = 1
+# runs of the regressed benchmarks before the run fails, a thread scheduled differently or a busy neighbour
+# slows down a single run, a slower change every run
+RECHECKS = 2
+# paced by the limiter at QUOTA, their times do not depend on the speed of the machine
+UNSCALED = {"call_api_sequential", "call_api_8_threads"}
+# the Excel export writes every price row through openpyxl, so it runs on a universe of its own size
+EXCEL_UNIVERSE_SIZE = 10
+
+
+class SyntheticTransport:
+    """
+    Transport answering from a SyntheticUniverse in-process, without HTTP, to time decoding alone.
+    Bodies are encoded once, before the timed runs.
+    """
+    def __init__(self, universe):
+        self._universe = universe
+        self._bodies = {}
+
+    def get(self, url, params=None, stream=False):
+        path = replay.endpoint_path(url)
+        key = (path, tuple(sorted((params or {}).items())))
+        body = self._bodies.get(key)
+        if body is None:
+            payload = self._universe.payload(path, {name: str(value) for name, value in params.items()})
+            body = self._bodies[key] = (payload if isinstance(payload, str) else json.dumps(payload)).encode()
+        return replay.make_response(url, 200, body)
+
+    def close(self):
+        pass
+
+
+def make_api(transport=None, url_root=None, limiter=None):
+    kwargs = {"url_root": url_root} if url_root is not None else {}
+    transport = transport or HttpTransport(timeout=TIMEOUT)
+    return BorsdataAPI("benchmark", transport=transport, limiter=limiter or TokenBucket(**UNLIMITED),
+                       single_flight=SingleFlight(), **kwargs)
+
+
+def calibrate(repeat=5):
+    """
+    Time a fixed mix of interpreter and NumPy work, to compare timings taken on a faster or
+    slower (or busier) machine than the baseline
+    :return: Best seconds of repeat runs
+    """
+    import numpy as np
+    values = np.random.default_rng(0).random(1_000_000)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        total = 0
+        for i in range(300_000):
+            total += i % 7
+        np.sort(values)
+        json.loads(json.dumps([{"d": "2024-01-02", "c": 1.5, "v": i} for i in range(20_000)]))
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def measure(function, repeat):
+    """
+    :param function: Function without arguments, returns the number of items processed (or None)
+    :param repeat: Number of timed runs (more for short functions, up to MIN_TIMED_SECONDS), after one
+        untimed run that fills the caches of the stand-in
+    :return: (best seconds, peak traced bytes, items, best calibration seconds)
+    """
+    timings = []
+    calibrations = []
+    items = function()
+    while len(timings) < repeat or sum(timings) < MIN_TIMED_SECONDS:
+        # right before the timed run, for the speed of the machine at that time
+        calibrations.append(calibrate(repeat=1))
+        start = time.perf_counter()
+        items = function()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(timings), peak, items, min(calibrations)
+
+
+def call_api_benchmarks(server, size):
+    """
+    Requests/second through _call_api (limiter, retries, single flight, decode), sequential and threaded,
+    under the API quota and unlimited
+    """
+    ins_ids = list(SyntheticUniverse(size).instruments)
+
+    def calls(limiter, requests, workers):
+        def run():
+            # a fresh bucket per run, every run starts with the same burst
+            api = make_api(url_root=server.url_root, limiter=TokenBucket(**limiter))
+            urls = [f"instruments/{ins_id}/kpis/2/1year/mean" for ins_id in ins_ids[:requests]]
+            if workers == 1:
+                for url in urls:
+                    api._call_api(url)
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    list(executor.map(api._call_api, urls))
+            return len(urls)
+        return run
+
+    return {"call_api_sequential": (calls(QUOTA, QUOTA_REQUESTS, 1), "requests"),
+            "call_api_8_threads": (calls(QUOTA, QUOTA_REQUESTS, 8), "requests"),
+            "call_api_unlimited_sequential": (calls(UNLIMITED, 200, 1), "requests"),
+            "call_api_unlimited_8_threads": (calls(UNLIMITED, 200, 8), "requests")}
+
+
+def decode_benchmarks(size):
+    """
+    Decode throughput of the get_* methods, answered in-process so only decoding and frame building is timed
+    """
+    universe = SyntheticUniverse(size)
+    api = make_api(transport=SyntheticTransport(universe))
+    batch = list(universe.instruments)[:50]
+    calls = {
+        "get_instruments": lambda: api.get_instruments(),
+        "get_instruments_stock_prices_last": lambda: api.get_instruments_stock_prices_last(),
+        "get_kpi_data_all_instruments": lambda: api.get_kpi_data_all_instruments(2, "1year", "mean"),
+        "get_instrument_stock_prices": lambda: api.get_instrument_stock_prices(batch[0]),
+        "get_instrument_stock_prices_list": lambda: api.get_instrument_stock_prices_list(batch),
+        "get_instrument_stock_prices_list_stream": lambda: api.get_instrument_stock_prices_list(batch, stream=True),
+        "get_instrument_reports": lambda: api.get_instrument_reports(batch[0]),
+        "get_instrument_report_list": lambda: api.get_instrument_report_list(batch),
+        "get_kpi_history_list": lambda: api.get_kpi_history_list(batch, 2, "year", "mean"),
+    }
+
+    def rows(call):
+        def run():
+            result = call()
+            return sum(len(df) for df in result) if isinstance(result, (list, tuple)) else len(result)
+        return run
+
+    for call in calls.values():
+        # encode the payloads outside of the timed runs
+        call()
+    return {f"decode_{name}": (rows(call), "rows") for name, call in calls.items()}
+
+
+def client_benchmarks(server):
+    """
+    End-to-end time of the client analytics, over HTTP to the stand-in
+    """
+    def client():
+        return BorsdataClient(make_api(url_root=server.url_root))
+
+    def quiet(function):
+        def run():
+            with contextlib.redirect_stdout(io.StringIO()):
+                function()
+        return run
+
+    return {
+        "instruments_with_meta_data": (quiet(lambda: client().instruments_with_meta_data()), None),
+        "top_performers": (quiet(lambda: client().top_performers("Large Cap", "Sverige", 10, 1)), None),
+        "history_kpi": (quiet(lambda: client().history_kpi(2, "Large Cap", "Sverige", 2023)), None),
+        "breadth_large_cap_sweden": (quiet(lambda: client().breadth_large_cap_sweden()), None),
+    }
+
+
+def excel_benchmarks(excel_server, export_path):
+    """
+    End-to-end time of the Excel export, over HTTP to the stand-in.
+    Peak memory covers the parent process only, not the writer processes.
+    """
+    def create_excel_files():
+        with contextlib.redirect_stdout(io.StringIO()):
+            constants.EXPORT_PATH = tempfile.mkdtemp(dir=export_path) + "/"
+            ExcelExporter(make_api(url_root=excel_server.url_root)).create_excel_files()
+
+    return {"create_excel_files": (create_excel_files, None)}
+
+
+def run(sizes, repeat, fixtures=None, skip=(), only=None):
+    """
+    :param only: Keys of the benchmarks to run, all of them when None
+    :return: dict of '<benchmark>[<size>]' -> dict of seconds, peak_mb and throughput
+    """
+    results = {}
+    export_path = tempfile.mkdtemp()
+    original_export_path = constants.EXPORT_PATH
+    constants.EXPORT_PATH = export_path + "/"
+    try:
+        for size in sizes:
+            excel_size = min(size, EXCEL_UNIVERSE_SIZE)
+            with MockBorsdataServer(fixtures=fixtures, universe_size=size) as server, \
+                    MockBorsdataServer(fixtures=fixtures, universe_size=excel_size) as excel_server:
+                # keyed by the universe size each benchmark actually runs on
+                benchmarks = {f"{name}[{size}]": (name, benchmark) for name, benchmark in
+                              {**call_api_benchmarks(server, size), **decode_benchmarks(size),
+                               **client_benchmarks(server)}.items()}
+                benchmarks.update({f"{name}[{excel_size}]": (name, benchmark) for name, benchmark in
+                                   excel_benchmarks(excel_server, export_path).items()})
+                for key, (name, (function, unit)) in benchmarks.items():
+                    # the export runs on the same universe for every size above EXCEL_UNIVERSE_SIZE
+                    if name in skip or key in results or (only is not None and key not in only):
+                        continue
+                    seconds, peak, items, calibration = measure(function, repeat)
+                    results[key] = {"seconds": round(seconds, 4), "peak_mb": round(peak / 2 ** 20, 2),
+                                    "calibration_seconds": round(calibration, 4)}
+                    if unit is not None:
+                        results[key]["throughput"] = f"{items / seconds:,.0f} {unit}/s"
+                    print(f"{key:<55} {seconds:>9.3f} s {peak / 2 ** 20:>9.1f} MB  {results[key].get('throughput', '')}")
+    finally:
+        constants.EXPORT_PATH = original_export_path
+    return results
+
+
+def compare(results, baseline, threshold, speed=1.0):
+    """
+    :param speed: Calibration time of this run over the one of the baseline, baseline times are scaled by it
+        for results without a calibration of their own (in this run and in the baseline)
+    :return: List of (key, message) of the results more than threshold (and MIN_REGRESSION_SECONDS or
+        MIN_REGRESSION_MB) above the baseline
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        for metric in ["seconds", "peak_mb"]:
+            scale = speed
+            if key.split("[")[0] in UNSCALED:
+                scale = 1
+            elif "calibration_seconds" in result and "calibration_seconds" in baseline[key]:
+                scale = result["calibration_seconds"] / baseline[key]["calibration_seconds"]
+            reference = baseline[key][metric] * (scale if metric == "seconds" else 1)
+            if result[metric] - reference < (MIN_REGRESSION_SECONDS if metric == "seconds" else MIN_REGRESSION_MB):
+                continue
+            if reference > 0 and result[metric] > reference * (1 + threshold):
+                regressions.append((key, f"{key} {metric}: {result[metric]} vs baseline {reference:.4g} "
+                                   f"(+{result[metric] / reference - 1:.0%})"))
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__)).stdout.strip()
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100], help="Synthetic universe sizes")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark, the best one counts")
+    parser.add_argument("--fixtures", help="Directory of recorded fixtures for the stand-in to answer from")
+    parser.add_argument("--skip", nargs="*", default=[], help="Benchmark names to skip")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline results file")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed regression, 0.25 for +25%%")
+    parser.add_argument("--history", help="JSON lines file to append the results of this run to")
+    args = parser.parse_args()
+
+    calibration = calibrate()
+    results = run(args.sizes, args.repeat, args.fixtures, set(args.skip))
+    # the slower of the two, a machine busy during the run counts as slow
+    calibration = max(calibration, calibrate())
+    if args.history:
+        with open(args.history, "a") as file:
+            file.write(json.dumps({"time": dt.datetime.now().isoformat(timespec="seconds"), "commit": git_commit(),
+                                   "python": platform.python_version(), "results": results}) + "\n")
+    baseline = {}
+    baseline_calibration = calibration
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            saved = json.load(file)
+        baseline = saved["results"]
+        baseline_calibration = saved.get("calibration_seconds", calibration)
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump({"commit": git_commit(), "python": platform.python_version(),
+                       "calibration_seconds": round(calibration, 4), "results": {**baseline, **results}},
+                      file, indent=2, sort_keys=True)
+            file.write("\n")
+        return 0
+    speed = calibration / baseline_calibration
+    print(f"calibration {calibration:.3f} s, {speed:.2f}x the baseline's")
+    regressions = compare(results, baseline, args.threshold, speed)
+    for _ in range(RECHECKS):
+        if not regressions:
+            break
+        for _, message in regressions:
+            print(f"rechecking {message}")
+        results = run(args.sizes, args.repeat, args.fixtures, set(args.skip), only={key for key, _ in regressions})
+        regressions = compare(results, baseline, args.threshold, speed)
+    for _, message in regressions:
+        print(f"REGRESSION {message}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,114 @@
-import requests
-import pandas as pd
+import functools
+import json
+import logging
+import threading
 import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from borsdata import constants as constants
+from borsdata.transport import HttpTransport
+from borsdata.rate_limiter import get_shared_limiter, backoff_delay, retry_after_seconds
+from borsdata.singleflight import get_shared_single_flight
+from borsdata.metrics import Metrics
+from borsdata.cache import endpoint_template
+from borsdata import decode, dtypes, streaming
+from borsdata.lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+# max. number of instruments the API accepts in one instList parameter
+INSTLIST_MAX_SIZE = 50
+
+# compact JSON keys -> column names
+STOCK_PRICE_COLUMNS = {"d": "date", "i": "insId", "c": "close", "h": "high", "l": "low", "o": "open", "v": "volume"}
+KPI_VALUE_COLUMNS = {"i": "insId", "n": "valueNum", "s": "valueStr"}
+KPI_HISTORY_COLUMNS = {"y": "year", "p": "period", "v": "kpiValue"}
+REPORT_DATE_COLUMNS = ["reportStartDate", "reportEndDate", "reportDate"]
 
-# pandas options for string representation of data frames (print)
-pd.set_option("display.max_columns", None)
-pd.set_option("display.max_rows", None)
+# result formats of the get_* methods: 'frame' for pd.DataFrames, 'dict' for dicts of column name -> list
+# of JSON values, 'numpy' for dicts of column name -> typed np.ndarray. Columns are neither indexed nor
+# sorted (payload order), and building them does not need pandas.
+FORMATS = ["frame", "dict", "numpy"]
+
+
+def _measure_frame(method):
+    """
+    Record the time a get_* method spends outside its API calls (limiter, request and JSON decoding),
+    i.e. building its result, as a 'frame' span under the endpoint it called last
+    """
+    @functools.wraps(method)
+    def measured(self, *args, **kwargs):
+        local = self._local
+        outer = getattr(local, "api_seconds", None)
+        local.api_seconds = 0.0
+        local.endpoint = None
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            if local.endpoint is not None:
+                self.metrics.record("frame", local.endpoint, max(elapsed - local.api_seconds, 0), method=method.__name__)
+            # a nested get_* call counts as API time of the outer one
+            local.api_seconds = None if outer is None else outer + elapsed
+    return measured
 
 
 class BorsdataAPI:
-    def __init__(self, _api_key):
+    def __init__(self, _api_key, transport=None, pool_size=10, timeout=(5, 30),
+                 url_root="https://apiservice.borsdata.se/v1/", limiter=None, max_retries=3, max_workers=4,
+                 cache=None, dtype_policy=None, single_flight=None, metrics=None):
+        """
+        :param _api_key: Börsdata API key
+        :param transport: Object with get(url, params)/close(), default a pooled HttpTransport
+        :param pool_size: Max. number of pooled keep-alive connections (default transport only)
+        :param timeout: Request timeout in seconds or (connect, read) tuple (default transport only)
+        :param url_root: API root URL, e.g. a local stand-in server
+        :param limiter: TokenBucket, default the limiter shared by all instances in the process
+        :param max_retries: Max. number of retries on 429 and 5xx responses
+        :param max_workers: Max. number of concurrent requests when splitting instList calls
+        :param cache: ResponseCache for raw responses, None to always call the API
+        :param dtype_policy: None for the dtypes inferred from the JSON values, 'compact' for int32 ids,
+            int16 year/period, float32 prices/values, uint32 volume and categorical strings
+        :param single_flight: SingleFlight coalescing concurrent identical calls, default the one shared
+            by all instances in the process
+        :param metrics: Metrics to record per-endpoint counters and spans in, default a new one (api.metrics)
+        """
         self._api_key = _api_key
-        self._url_root = "https://apiservice.borsdata.se/v1/"
-        self._last_api_call = 0
-        self._api_calls_per_second = 10
+        self._url_root = url_root
+        self._limiter = limiter if limiter is not None else get_shared_limiter()
+        self._max_retries = max_retries
+        self._max_workers = max_workers
+        self._cache = cache
+        self._single_flight = single_flight if single_flight is not None else get_shared_single_flight()
+        self._schemas = dtypes.get_schemas(dtype_policy)
+        self.metrics = metrics if metrics is not None else Metrics()
+        # per thread: seconds spent in API calls by the running get_* method, for its frame build time
+        self._local = threading.local()
+        # screener values by (kpi_id, calc_group, calc), valid for one KPI calculation
+        self._kpi_values = {}
+        self._kpi_values_updated = None
+        self._kpi_values_lock = threading.Lock()
         self._params = {'authKey': self._api_key, 'maxYearCount': 20, 'maxR12QCount': 40, 'maxCount': 20}
+        if transport is None:
+            transport = HttpTransport(pool_size=pool_size, timeout=timeout)
+        self._transport = transport
+
+    def close(self):
+        """
+        Close the underlying transport and its pooled connections
+        """
+        self._transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def _call_api(self, url, **kwargs):
         """
@@ -23,17 +117,192 @@ class BorsdataAPI:
         :params: Additional URL parameters
         :return: JSON-encoded content, if any
         """
-        current_time = time.time()
-        time_delta = current_time - self._last_api_call
-        if time_delta < 1 / self._api_calls_per_second:
-            time.sleep(1 / self._api_calls_per_second - time_delta)
-        response = requests.get(self._url_root + url, self._get_params(**kwargs))
-        print(response.url)
-        self._last_api_call = time.time()
-        if response.status_code != 200:
-            print(f"API-Error, status code: {response.status_code}")
-            return response
-        return response.json()
+        params = self._get_params(**kwargs)
+        # concurrent identical calls share one request and one parsed result
+        key = (self._url_root + url, tuple(sorted(params.items())))
+        fetched = []
+
+        def fetch():
+            fetched.append(True)
+            return self._fetch(url, params)
+
+        with self._timed_api_call(url):
+            json_data = self._single_flight.do(key, fetch)
+        if not fetched:
+            self.metrics.add(endpoint_template(url), coalesced=1)
+        return json_data
+
+    def _fetch(self, url, params):
+        """
+        Get a response from the cache or the API
+        :param url: URL add to URL root
+        :param params: URL parameters
+        :return: JSON-encoded content
+        """
+        endpoint = endpoint_template(url)
+        if self._cache is not None:
+            body = self._cache.get(url, params)
+            if body is not None:
+                self.metrics.add(endpoint, cache_hits=1)
+                with self.metrics.span("decode", endpoint):
+                    return decode.loads(body)
+        response = self._request(url, params)
+        if self._cache is not None:
+            self._cache.put(url, params, response.content)
+        with self.metrics.span("decode", endpoint):
+            return decode.loads(response.content)
+
+    def _call_api_stream(self, url, **kwargs):
+        """
+        Internal function for API calls whose body is parsed incrementally. Concurrent identical calls
+        share one request, like _call_api, and complete bodies are stored in the cache.
+        :param url: URL add to URL root
+        :params: Additional URL parameters
+        :return: Iterator of raw body chunks, closing the response when it is closed or read to the end
+        """
+        params = self._get_params(**kwargs)
+        endpoint = endpoint_template(url)
+        key = (self._url_root + url, tuple(sorted(params.items())), "stream")
+        fetched = []
+
+        def fetch():
+            fetched.append(True)
+            if self._cache is not None:
+                body = self._cache.get(url, params)
+                if body is not None:
+                    self.metrics.add(endpoint, cache_hits=1)
+                    return streaming.SharedStream([body])
+            with self._timed_api_call(url):
+                response = self._request(url, params, stream=True)
+
+            def chunks():
+                for chunk in response.iter_content(chunk_size=256 * 1024):
+                    self.metrics.add(endpoint, bytes=len(chunk))
+                    yield chunk
+            on_complete = None if self._cache is None else lambda body: self._cache.put(url, params, body)
+            return streaming.SharedStream(chunks(), close=response.close, on_complete=on_complete)
+
+        stream = self._single_flight.do(key, fetch, on_land=lambda stream, readers: stream.share(readers))
+        if not fetched:
+            self.metrics.add(endpoint, coalesced=1)
+        return stream.reader()
+
+    def _request(self, url, params, stream=False):
+        """
+        Send a request under the rate limit, retrying on 429 and 5xx responses
+        :param url: URL add to URL root
+        :param params: URL parameters
+        :param stream: True to leave the body unread
+        :return: requests.Response with status 200, requests.HTTPError is raised for other responses
+            once the retries are used up
+        """
+        endpoint = endpoint_template(url)
+        for attempt in range(self._max_retries + 1):
+            self.metrics.add(endpoint, limiter_wait_seconds=self._limiter.acquire())
+            with self.metrics.span("request", endpoint, attempt=attempt) as span:
+                response = self._transport.get(self._url_root + url, params, stream=stream)
+                span["status"] = response.status_code
+                # streamed bodies are counted while they are read
+                span["bytes"] = 0 if stream else len(response.content)
+            logger.debug("GET %s %s", response.url, response.status_code)
+            if response.status_code == 200:
+                return response
+            if attempt == self._max_retries:
+                break
+            if response.status_code != 429 and response.status_code < 500:
+                break
+            # an unread streamed body keeps its pooled connection until closed
+            response.close()
+            self.metrics.add(endpoint, retries=1)
+            if response.status_code == 429:
+                # too many requests, hold back every caller sharing the limiter
+                self._limiter.pause(retry_after_seconds(response))
+            else:
+                time.sleep(backoff_delay(attempt))
+        logger.warning("API-Error, status code: %s, %s", response.status_code, url)
+        if stream:
+            # read the error body, which releases the connection and keeps it on the raised error
+            response.content
+        response.raise_for_status()
+        # other non-200 codes (e.g. 204) have no content to decode either
+        raise requests.HTTPError(f"{response.status_code} for url: {response.url}", response=response)
+
+    @contextmanager
+    def _timed_api_call(self, url):
+        """
+        Add the time of an API call to the API time of the get_* method running in this thread
+        :param url: URL add to URL root
+        """
+        local = self._local
+        local.endpoint = endpoint_template(url)
+        if getattr(local, "api_seconds", None) is None or getattr(local, "in_api_call", False):
+            yield
+            return
+        local.in_api_call = True
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            local.api_seconds += time.perf_counter() - start
+            local.in_api_call = False
+
+    def single_flight_stats(self):
+        """
+        :return: dict with the number of API calls made and of calls saved by sharing an identical call in flight
+        """
+        return self._single_flight.stats()
+
+    def refresh_cache(self):
+        """
+        Drop cached responses for instruments and KPIs the server reports as updated
+        since the last refresh, using get_instruments_updated and get_updated_kpis
+        :return: List of instrument ids whose cached responses were dropped
+        """
+        if self._cache is None:
+            return []
+        updated = self.get_instruments_updated()
+        current = {str(ins_id): str(updated_at) for ins_id, updated_at in updated['updatedAt'].items()}
+        previous = json.loads(self._cache.get_watermark("instruments") or "{}")
+        # without a previous watermark every instrument counts as changed
+        changed = [ins_id for ins_id, updated_at in current.items() if previous.get(ins_id) != updated_at]
+        self._cache.invalidate_instruments(changed)
+        if set(current) - set(previous):
+            # new instruments, refetch the instrument list
+            self._cache.invalidate_endpoints("instruments")
+        self._cache.set_watermark("instruments", json.dumps(current))
+
+        kpis_updated = str(self.get_updated_kpis())
+        if self._cache.get_watermark("kpis") != kpis_updated:
+            self._cache.invalidate_endpoints("instruments/{id}/kpis/%")
+            self._cache.invalidate_endpoints("instruments/kpis/{id}/%")
+            self._cache.set_watermark("kpis", kpis_updated)
+        return [int(ins_id) for ins_id in changed]
+
+    def _call_api_chunked(self, url, stock_id_list, **kwargs):
+        """
+        Internal function for instList API calls, splits the list into server-sized chunks
+        and fetches them concurrently
+        :param url: URL add to URL root
+        :param stock_id_list: Instrument ID list
+        :params: Additional URL parameters
+        :return: List of JSON-encoded content, one per chunk, in list order
+        """
+        chunks = self._instlist_chunks(stock_id_list)
+        if len(chunks) <= 1:
+            return [self._call_api(url, instList=chunk, **kwargs) for chunk in chunks]
+        with self._timed_api_call(url), \
+                ThreadPoolExecutor(max_workers=min(self._max_workers, len(chunks))) as executor:
+            return list(executor.map(lambda chunk: self._call_api(url, instList=chunk, **kwargs), chunks))
+
+    @staticmethod
+    def _instlist_chunks(stock_id_list):
+        """
+        Split an instrument ID list into chunks the API accepts in one instList parameter
+        :param stock_id_list: Instrument ID list
+        :return: List of lists
+        """
+        stock_id_list = list(stock_id_list)
+        return [stock_id_list[i:i + INSTLIST_MAX_SIZE] for i in range(0, len(stock_id_list), INSTLIST_MAX_SIZE)]
 
     def _get_params(self, **kwargs):
         params = self._params.copy()
@@ -42,12 +311,12 @@ class BorsdataAPI:
                 # fix for reserved keyword 'from' in python.
                 if key == "from_date":
                     params['from'] = value
-                elif key == "to" or key == "date":
+                elif key == "to" or key == "date" or key == "maxCount":
                     params[key] = value
                 elif key == "instList":
                     params[key] = ",".join(str(stock_id) for stock_id in value)
                 else:
-                    print(f"BorsdataAPI >> Unknown param: {key}={value}")
+                    logger.warning("BorsdataAPI >> Unknown param: %s=%s", key, value)
         return params
 
     @staticmethod
@@ -79,74 +348,107 @@ class BorsdataAPI:
         if key in df:
             df[key] = pd.to_datetime(df[key])
 
-    def _get_base_params(self):
+    @staticmethod
+    def _report_columns(reports):
+        """
+        :param reports: list of report dicts
+        :return: dict of column name -> list, names without underscores like the report frames
+        """
+        return {name.replace("_", ""): values for name, values in decode.records_to_columns(reports).items()}
+
+    def _format(self, format, columns, schema=None, date_columns=(), fillna=None):
         """
-        Get URL parameter base
-        :return: Parameters dict
+        Build a get_* result from decoded columns
+        :param format: One of FORMATS
+        :param columns: dict of column name -> list or np.ndarray
+        :param schema: dtypes endpoint name, for the dtype policy
+        :param date_columns: Column names to parse as dates
+        :param fillna: Value to replace missing values with, None to keep them ('frame' and 'numpy' only)
+        :return: pd.DataFrame (not indexed), or dict of column name -> list or np.ndarray
         """
-        return {
-            "authKey": self._api_key,
-            "version": 1,
-            'maxYearCount': 20,
-            'maxR12QCount': 40,
-            'maxCount': 20
-        }
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format: {format}, expected one of {FORMATS}")
+        if format == "dict":
+            return decode.columns_to_lists(columns)
+        if format == "numpy":
+            return decode.columns_to_arrays(columns, date_columns, self._schemas.get(schema), fillna)
+        return decode.columns_to_frame(columns, date_columns, self._schemas.get(schema), fillna)
 
     """
     Instrument Metadata
     """
 
-    def get_branches(self):
+    @_measure_frame
+    def get_branches(self, format="frame"):
         """
         Get branch data
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
         :return: pd.DataFrame
         """
         url = "branches"
         json_data = self._call_api(url)
+        if format != "frame":
+            return self._format(format, decode.records_to_columns(json_data["branches"]))
         df = pd.json_normalize(json_data["branches"])
         self._set_index(df, "id")
         return df
 
-    def get_countries(self):
+    @_measure_frame
+    def get_countries(self, format="frame"):
         """
         Get country data
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
         :return: pd.DataFrame
         """
         url = "countries"
         json_data = self._call_api(url)
+        if format != "frame":
+            return self._format(format, decode.records_to_columns(json_data["countries"]))
         df = pd.json_normalize(json_data["countries"])
         self._set_index(df, "id")
         return df
 
-    def get_markets(self):
+    @_measure_frame
+    def get_markets(self, format="frame"):
         """
         Get market data
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
         :return: pd.DataFrame
         """
         url = "markets"
         json_data = self._call_api(url)
+        if format != "frame":
+            return self._format(format, decode.records_to_columns(json_data["markets"]))
         df = pd.json_normalize(json_data["markets"])
         self._set_index(df, "id")
         return df
 
-    def get_sectors(self):
+    @_measure_frame
+    def get_sectors(self, format="frame"):
         """
         Get sector data
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
         :return: pd.DataFrame
         """
         url = "sectors"
         json_data = self._call_api(url)
+        if format != "frame":
+            return self._format(format, decode.records_to_columns(json_data["sectors"]))
         df = pd.json_normalize(json_data["sectors"])
         self._set_index(df, "id")
         return df
 
-    def get_translation_metadata(self):
+    @_measure_frame
+    def get_translation_metadata(self, format="frame"):
         """
         Get translation metadata
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
         :return: pd.DataFrame
         """
         url = "translationmetadata"
         json_data = self._call_api(url)
+        if format != "frame":
+            return self._format(format, decode.records_to_columns(json_data["translationMetadatas"]))
         df = pd.json_normalize(json_data["translationMetadatas"])
         self._set_index(df, "translationKey")
         return df
@@ -155,35 +457,38 @@ class BorsdataAPI:
     Instruments
     """
 
-    def get_instruments(self):
+    @_measure_frame
+    def get_instruments(self, format="frame"):
         """
         Get instrument data
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
         :return: pd.DataFrame
         """
         url = "instruments"
         json_data = self._call_api(url)
-        df = pd.json_normalize(json_data["instruments"])
-        self._parse_date(df, "listingDate")
-        self._set_index(df, "insId")
-        return df
+        columns = decode.records_to_columns(json_data["instruments"])
+        result = self._format(format, columns, dtypes.INSTRUMENTS, date_columns=["listingDate"])
+        return decode.set_index(result, "insId") if format == "frame" else result
 
-    def get_instruments_updated(self):
+    @_measure_frame
+    def get_instruments_updated(self, format="frame"):
         """
         Get all updated instruments
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
         :return: pd.DataFrame
         """
         url = "instruments/updated"
         json_data = self._call_api(url)
-        df = pd.json_normalize(json_data["instruments"])
-        self._parse_date(df, "updatedAt")
-        self._set_index(df, "insId")
-        return df
+        columns = decode.records_to_columns(json_data["instruments"])
+        result = self._format(format, columns, dtypes.INSTRUMENTS, date_columns=["updatedAt"])
+        return decode.set_index(result, "insId") if format == "frame" else result
 
     """
     KPIs
     """
 
-    def get_kpi_history(self, ins_id, kpi_id, report_type, price_type, max_count=None):
+    @_measure_frame
+    def get_kpi_history(self, ins_id, kpi_id, report_type, price_type, max_count=None, format="frame"):
         """
         Get KPI history for an instrument
         :param ins_id: Instrument ID
@@ -191,32 +496,68 @@ class BorsdataAPI:
         :param report_type: ['quarter', 'year', 'r12']
         :param price_type: ['mean', 'high', 'low']
         :param max_count: Max. number of history (quarters/years) to get
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
         :return: pd.DataFrame
         """
         url = f"instruments/{ins_id}/kpis/{kpi_id}/{report_type}/{price_type}/history"
-
-        params = self._get_base_params()
-        if max_count is not None:
-            params["maxCount"] = max_count
-
-        json_data = self._call_api(url)
-        df = pd.json_normalize(json_data["values"])
-        df.rename(columns={"y": "year", "p": "period", "v": "kpiValue"}, inplace=True)
-        self._set_index(df, ["year", "period"], ascending=False)
-        return df
-
-    def get_kpi_summary(self, ins_id, report_type, max_count=None):
+        json_data = self._call_api(url, maxCount=max_count)
+        columns = decode.records_to_columns(json_data["values"], KPI_HISTORY_COLUMNS)
+        result = self._format(format, columns, dtypes.KPI_HISTORY)
+        return decode.set_index(result, ["year", "period"], ascending=False) if format == "frame" else result
+
+    @_measure_frame
+    def get_kpi_history_list(self, ins_ids, kpi_id, report_type, price_type, max_count=None, format="frame"):
+        """
+        Get KPI history for many instruments, with the API's instList form of the history endpoint
+        (chunked like the other list calls). Falls back to concurrent per-instrument calls if the
+        list form is not available.
+        :param ins_ids: Instrument ID list
+        :param kpi_id: KPI ID
+        :param report_type: ['quarter', 'year', 'r12']
+        :param price_type: ['mean', 'high', 'low']
+        :param max_count: Max. number of history (quarters/years) to get
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
+        :return: pd.DataFrame indexed by (insId, year, period), descending year/period per instrument
+        """
+        url = f"instruments/kpis/{kpi_id}/{report_type}/{price_type}/history"
+        try:
+            kpis_list = [kpis for json_data in self._call_api_chunked(url, ins_ids, maxCount=max_count)
+                         for kpis in json_data["kpisList"]]
+        except requests.HTTPError as error:
+            # only a missing list endpoint falls back, other errors are raised
+            if error.response is None or error.response.status_code != 404:
+                raise
+            kpis_list = None
+        if kpis_list is None:
+            def fetch(ins_id):
+                url = f"instruments/{ins_id}/kpis/{kpi_id}/{report_type}/{price_type}/history"
+                return {"instrument": ins_id, "values": self._call_api(url, maxCount=max_count)["values"]}
+            with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+                kpis_list = list(executor.map(fetch, ins_ids))
+        columns = decode.nested_records_to_columns(kpis_list, "values", "instrument",
+                                                   {**KPI_HISTORY_COLUMNS, "instrument": "insId"})
+        df = self._format(format, columns, dtypes.KPI_HISTORY)
+        if format != "frame" or len(df) == 0:
+            return df
+        df = df.set_index(["insId", "year", "period"])
+        return df.sort_index(ascending=[True, False, False])
+
+    @_measure_frame
+    def get_kpi_summary(self, ins_id, report_type, max_count=None, format="frame"):
         """
         Get KPI summary for instrument
         :param ins_id: Instrument ID
         :param report_type: Report type ['quarter', 'year', 'r12']
         :param max_count: Max. number of history (quarters/years) to get
-        :return: pd.DataFrame
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
+        :return: pd.DataFrame (year, period) x kpiId, or long kpiId, year, period, kpiValue columns
         """
         url = f"instruments/{ins_id}/kpis/{report_type}/summary"
-        if max_count is not None:
-            self._params["maxCount"] = max_count
-        json_data = self._call_api(url)
+        json_data = self._call_api(url, maxCount=max_count)
+        if format != "frame":
+            columns = decode.nested_records_to_columns(json_data["kpis"], "values", "KpiId",
+                                                       {**KPI_HISTORY_COLUMNS, "KpiId": "kpiId"})
+            return self._format(format, columns)
         df = pd.json_normalize(json_data["kpis"], record_path="values", meta="KpiId")
         df.rename(
             columns={"y": "year", "p": "period", "v": "kpiValue", "KpiId": "kpiId"},
@@ -228,43 +569,96 @@ class BorsdataAPI:
         self._set_index(df, ["year", "period"], ascending=False)
         return df
 
-    def get_kpi_data_instrument(self, ins_id, kpi_id, calc_group, calc):
+    @_measure_frame
+    def get_kpi_data_instrument(self, ins_id, kpi_id, calc_group, calc, format="frame"):
         """
         Get screener data, for more information: https://github.com/Borsdata-Sweden/API/wiki/KPI-Screener
         :param ins_id: Instrument ID
         :param kpi_id: KPI ID
         :param calc_group: ['1year', '3year', '5year', '7year', '10year', '15year']
         :param calc: ['high', 'latest', 'mean', 'low', 'sum', 'cagr']
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
         :return: pd.DataFrame
         """
         url = f"instruments/{ins_id}/kpis/{kpi_id}/{calc_group}/{calc}"
         json_data = self._call_api(url)
-        df = pd.json_normalize(json_data["value"])
-        df.rename(
-            columns={"i": "insId", "n": "valueNum", "s": "valueStr"},
-            inplace=True,
-        )
-        self._set_index(df, "insId")
-        return df
+        columns = decode.records_to_columns([json_data["value"]], KPI_VALUE_COLUMNS)
+        result = self._format(format, columns, dtypes.KPI_VALUES)
+        return decode.set_index(result, "insId") if format == "frame" else result
 
-    def get_kpi_data_all_instruments(self, kpi_id, calc_group, calc):
+    @_measure_frame
+    def get_kpi_data_all_instruments(self, kpi_id, calc_group, calc, format="frame"):
         """
         Get KPI data for all instruments
         :param kpi_id: KPI ID
         :param calc_group: ['1year', '3year', '5year', '7year', '10year', '15year']
         :param calc: ['high', 'latest', 'mean', 'low', 'sum', 'cagr']
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
         :return: pd.DataFrame
         """
         url = f"instruments/kpis/{kpi_id}/{calc_group}/{calc}"
         json_data = self._call_api(url)
-        df = pd.json_normalize(json_data["values"])
-        df.rename(
-            columns={"i": "insId", "n": "valueNum", "s": "valueStr"},
-            inplace=True,
-        )
-        self._set_index(df, "insId")
-        return df
+        columns = decode.records_to_columns(json_data["values"], KPI_VALUE_COLUMNS)
+        result = self._format(format, columns, dtypes.KPI_VALUES)
+        return decode.set_index(result, "insId") if format == "frame" else result
 
+    @_measure_frame
+    def get_kpi_matrix(self, kpi_ids, calc_group, calc, format="frame"):
+        """
+        Get screener data for many KPIs and all instruments as one wide frame.
+        KPIs are fetched concurrently, and fetched values are reused until get_updated_kpis
+        reports a new KPI calculation.
+        :param kpi_ids: KPI ID list
+        :param calc_group: ['1year', '3year', '5year', '7year', '10year', '15year']
+        :param calc: ['high', 'latest', 'mean', 'low', 'sum', 'cagr']
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS (with an insId column)
+        :return: pd.DataFrame indexed by insId, with ('valueNum', kpiId) columns and ('valueStr', kpiId)
+            columns for KPIs that have text values
+        """
+        kpis_updated = self.get_updated_kpis()
+        with self._kpi_values_lock:
+            if kpis_updated != self._kpi_values_updated:
+                self._kpi_values = {}
+                self._kpi_values_updated = kpis_updated
+            missing = [kpi_id for kpi_id in dict.fromkeys(kpi_ids) if (kpi_id, calc_group, calc) not in self._kpi_values]
+
+        def fetch(kpi_id):
+            json_data = self._call_api(f"instruments/kpis/{kpi_id}/{calc_group}/{calc}")
+            values = json_data["values"] or []
+            return (np.array([value["i"] for value in values], dtype=np.int64),
+                    np.array([value.get("n") for value in values], dtype=np.float64),
+                    np.array([value.get("s") for value in values], dtype=object))
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self._max_workers, len(missing))) as executor:
+                fetched = dict(zip(missing, executor.map(fetch, missing)))
+            with self._kpi_values_lock:
+                for kpi_id, values in fetched.items():
+                    self._kpi_values[(kpi_id, calc_group, calc)] = values
+        kpi_values = [(kpi_id, self._kpi_values[(kpi_id, calc_group, calc)]) for kpi_id in dict.fromkeys(kpi_ids)]
+
+        # scatter every KPI into columns over the union of instrument ids, no per-KPI merges
+        ins_ids = np.unique(np.concatenate([values[0] for _, values in kpi_values] + [np.array([], dtype=np.int64)]))
+        schema = self._schemas.get(dtypes.KPI_VALUES, {})
+        numbers = {}
+        strings = {}
+        for kpi_id, (ids, value_num, value_str) in kpi_values:
+            rows = np.searchsorted(ins_ids, ids)
+            column = np.full(len(ins_ids), np.nan)
+            column[rows] = value_num
+            numbers[('valueNum', kpi_id)] = decode.to_array(column, schema.get('valueNum'))
+            if any(value is not None for value in value_str):
+                column = np.full(len(ins_ids), None, dtype=object)
+                column[rows] = value_str
+                strings[('valueStr', kpi_id)] = column
+        ins_ids = decode.to_array(ins_ids, schema.get('insId'))
+        if format != "frame":
+            return self._format(format, {'insId': ins_ids, **numbers, **strings})
+        if schema.get('valueStr') == 'category':
+            strings = {name: pd.Categorical(column) for name, column in strings.items()}
+        return pd.DataFrame({**numbers, **strings}, index=pd.Index(ins_ids, name='insId'))
+
+    @_measure_frame
     def get_updated_kpis(self):
         """
         Get latest calculation date and time for KPIs
@@ -274,13 +668,17 @@ class BorsdataAPI:
         json_data = self._call_api(url)
         return pd.to_datetime(json_data["kpisCalcUpdated"])
 
-    def get_kpi_metadata(self):
+    @_measure_frame
+    def get_kpi_metadata(self, format="frame"):
         """
         Get KPI metadata
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
         :return: pd.DataFrame
         """
         url = "instruments/kpis/metadata"
         json_data = self._call_api(url)
+        if format != "frame":
+            return self._format(format, decode.records_to_columns(json_data["kpiHistoryMetadatas"]))
         df = pd.json_normalize(json_data["kpiHistoryMetadatas"])
         self._set_index(df, "kpiId")
         return df
@@ -289,20 +687,20 @@ class BorsdataAPI:
     Reports
     """
 
-    def get_instrument_report(self, ins_id, report_type, max_count=None):
+    @_measure_frame
+    def get_instrument_report(self, ins_id, report_type, max_count=None, format="frame"):
         """
         Get specific report data
         :param ins_id: Instrument ID
         :param report_type: ['quarter', 'year', 'r12']
         :param max_count: Max. number of history (quarters/years) to get
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
         :return: pd.DataFrame of report data
         """
         url = f"instruments/{ins_id}/reports/{report_type}"
-
-        params = self._get_base_params()
-        if max_count is not None:
-            params["maxCount"] = max_count
-        json_data = self._call_api(url)
+        json_data = self._call_api(url, maxCount=max_count)
+        if format != "frame":
+            return self._format(format, self._report_columns(json_data["reports"]), date_columns=REPORT_DATE_COLUMNS)
 
         df = pd.json_normalize(json_data["reports"])
         df.columns = [x.replace("_", "") for x in df.columns]
@@ -312,15 +710,20 @@ class BorsdataAPI:
         self._set_index(df, ["year", "period"], ascending=False)
         return df
 
-    def get_instrument_reports(self, ins_id):
+    @_measure_frame
+    def get_instrument_reports(self, ins_id, format="frame"):
         """
         Get all report data
         :param ins_id: Instrument ID
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
         :return: [pd.DataFrame quarter, pd.DataFrame year, pd.DataFrame r12]
         """
         # constructing url for api-call, adding ins_id
         url = f"instruments/{ins_id}/reports"
         json_data = self._call_api(url)
+        if format != "frame":
+            return [self._format(format, self._report_columns(json_data[report_type]), date_columns=REPORT_DATE_COLUMNS)
+                    for report_type in ["reportsQuarter", "reportsYear", "reportsR12"]]
         dfs = []
         for report_type in ["reportsQuarter", "reportsYear", "reportsR12"]:
             df = pd.json_normalize(json_data[report_type])
@@ -332,35 +735,59 @@ class BorsdataAPI:
             dfs.append(df)
         return dfs
 
-    def get_instrument_report_list(self, stock_id_list):
+    @_measure_frame
+    def get_instrument_report_list(self, stock_id_list, stream=False, format="frame", fillna=0, lowercase=True):
         """
-        Get all report data for Stocks in stock_id_list
+        Get all report data for Stocks in stock_id_list.
+        Lists longer than the API's instList limit are fetched in concurrent chunks.
         :param stock_id_list: Instrument ID list
+        :param stream: True to parse the responses incrementally into column buffers, which keeps
+            peak memory close to the size of the returned frames (chunks are then fetched one by one)
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
+        :param fillna: Value to replace missing values with, None to keep them
+        :param lowercase: True for lowercased column names, False for the column names and parsed
+            dates of get_instrument_reports (e.g. 'earningsPerShare')
         :return: [pd.DataFrame quarter, pd.DataFrame year, pd.DataFrame r12]
         """
         url = f"instruments/reports"
-        json_data = self._call_api(url, instList=stock_id_list)
-        r12 = pd.json_normalize(json_data['reportList'], record_path="reportsR12", meta=["instrument"])
-        r12 = r12.rename(columns=str.lower)
-        r12 = r12.rename(columns={'instrument': 'stock_id'})
-        r12.fillna(0, inplace=True)
-        quarter = pd.json_normalize(json_data['reportList'], record_path="reportsQuarter", meta=["instrument"])
-        quarter = quarter.rename(columns=str.lower)
-        quarter = quarter.rename(columns={'instrument': 'stock_id'})
-        quarter.fillna(0, inplace=True)
-        year = pd.json_normalize(json_data['reportList'], record_path="reportsYear", meta=["instrument"])
-        year = year.rename(columns=str.lower)
-        year = year.rename(columns={'instrument': 'stock_id'})
-        year.fillna(0, inplace=True)
+        report_types = ["reportsQuarter", "reportsYear", "reportsR12"]
+        rename = str.lower if lowercase else (lambda name: name.replace("_", ""))
+        date_columns = [] if lowercase else REPORT_DATE_COLUMNS
+        if stream:
+            buffers = {report_type: streaming.RecordBuffers(rename=rename) for report_type in report_types}
+            for chunk in self._instlist_chunks(stock_id_list):
+                for report in streaming.iter_array_items(self._call_api_stream(url, instList=chunk), 'reportList'):
+                    for report_type, buffer in buffers.items():
+                        buffer.extend(report[report_type] or [], stock_id=report['instrument'])
+            columns = [buffers[report_type].to_columns() for report_type in report_types]
+        else:
+            report_list = []
+            for json_data in self._call_api_chunked(url, stock_id_list):
+                report_list.extend(json_data['reportList'])
+            columns = []
+            for report_type in report_types:
+                report_columns = decode.nested_records_to_columns(report_list, report_type, 'instrument')
+                report_columns = {rename(name): values for name, values in report_columns.items()}
+                if 'instrument' in report_columns:
+                    report_columns['stock_id'] = report_columns.pop('instrument')
+                columns.append(report_columns)
+        quarter, year, r12 = [self._format(format, report_columns, dtypes.REPORTS, date_columns, fillna)
+                              for report_columns in columns]
         return quarter, year, r12
 
-    def get_reports_metadata(self):
+    @_measure_frame
+    def get_reports_metadata(self, format="frame"):
         """
         Get reports metadata
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
         :return: pd.DataFrame
         """
         url = "instruments/reports/metadata"
         json_data = self._call_api(url)
+        if format != "frame":
+            columns = decode.records_to_columns(json_data["reportMetadatas"], {"reportPropery": "reportProperty"})
+            columns["reportProperty"] = [name.replace("_", "") for name in columns.get("reportProperty", [])]
+            return self._format(format, columns)
         df = pd.json_normalize(json_data["reportMetadatas"])
         # Fix probable misspelling 'propery' -> 'property'
         df.rename(
@@ -375,110 +802,98 @@ class BorsdataAPI:
     Stock prices
     """
 
-    def get_instrument_stock_prices(self, ins_id, from_date=None, to_date=None, max_count=None):
+    @_measure_frame
+    def get_instrument_stock_prices(self, ins_id, from_date=None, to_date=None, max_count=None, format="frame"):
         """
         Get stock prices for instrument ID
         :param ins_id: Instrument ID
         :param from_date: Start date in string format, e.g. '2000-01-01'
         :param to_date: Stop date in string format, e.g. '2000-01-01'
         :param max_count: Max. number of history (quarters/years) to get
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
         :return: pd.DataFrame
         """
         url = f"instruments/{ins_id}/stockprices"
         json_data = self._call_api(url, from_date=from_date, to=to_date)
-        df = pd.json_normalize(json_data["stockPricesList"])
-        df.rename(
-            columns={
-                "d": "date",
-                "c": "close",
-                "h": "high",
-                "l": "low",
-                "o": "open",
-                "v": "volume",
-            },
-            inplace=True,
-        )
-        self._parse_date(df, "date")
-        self._set_index(df, "date", ascending=False)
-        return df
+        columns = decode.records_to_columns(json_data["stockPricesList"], STOCK_PRICE_COLUMNS)
+        result = self._format(format, columns, dtypes.STOCK_PRICES, date_columns=["date"])
+        return decode.set_index(result, "date", ascending=False) if format == "frame" else result
 
-    def get_instrument_stock_prices_list(self, stock_id_list, from_date=None, to_date=None):
+    @_measure_frame
+    def get_instrument_stock_prices_list(self, stock_id_list, from_date=None, to_date=None, stream=False,
+                                         format="frame", fillna=0):
         """
-        Get stock prices for instrument ID
+        Get stock prices for instrument ID list.
+        Lists longer than the API's instList limit are fetched in concurrent chunks.
         :param stock_id_list: Instrument ID list
         :param from_date: Start date in string format, e.g. '2000-01-01'
         :param to_date: Stop date in string format, e.g. '2000-01-01'
+        :param stream: True to parse the responses incrementally into column buffers, which keeps
+            peak memory close to the size of the returned frame (chunks are then fetched one by one)
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
+        :param fillna: Value to replace missing prices with, None to keep them like get_instrument_stock_prices
         :return: pd.DataFrame
         """
         url = 'instruments/stockprices'
-        json_data = self._call_api(url, from_date=from_date, to=to_date, instList=stock_id_list)
-        stock_prices = pd.json_normalize(json_data['stockPricesArrayList'], "stockPricesList", ['instrument'])
-        stock_prices.rename(columns={'d': 'date', 'c': 'close', 'h': 'high', 'l': 'low',
-                                     'o': 'open', 'v': 'volume', 'instrument': 'stock_id'}, inplace=True)
-        stock_prices.fillna(0, inplace=True)
-        return stock_prices
+        if stream:
+            buffer = streaming.RecordBuffers(rename=STOCK_PRICE_COLUMNS, date_keys=["d"])
+            for chunk in self._instlist_chunks(stock_id_list):
+                chunks = self._call_api_stream(url, from_date=from_date, to=to_date, instList=chunk)
+                for stock_prices in streaming.iter_array_items(chunks, 'stockPricesArrayList'):
+                    buffer.extend(stock_prices['stockPricesList'] or [], stock_id=stock_prices['instrument'])
+            columns = buffer.to_columns()
+        else:
+            stock_prices_array_list = []
+            for json_data in self._call_api_chunked(url, stock_id_list, from_date=from_date, to=to_date):
+                stock_prices_array_list.extend(json_data['stockPricesArrayList'])
+            columns = decode.nested_records_to_columns(stock_prices_array_list, "stockPricesList", "instrument",
+                                                       {**STOCK_PRICE_COLUMNS, "instrument": "stock_id"})
+        return self._format(format, columns, dtypes.STOCK_PRICES, date_columns=["date"], fillna=fillna)
 
-    def get_instruments_stock_prices_last(self):
+    @_measure_frame
+    def get_instruments_stock_prices_last(self, format="frame"):
         """
         Get last days' stock prices for all instruments
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
         :return: pd.DataFrame
         """
         url = "instruments/stockprices/last"
         json_data = self._call_api(url)
-        df = pd.json_normalize(json_data["stockPricesList"])
-        df.rename(
-            columns={
-                "d": "date",
-                "i": "insId",
-                "c": "close",
-                "h": "high",
-                "l": "low",
-                "o": "open",
-                "v": "volume",
-            },
-            inplace=True,
-        )
-        self._parse_date(df, "date")
-        self._set_index(df, "date", ascending=False)
-        return df
+        columns = decode.records_to_columns(json_data["stockPricesList"], STOCK_PRICE_COLUMNS)
+        result = self._format(format, columns, dtypes.STOCK_PRICES, date_columns=["date"])
+        return decode.set_index(result, "date", ascending=False) if format == "frame" else result
 
-    def get_stock_prices_date(self, date):
+    @_measure_frame
+    def get_stock_prices_date(self, date, format="frame"):
         """
         Get all instrument stock prices for given date
         :param date: Date in string format, e.g. '2000-01-01'
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
         :return: pd.DataFrame
         """
         url = "instruments/stockprices/date"
 
         json_data = self._call_api(url, date=date)
-        df = pd.json_normalize(json_data["stockPricesList"])
-        df.rename(
-            columns={
-                "d": "date",
-                "i": "insId",
-                "c": "close",
-                "h": "high",
-                "l": "low",
-                "o": "open",
-                "v": "volume",
-            },
-            inplace=True,
-        )
-        self._parse_date(df, "date")
-        self._set_index(df, "insId")
-        return df
+        columns = decode.records_to_columns(json_data["stockPricesList"], STOCK_PRICE_COLUMNS)
+        result = self._format(format, columns, dtypes.STOCK_PRICES, date_columns=["date"])
+        return decode.set_index(result, "insId") if format == "frame" else result
 
     """
     Stock splits
     """
 
-    def get_stock_splits(self):
+    @_measure_frame
+    def get_stock_splits(self, format="frame"):
         """
         Get stock splits
+        :param format: 'frame', 'dict' or 'numpy', see FORMATS
         :return: pd.DataFrame
         """
         url = "instruments/stocksplits"
         json_data = self._call_api(url)
+        if format != "frame":
+            columns = decode.records_to_columns(json_data["stockSplitList"], {"instrumentId": "insId"})
+            return self._format(format, columns, date_columns=["splitDate"])
         df = pd.json_normalize(json_data["stockSplitList"])
         df.rename(
             columns={"instrumentId": "insId"},
@@ -491,6 +906,10 @@ class BorsdataAPI:
 
 if __name__ == "__main__":
     # Main, call functions here.
+    logging.basicConfig(level=logging.DEBUG)
+    # pandas options for string representation of data frames (print)
+    pd.set_option("display.max_columns", None)
+    pd.set_option("display.max_rows", None)
     api = BorsdataAPI(constants.API_KEY)
     api.get_translation_metadata()
     api.get_instruments_updated()
@@ -505,3 +924,4 @@ if __name__ == "__main__":
     api.get_stock_splits()
     api.get_instrument_stock_prices(2, from_date="2022-01-01", to="2023-01-01")
     api.get_instrument_stock_prices_list([2, 3, 4, 5])
+    print(api.metrics.to_frame())
@@ -0,0 +1,116 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from borsdata.borsdata_api import BorsdataAPI
+
+
+class AsyncBorsdataAPI:
+    """
+    Asyncio counterpart to BorsdataAPI.
+    Every BorsdataAPI.get_* method is available as a coroutine with the same arguments and return value.
+    Requests run on a bounded worker pool over the pooled transport, and the shared rate limiter
+    keeps all in-flight requests within the API quota. JSON parsing is done by BorsdataAPI itself.
+    """
+    def __init__(self, _api_key=None, max_concurrency=8, api=None, **kwargs):
+        """
+        :param _api_key: Börsdata API key
+        :param max_concurrency: Max. number of requests in flight
+        :param api: Existing BorsdataAPI to wrap, instead of creating one
+        :param kwargs: Passed on to BorsdataAPI (transport, limiter, url_root, ...)
+        """
+        if api is None:
+            kwargs.setdefault("pool_size", max_concurrency)
+            api = BorsdataAPI(_api_key, **kwargs)
+        self._api = api
+        self._max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="borsdata")
+        self._semaphore = None
+
+    async def _run(self, method, *args, **kwargs):
+        """
+        Run a blocking BorsdataAPI method on the worker pool
+        :param method: Bound BorsdataAPI method
+        :return: Result of the method
+        """
+        # created lazily so the semaphore binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(method, *args, **kwargs))
+
+    async def gather(self, method, ins_ids, *args, **kwargs):
+        """
+        Call a per-instrument get_* method for many instruments concurrently
+        :param method: Method name, e.g. 'get_instrument_stock_prices'
+        :param ins_ids: Instrument ID list
+        :param args: Additional arguments after ins_id
+        :param kwargs: Additional keyword arguments
+        :return: dict of ins_id -> result
+        """
+        results = await asyncio.gather(*[getattr(self, method)(ins_id, *args, **kwargs) for ins_id in ins_ids])
+        return dict(zip(ins_ids, results))
+
+    async def get_instrument_stock_prices_many(self, ins_ids, from_date=None, to_date=None, max_count=None):
+        """
+        Get stock prices for many instruments
+        :param ins_ids: Instrument ID list
+        :param from_date: Start date in string format, e.g. '2000-01-01'
+        :param to_date: Stop date in string format, e.g. '2000-01-01'
+        :param max_count: Max. number of history (quarters/years) to get
+        :return: dict of ins_id -> pd.DataFrame
+        """
+        return await self.gather("get_instrument_stock_prices", ins_ids,
+                                 from_date=from_date, to_date=to_date, max_count=max_count)
+
+    async def get_instrument_reports_many(self, ins_ids):
+        """
+        Get all report data for many instruments
+        :param ins_ids: Instrument ID list
+        :return: dict of ins_id -> [pd.DataFrame quarter, pd.DataFrame year, pd.DataFrame r12]
+        """
+        return await self.gather("get_instrument_reports", ins_ids)
+
+    async def get_kpi_history_many(self, ins_ids, kpi_id, report_type, price_type, max_count=None):
+        """
+        Get KPI history for many instruments
+        :param ins_ids: Instrument ID list
+        :param kpi_id: KPI ID
+        :param report_type: ['quarter', 'year', 'r12']
+        :param price_type: ['mean', 'high', 'low']
+        :param max_count: Max. number of history (quarters/years) to get
+        :return: dict of ins_id -> pd.DataFrame
+        """
+        return await self.gather("get_kpi_history", ins_ids, kpi_id, report_type, price_type, max_count=max_count)
+
+    async def aclose(self):
+        """
+        Shut down the worker pool and close the transport, waiting for running calls in another
+        thread so the event loop keeps running
+        """
+        def close():
+            self._executor.shutdown(wait=True)
+            self._api.close()
+
+        await asyncio.get_running_loop().run_in_executor(None, close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+
+def _make_coroutine(name):
+    method = getattr(BorsdataAPI, name)
+
+    @functools.wraps(method)
+    async def coroutine(self, *args, **kwargs):
+        return await self._run(getattr(self._api, name), *args, **kwargs)
+    return coroutine
+
+
+# expose every BorsdataAPI.get_* method as a coroutine
+for _name in dir(BorsdataAPI):
+    if _name.startswith("get_") and not hasattr(AsyncBorsdataAPI, _name):
+        setattr(AsyncBorsdataAPI, _name, _make_coroutine(_name))
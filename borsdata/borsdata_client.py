@@ -1,27 +1,43 @@
 # importing the borsdata_api
 from borsdata.borsdata_api import BorsdataAPI
-# pandas is a data-analysis library for python (data frames)
-import pandas as pd
-# matplotlib for visual-presentations (plots)
-import matplotlib.pylab as plt
+from borsdata.price_panel import PricePanel
+from borsdata.splits import SplitAdjuster
+from borsdata.valuation import ValuationSeries
+# pandas and matplotlib are imported on first use, importing the client stays fast
+from borsdata.lazy import lazy_import
 # datetime for date- and time-stuff
 import datetime as dt
 # user constants
 from borsdata import constants as constants
-import numpy as np
 import os
 
-# pandas options for string representation of data frames (print)
-pd.set_option('display.max_columns', None)
-pd.set_option('display.max_rows', None)
+# pandas is a data-analysis library for python (data frames)
+pd = lazy_import('pandas')
+# matplotlib for visual-presentations (plots)
+plt = lazy_import('matplotlib.pylab')
+
+
+# instrument type dict for conversion (https://github.com/Borsdata-Sweden/API/wiki/Instruments)
+INSTRUMENT_TYPES = {0: 'Aktie', 1: 'Pref', 2: 'Index', 3: 'Stocks2', 4: 'SectorIndex',
+                    5: 'BranschIndex', 8: 'SPAC', 13: 'Index GI'}
 
 
 class BorsdataClient:
-    def __init__(self):
-        self._borsdata_api = BorsdataAPI(constants.API_KEY)
+    def __init__(self, borsdata_api=None, warehouse=None, cube=None):
+        """
+        :param borsdata_api: BorsdataAPI to use, default one created with constants.API_KEY
+        :param warehouse: Warehouse to filter instruments in with SQL, None to filter the instrument frames
+        :param cube: OHLCVCube to read stock prices from in breadth_large_cap_sweden, None to fetch them
+        """
+        self._borsdata_api = borsdata_api if borsdata_api is not None else BorsdataAPI(constants.API_KEY)
+        self._warehouse = warehouse
+        self._cube = cube
         self._instruments_with_meta_data = pd.DataFrame()
+        self._instrument_metadata = None
+        self._split_adjuster = None
+        self._valuation_series = None
 
-    def instruments_with_kpi_data(self, kpi_id: int = 2, save_to_csv: bool = False) -> pd.DataFrame:
+    def instruments_with_kpi_data(self, kpi_id: int = 2, save_to_csv: bool = False) -> 'pd.DataFrame':
 
         # https://github.com/Borsdata-Sweden/API/wiki/Kpi-Screener-List
         # e.g. kpi=2 is Price/Earnings (PE)
@@ -31,11 +47,96 @@ class BorsdataClient:
 
         if save_to_csv:
             file_name = constants.EXPORT_PATH + f"instruments_with_kpi_{kpi_id}_data.csv"
-            instruments_with_kpi_data.to_csv(constants.EXPORT_PATH + file_name)
+            instruments_with_kpi_data.to_csv(file_name)
 
         return instruments_with_kpi_data
 
 
+    def instrument_metadata(self):
+        """
+        Instrument dimension table with market, country, sector and branch names, indexed by insId.
+        Fetched once and cached, join other frames against it with with_metadata.
+        :return: pd.DataFrame
+        """
+        if self._instrument_metadata is None:
+            # fetching data from api, all metadata frames are indexed by id
+            countries = self._borsdata_api.get_countries()
+            branches = self._borsdata_api.get_branches()
+            sectors = self._borsdata_api.get_sectors()
+            markets = self._borsdata_api.get_markets()
+            instruments = self._borsdata_api.get_instruments()
+            # mapping every id column to its name in one vectorized lookup each
+            metadata = pd.DataFrame({
+                'name': instruments['name'],
+                'ticker': instruments['ticker'],
+                'isin': instruments['isin'],
+                'instrument_type': instruments['instrument'].map(INSTRUMENT_TYPES),
+                'market': instruments['marketId'].map(markets['name']),
+                'country': instruments['countryId'].map(countries['name']),
+                'sector': instruments['sectorId'].map(sectors['name']),
+                'branch': instruments['branchId'].map(branches['name']),
+            }, index=instruments.index)
+            # index-typed instruments does not have a sector or branch
+            is_index = metadata['market'].str.lower() == 'index'
+            metadata.loc[is_index, ['sector', 'branch']] = 'N/A'
+            metadata[['sector', 'branch']] = metadata[['sector', 'branch']].fillna('N/A')
+            self._instrument_metadata = metadata
+        return self._instrument_metadata
+
+    def split_adjuster(self):
+        """
+        Split factors of all instruments, fetched once and cached, see borsdata.splits
+        :return: SplitAdjuster
+        """
+        if self._split_adjuster is None:
+            split_adjuster = SplitAdjuster(self._borsdata_api)
+            split_adjuster.refresh()
+            self._split_adjuster = split_adjuster
+        return self._split_adjuster
+
+    def valuation_series(self):
+        """
+        Daily P/E, P/S and EV/EBIT of instruments, cached and updated incrementally, see borsdata.valuation
+        :return: ValuationSeries
+        """
+        if self._valuation_series is None:
+            self._valuation_series = ValuationSeries(self._borsdata_api, split_adjuster=self.split_adjuster())
+        return self._valuation_series
+
+    def valuations(self, market, country):
+        """
+        Point-in-time daily valuation ratios for all instruments of a market and country
+        :param market: which market to get valuations for e.g. 'Large Cap'
+        :param country: which country to get valuations for e.g. 'Sverige'
+        :return: pd.DataFrame with stock_id, date, close, report_date, market_cap, pe, ps and ev_ebit columns
+        """
+        filtered_instruments = self.instruments_in(market, country)
+        return self.valuation_series().update(filtered_instruments['ins_id'])
+
+    def instruments_in(self, market, country):
+        """
+        Instruments of a market and country, from the warehouse if the client has one
+        (synced on first use), otherwise from instruments_with_meta_data
+        :param market: market name e.g. 'Large Cap'
+        :param country: country name e.g. 'Sverige'
+        :return: pd.DataFrame with (at least) ins_id and name columns
+        """
+        if self._warehouse is not None:
+            if self._warehouse.last_sync('metadata') is None:
+                self._warehouse.sync_metadata()
+            return self._warehouse.instruments(market=market, country=country)
+        instruments = self.instruments_with_meta_data()
+        return instruments.loc[(instruments['market'] == market) & (instruments['country'] == country)]
+
+    def with_metadata(self, df, on='stock_id'):
+        """
+        Join instrument metadata onto a frame with an instrument id column
+        :param df: pd.DataFrame
+        :param on: Column holding the instrument id, e.g. 'stock_id' or 'insId'
+        :return: pd.DataFrame
+        """
+        return df.join(self.instrument_metadata(), on=on)
+
     def instruments_with_meta_data(self):
         """
         creating a csv and xlsx of the APIs instrument-data (including meta-data)
@@ -44,57 +145,22 @@ class BorsdataClient:
         """
         if len(self._instruments_with_meta_data) > 0:
             return self._instruments_with_meta_data
-        else:
-            self._borsdata_api = BorsdataAPI(constants.API_KEY)
-            # fetching data from api
-            countries = self._borsdata_api.get_countries()
-            branches = self._borsdata_api.get_branches()
-            sectors = self._borsdata_api.get_sectors()
-            markets = self._borsdata_api.get_markets()
-            instruments = self._borsdata_api.get_instruments()
-            # instrument type dict for conversion (https://github.com/Borsdata-Sweden/API/wiki/Instruments)
-            instrument_type_dict = {0: 'Aktie', 1: 'Pref', 2: 'Index', 3: 'Stocks2', 4: 'SectorIndex',
-                                    5: 'BranschIndex', 8: 'SPAC', 13: 'Index GI'}
-            # creating an empty dataframe
-            instrument_df = pd.DataFrame()
-            # loop through the whole dataframe (table) i.e. row-wise-iteration.
-            for index, instrument in instruments.iterrows():
-                ins_id = index
-                name = instrument['name']
-                ticker = instrument['ticker']
-                isin = instrument['isin']
-                # locating meta-data in various ways
-                # dictionary-lookup
-                instrument_type = instrument_type_dict[instrument['instrument']]
-                # .loc locates the rows where the criteria (inside the brackets, []) is fulfilled
-                # located rows (should be only one) get the column 'name' and return its value-array
-                # take the first value in that array ([0], should be only one value)
-                market = markets.loc[markets.index == instrument['marketId']]['name'].values[0]
-                country = countries.loc[countries.index == instrument['countryId']]['name'].values[0]
-                sector = 'N/A'
-                branch = 'N/A'
-                # index-typed instruments does not have a sector or branch
-                if market.lower() != 'index':
-                    sector = sectors.loc[sectors.index == instrument['sectorId']]['name'].values[0]
-                    branch = branches.loc[branches.index == instrument['branchId']]['name'].values[0]
-                # appending current data to dataframe, i.e. adding a row to the table.
-                df_temp = pd.DataFrame([{'name': name, 'ins_id': ins_id, 'ticker': ticker, 'isin': isin,
-                                         'instrument_type': instrument_type,
-                                         'market': market, 'country': country, 'sector': sector, 'branch': branch}])
-                instrument_df = pd.concat([instrument_df, df_temp], ignore_index=True)
-            # create directory if it do not exist
-            if not os.path.exists(constants.EXPORT_PATH):
-                os.makedirs(constants.EXPORT_PATH)
-            # to csv
-            instrument_df.to_csv(constants.EXPORT_PATH + 'instrument_with_meta_data.csv')
-            # creating excel-document
-            excel_writer = pd.ExcelWriter(constants.EXPORT_PATH + 'instrument_with_meta_data.xlsx')
-            # adding one sheet
-            instrument_df.to_excel(excel_writer, 'instruments_with_meta_data')
-            # saving the document
-            excel_writer._save()
-            self._instruments_with_meta_data = instrument_df
-            return instrument_df
+        instrument_df = self.instrument_metadata().rename_axis('ins_id').reset_index()
+        instrument_df = instrument_df[['name', 'ins_id', 'ticker', 'isin', 'instrument_type',
+                                       'market', 'country', 'sector', 'branch']]
+        # create directory if it do not exist
+        if not os.path.exists(constants.EXPORT_PATH):
+            os.makedirs(constants.EXPORT_PATH)
+        # to csv
+        instrument_df.to_csv(constants.EXPORT_PATH + 'instrument_with_meta_data.csv')
+        # creating excel-document
+        excel_writer = pd.ExcelWriter(constants.EXPORT_PATH + 'instrument_with_meta_data.xlsx')
+        # adding one sheet
+        instrument_df.to_excel(excel_writer, sheet_name='instruments_with_meta_data')
+        # saving the document
+        excel_writer._save()
+        self._instruments_with_meta_data = instrument_df
+        return instrument_df
 
     def plot_stock_prices(self, ins_id):
         """
@@ -105,6 +171,8 @@ class BorsdataClient:
         # creating api-object
         # using api-object to get stock prices from API
         stock_prices = self._borsdata_api.get_instrument_stock_prices(ins_id)
+        # adjusting prices before stock splits, so the moving average runs across them
+        stock_prices = self.split_adjuster().adjust(stock_prices, ins_id)
         # calculating/creating a new column named 'sma50' in the table and
         # assigning the 50 day rolling mean to it
         stock_prices['sma50'] = stock_prices['close'].rolling(window=50).mean()
@@ -129,24 +197,18 @@ class BorsdataClient:
         :return: pd.DataFrame
         """
         # creating api-object
-        # using defined function above to retrieve dataframe of all instruments
-        instruments = self.instruments_with_meta_data()
-        # filtering out the instruments with correct market and country
-        filtered_instruments = instruments.loc[(instruments['market'] == market) & (instruments['country'] == country)]
-        # creating new, empty dataframe
-        stock_prices = pd.DataFrame()
-        # looping through all rows in filtered dataframe
-        for index, instrument in filtered_instruments.iterrows():
-            # fetching the stock prices for the current instrument
-            instrument_stock_price = self._borsdata_api.get_instrument_stock_prices(int(instrument['ins_id']))
-            instrument_stock_price.sort_index(inplace=True)
-            # calculating the current instruments percent change
-            instrument_stock_price['pct_change'] = instrument_stock_price['close'].pct_change(percent_change)
-            # getting the last row of the dataframe, i.e. the last days values
-            last_row = instrument_stock_price.iloc[[-1]]
-            # appending the instruments name and last days percent change to new dataframe
-            df_temp = pd.DataFrame([{'stock': instrument['name'], 'pct_change': round(last_row['pct_change'].values[0] * 100, 2)}])
-            stock_prices = pd.concat([stock_prices, df_temp], ignore_index=True)
+        # using defined function above to retrieve the instruments with correct market and country
+        filtered_instruments = self.instruments_in(market, country)
+        # fetching the stock prices for all filtered instruments as a (date x instrument) panel
+        panel = PricePanel.from_api(self._borsdata_api, filtered_instruments['ins_id'])
+        # adjusting prices before stock splits, so returns and moving averages run across them
+        panel = self.split_adjuster().adjust_panel(panel).fill_gaps()
+        # calculating every instruments percent change at once and getting the last days values
+        pct_change = panel.last(panel.returns(percent_change))
+        names = filtered_instruments.set_index('ins_id')['name']
+        # creating a dataframe of the instruments name and last days percent change
+        stock_prices = pd.DataFrame({'stock': pct_change.index.map(names),
+                                     'pct_change': (pct_change * 100).round(2).values})
         # printing the top sorted by pct_change-column
         print(stock_prices.sort_values('pct_change', ascending=False).head(number_of_stocks))
         return stock_prices
@@ -161,26 +223,15 @@ class BorsdataClient:
         :return: pd.DataFrame of historical kpi-values
         """
         # creating api-object
-        # using defined function above to retrieve data frame of all instruments
-        instruments = self.instruments_with_meta_data()
-        # filtering out the instruments with correct market and country
-        filtered_instruments = instruments.loc[(instruments['market'] == market) & (instruments['country'] == country)]
-        # creating empty array (to hold data frames)
-        frames = []
-        # looping through all rows in filtered data frame
-        for index, instrument in filtered_instruments.iterrows():
-            # fetching the stock prices for the current instrument
-            instrument_kpi_history = self._borsdata_api.get_kpi_history(int(instrument['ins_id']), kpi, 'year', 'mean')
-            # check to see if response holds any data.
-            if len(instrument_kpi_history) > 0:
-                # resetting index and adding name as a column
-                instrument_kpi_history.reset_index(inplace=True)
-                instrument_kpi_history.set_index('year', inplace=True)
-                instrument_kpi_history['name'] = instrument['name']
-                # appending data frame to array
-                frames.append(instrument_kpi_history.copy())
-        # creating concatenated data frame with concat
-        symbols_df = pd.concat(frames)
+        # using defined function above to retrieve the instruments with correct market and country
+        filtered_instruments = self.instruments_in(market, country)
+        # fetching the kpi history for all filtered instruments with batched calls
+        symbols_df = self._borsdata_api.get_kpi_history_list(
+            filtered_instruments['ins_id'].astype(int).tolist(), kpi, 'year', 'mean')
+        # adding name as a column and setting year as index
+        symbols_df = symbols_df.reset_index()
+        symbols_df['name'] = symbols_df['insId'].map(filtered_instruments.set_index('ins_id')['name'])
+        symbols_df = symbols_df.set_index('year')[['period', 'kpiValue', 'name']]
         # the data frame has the columns ['year', 'period', 'kpi_value', 'name']
         # show year ranked from highest to lowest, show top 5
         print(symbols_df[symbols_df.index == year].sort_values('kpiValue', ascending=False).head(5))
@@ -192,25 +243,17 @@ class BorsdataClient:
         :param ins_id: ins_id which PE-ratio will be calculated for
         :return:
         """
-        # creating api-object
-        # fetching all instrument data
-        reports_quarter, reports_year, reports_r12 = self._borsdata_api.get_instrument_reports(3)
-        # getting the last reported eps-value
-        reports_r12.sort_index(inplace=True)
-        print(reports_r12.tail())
-        last_eps = reports_r12['earningsPerShare'].values[-1]
-        # getting the stock prices
-        stock_prices = self._borsdata_api.get_instrument_stock_prices(ins_id)
-        stock_prices.sort_index(inplace=True)
-        # getting the last close
-        last_close = stock_prices['close'].values[-1]
-        # getting the last date
-        last_date = stock_prices.index.values[-1]
-        # getting instruments data to retrieve the name of the ins_id
-        instruments = self._borsdata_api.get_instruments()
-        instrument_name = instruments[instruments.index == ins_id]['name'].values[0]
+        # daily point-in-time valuations of the instrument (cached, later calls only fetch new data)
+        valuations = self.valuation_series().update([ins_id]).dropna(subset=['pe'])
+        if len(valuations) == 0:
+            print(f"No PE for {ins_id}")
+            return
+        # getting the last trading day with a PE-ratio
+        last = valuations.iloc[-1]
+        # getting the name of the ins_id from the cached instrument metadata
+        instrument_name = self.instrument_metadata()['name'].get(ins_id, ins_id)
         # printing the name and calculated PE-ratio with the corresponding date. (array slicing, [:10])
-        print(f"PE for {instrument_name} is {round(last_close / last_eps, 1)} with data from {str(last_date)[:10]}")
+        print(f"PE for {instrument_name} is {round(last['pe'], 1)} with data from {str(last['date'])[:10]}")
 
     def breadth_large_cap_sweden(self):
         """
@@ -218,28 +261,18 @@ class BorsdataClient:
         to Large Cap Sweden Index
         """
         # creating api-object
-        # using defined function above to retrieve data frame of all instruments
-        instruments = self.instruments_with_meta_data()
-        # filtering out the instruments with correct market and country
-        filtered_instruments = instruments.loc[
-            (instruments['market'] == "Large Cap") & (instruments['country'] == "Sverige")]
-        # creating empty array (to hold data frames)
-        frames = []
-        # looping through all rows in filtered data frame
-        for index, instrument in filtered_instruments.iterrows():
-            # fetching the stock prices for the current instrument
-            instrument_stock_prices = self._borsdata_api.get_instrument_stock_prices(int(instrument['ins_id']))
-            # using numpy's where function to create a 1 if close > ma40, else a 0
-            instrument_stock_prices[f'above_ma40'] = np.where(
-                instrument_stock_prices['close'] > instrument_stock_prices['close'].rolling(window=40).mean(), 1, 0)
-            instrument_stock_prices['name'] = instrument['name']
-            # check to see if response holds any data.
-            if len(instrument_stock_prices) > 0:
-                # appending data frame to array
-                frames.append(instrument_stock_prices.copy())
-        # creating concatenated data frame with concat
-        symbols_df = pd.concat(frames)
-        symbols_df = symbols_df.groupby('date').sum()
+        # using defined function above to retrieve the instruments with correct market and country
+        filtered_instruments = self.instruments_in("Large Cap", "Sverige")
+        # fetching the stock prices for all filtered instruments as a (date x instrument) panel,
+        # memory-mapped from the cube if there is one
+        if self._cube is not None:
+            panel = self._cube.panel(filtered_instruments['ins_id'])
+        else:
+            panel = PricePanel.from_api(self._borsdata_api, filtered_instruments['ins_id'])
+        # adjusting prices before stock splits, so returns and moving averages run across them
+        panel = self.split_adjuster().adjust_panel(panel).fill_gaps()
+        # number of stocks with close > ma40, per day, for all instruments at once
+        symbols_df = panel.above_ma_count(40).to_frame()
         # fetching OMXSLCPI data from api
         omx = self._borsdata_api.get_instrument_stock_prices(643)
         # aligning data frames
@@ -258,6 +291,9 @@ class BorsdataClient:
 
 if __name__ == "__main__":
     # Main, call functions here.
+    # pandas options for string representation of data frames (print)
+    pd.set_option('display.max_columns', None)
+    pd.set_option('display.max_rows', None)
     # creating BorsdataClient-instance
     borsdata_client = BorsdataClient()
     # calling some methods
@@ -0,0 +1,216 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode
+
+DAY = 24 * 60 * 60
+
+# seconds to keep a response, per endpoint template ('{id}' replaces numeric path parts).
+# 0 disables caching, e.g. for the endpoints used to detect changes.
+DEFAULT_TTLS = {
+    "branches": 7 * DAY,
+    "countries": 7 * DAY,
+    "markets": 7 * DAY,
+    "sectors": 7 * DAY,
+    "translationmetadata": 7 * DAY,
+    "instruments/kpis/metadata": 7 * DAY,
+    "instruments/reports/metadata": 7 * DAY,
+    "instruments": DAY,
+    "instruments/updated": 0,
+    "instruments/kpis/updated": 0,
+    "instruments/stockprices/last": 0,
+    "instruments/stocksplits": 0,
+}
+
+
+def endpoint_template(url):
+    """
+    Get the endpoint template of a URL path, e.g. 'instruments/3/kpis/2/year/mean/history'
+    -> 'instruments/{id}/kpis/{id}/year/mean/history'
+    :param url: URL path relative to the API root
+    :return: Endpoint template
+    """
+    return re.sub(r"(?<=/)\d+(?=/|$)", "{id}", url)
+
+
+def instrument_ids(url, params):
+    """
+    Get the instrument ids a request is about
+    :param url: URL path relative to the API root
+    :param params: URL parameters
+    :return: List of instrument ids
+    """
+    match = re.match(r"instruments/(\d+)/", url)
+    if match:
+        return [int(match.group(1))]
+    if params.get("instList"):
+        return [int(ins_id) for ins_id in str(params["instList"]).split(",")]
+    return []
+
+
+class ResponseCache:
+    """
+    Persistent cache of raw API responses in a SQLite file.
+    Entries are keyed by URL and parameters (excluding authKey), expire after a per-endpoint TTL
+    and are evicted least-recently-used when the cache grows beyond max_bytes.
+    """
+    def __init__(self, path, ttls=None, default_ttl=DAY, max_bytes=512 * 1024 * 1024):
+        """
+        :param path: Cache directory
+        :param ttls: dict of endpoint template -> TTL in seconds, merged over DEFAULT_TTLS
+        :param default_ttl: TTL in seconds for endpoints not in ttls
+        :param max_bytes: Max. total size of cached bodies
+        """
+        os.makedirs(path, exist_ok=True)
+        self._ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self._default_ttl = default_ttl
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+        self._db = sqlite3.connect(os.path.join(path, "responses.sqlite"), check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, url TEXT, endpoint TEXT, ins_ids TEXT,
+                created REAL, last_access REAL, size INTEGER, body BLOB);
+            CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access);
+            CREATE TABLE IF NOT EXISTS watermarks (name TEXT PRIMARY KEY, value TEXT);
+        """)
+
+    def ttl(self, url):
+        """
+        :param url: URL path relative to the API root
+        :return: TTL in seconds for the URL's endpoint
+        """
+        return self._ttls.get(endpoint_template(url), self._default_ttl)
+
+    @staticmethod
+    def key(url, params):
+        """
+        :param url: URL path relative to the API root
+        :param params: URL parameters
+        :return: Cache key, independent of the API key
+        """
+        params = sorted((key, str(value)) for key, value in params.items() if key != "authKey")
+        return hashlib.sha1(f"{url}?{urlencode(params)}".encode()).hexdigest()
+
+    def get(self, url, params):
+        """
+        Get a cached response body
+        :param url: URL path relative to the API root
+        :param params: URL parameters
+        :return: Raw response body, None if missing or expired
+        """
+        ttl = self.ttl(url)
+        if ttl <= 0:
+            return None
+        key = self.key(url, params)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT created, body FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[0] > ttl:
+                self._stats["misses"] += 1
+                return None
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self._stats["hits"] += 1
+            return row[1]
+
+    def put(self, url, params, body):
+        """
+        Store a response body
+        :param url: URL path relative to the API root
+        :param params: URL parameters
+        :param body: Raw response body (bytes)
+        """
+        if self.ttl(url) <= 0:
+            return
+        now = time.time()
+        ins_ids = ",".join(str(ins_id) for ins_id in instrument_ids(url, params))
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (self.key(url, params), url, endpoint_template(url), ins_ids, now, now, len(body), body))
+            self._stats["stores"] += 1
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        """
+        Drop least-recently-used entries until the cache fits in max_bytes
+        """
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self._max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._stats["evictions"] += 1
+            total -= size
+            if total <= self._max_bytes:
+                break
+
+    def invalidate_instruments(self, ins_ids):
+        """
+        Drop every entry about any of the instruments
+        :param ins_ids: Instrument ID list
+        """
+        ins_ids = {str(ins_id) for ins_id in ins_ids}
+        with self._lock:
+            rows = self._db.execute("SELECT key, ins_ids FROM responses WHERE ins_ids != ''").fetchall()
+            keys = [(key,) for key, row_ids in rows if ins_ids.intersection(row_ids.split(","))]
+            self._db.executemany("DELETE FROM responses WHERE key = ?", keys)
+            self._db.commit()
+            self._stats["invalidations"] += len(keys)
+
+    def invalidate_endpoints(self, pattern):
+        """
+        Drop every entry whose endpoint template matches a SQL LIKE pattern
+        :param pattern: e.g. 'instruments/%kpis/%'
+        """
+        with self._lock:
+            count = self._db.execute("DELETE FROM responses WHERE endpoint LIKE ?", (pattern,)).rowcount
+            self._db.commit()
+            self._stats["invalidations"] += count
+
+    def get_watermark(self, name):
+        """
+        :param name: Watermark name
+        :return: Stored value, None if never set
+        """
+        with self._lock:
+            row = self._db.execute("SELECT value FROM watermarks WHERE name = ?", (name,)).fetchone()
+        return None if row is None else row[0]
+
+    def set_watermark(self, name, value):
+        """
+        :param name: Watermark name
+        :param value: Value (str)
+        """
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO watermarks VALUES (?, ?)", (name, value))
+            self._db.commit()
+
+    def stats(self):
+        """
+        Get hit/miss statistics and current size
+        :return: dict
+        """
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats.update(entries=entries, bytes=size, hit_rate=stats["hits"] / lookups if lookups else 0)
+        return stats
+
+    def clear(self):
+        """
+        Drop all entries and watermarks
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.execute("DELETE FROM watermarks")
+            self._db.commit()
+
+    def close(self):
+        self._db.close()
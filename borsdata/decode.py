@@ -0,0 +1,236 @@
+"""
+Fast decoding of the API's flat JSON payloads straight into typed NumPy columns,
+used instead of pd.json_normalize for the price and KPI endpoints.
+"""
+import json
+from borsdata.lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the standard library parser
+    orjson = None
+
+
+def loads(body):
+    """
+    Parse a JSON document, with orjson if it is installed
+    :param body: bytes or str
+    :return: Parsed JSON
+    """
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def to_array(values, dtype=None):
+    """
+    Convert a list of JSON values to a NumPy array with the dtype pandas would infer
+    (int64/float64/bool, float64 with NaN for missing numbers, object for strings)
+    :param values: list
+    :param dtype: Target dtype, None to infer. Integer dtypes fall back to the inferred dtype
+        when values are missing or fractional, and widen to 64 bits when values do not fit.
+    :return: np.ndarray
+    """
+    if dtype is not None and np.dtype(dtype).kind in "iu":
+        return _to_int_array(values, np.dtype(dtype))
+    if isinstance(values, np.ndarray):
+        return values if dtype is None else values.astype(dtype, copy=False)
+    if dtype is not None:
+        return np.array(values, dtype=dtype)
+    array = np.array(values)
+    if array.dtype.kind in "iufb":
+        return array
+    if array.dtype.kind != "O":
+        # strings
+        return np.array(values, dtype=object)
+    first = next((value for value in values if value is not None), None)
+    if isinstance(first, (int, float)) and not isinstance(first, bool):
+        try:
+            return np.array(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            pass
+    return array
+
+
+def _to_int_array(values, dtype):
+    """
+    Integer column in dtype, checked explicitly rather than relying on the cast to fail
+    (numpy 1 wraps values that do not fit without an error)
+    :return: np.ndarray in dtype, a 64 bit integer dtype when values do not fit it (int64 when some are
+        negative), or the inferred dtype for missing, fractional and non-numeric values
+    """
+    array = values if isinstance(values, np.ndarray) else to_array(values)
+    if len(array) == 0:
+        return array.astype(dtype)
+    if array.dtype.kind not in "iuf":
+        return array
+    if array.dtype.kind == "f" and not (np.isfinite(array).all() and (array == np.floor(array)).all()):
+        # missing or fractional values, keep NaN and the fractions
+        return array
+    low, high = array.min(), array.max()
+    info = np.iinfo(dtype)
+    if low < info.min or high > info.max:
+        if low < 0:
+            dtype = np.dtype(np.int64)
+        else:
+            dtype = np.dtype(np.uint64 if high > np.iinfo(np.int64).max else np.int64)
+    return array.astype(dtype, copy=False)
+
+
+def to_datetime(values):
+    """
+    Parse ISO date strings ('2024-01-31' or '2024-01-31T00:00:00') without format inference.
+    Strings with a UTC offset are left to pd.to_datetime, which keeps the time zone.
+    :param values: list of str
+    :return: np.ndarray of datetime64[ns], or pd.DatetimeIndex for time zone aware dates
+    """
+    if isinstance(values, np.ndarray) and values.dtype.kind == "M":
+        return values.astype("datetime64[ns]", copy=False)
+    first = next((value for value in values if value is not None), None)
+    if isinstance(first, str) and (first.endswith("Z") or "+" in first[10:] or "-" in first[10:]):
+        return pd.to_datetime(values)
+    try:
+        return np.array(values, dtype="datetime64[ns]")
+    except ValueError:
+        return pd.to_datetime(values)
+
+
+def records_to_columns(records, rename=None):
+    """
+    Transpose a list of flat dicts into columns, one pass per key
+    :param records: list of dict
+    :param rename: dict of JSON key -> column name
+    :return: dict of column name -> list
+    """
+    rename = rename or {}
+    if not records:
+        return {}
+    keys = list(records[0])
+    if any(len(record) != len(keys) for record in records):
+        keys = list(dict.fromkeys(key for record in records for key in record))
+    return {rename.get(key, key): [record.get(key) for record in records] for key in keys}
+
+
+def nested_records_to_columns(items, record_key, meta_key, rename=None):
+    """
+    Flatten [{meta_key: x, record_key: [records]}] into columns, with meta_key repeated per record
+    (like pd.json_normalize(items, record_key, [meta_key]))
+    :param items: list of dict
+    :param record_key: Key of the nested record list
+    :param meta_key: Key of the value to repeat on each record
+    :param rename: dict of JSON key -> column name
+    :return: dict of column name -> list
+    """
+    records = []
+    meta = []
+    for item in items:
+        item_records = item[record_key] or []
+        records.extend(item_records)
+        meta.extend([item[meta_key]] * len(item_records))
+    columns = records_to_columns(records, rename)
+    if records:
+        columns[(rename or {}).get(meta_key, meta_key)] = meta
+    return columns
+
+
+def isna(values):
+    """
+    Missing values of an array (None, NaN or NaT), like pd.isna but without pandas
+    :param values: np.ndarray
+    :return: np.ndarray of bool
+    """
+    if values.dtype.kind == "f":
+        return np.isnan(values)
+    if values.dtype.kind in "mM":
+        return np.isnat(values)
+    if values.dtype.kind == "O":
+        return np.fromiter((value is None or value != value for value in values), dtype=bool, count=len(values))
+    return np.zeros(len(values), dtype=bool)
+
+
+def columns_to_arrays(columns, date_columns=(), dtypes=None, fillna=None):
+    """
+    Convert columns to typed NumPy arrays, as columns_to_frame types them but without pandas
+    :param columns: dict of column name -> list or np.ndarray
+    :param date_columns: Column names to parse as dates
+    :param dtypes: dict of column name -> dtype ('category' columns stay object arrays), other columns are inferred
+    :param fillna: Value to replace missing values with, None to keep them
+    :return: dict of column name -> np.ndarray
+    """
+    dtypes = dtypes or {}
+    arrays = {}
+    for name, values in columns.items():
+        if name in date_columns:
+            arrays[name] = to_datetime(values)
+            continue
+        dtype = dtypes.get(name)
+        if dtype == "category":
+            dtype = object
+        if fillna is not None and dtype is not None:
+            # fill before typing, so missing values do not force a float column
+            if isinstance(values, np.ndarray):
+                values = np.where(isna(values), fillna, values)
+            else:
+                values = [fillna if value is None else value for value in values]
+        array = to_array(values, dtype)
+        if fillna is not None and array.dtype.kind in "fO":
+            array[isna(array)] = fillna
+        arrays[name] = array
+    return arrays
+
+
+def columns_to_frame(columns, date_columns=(), dtypes=None, fillna=None):
+    """
+    Build a pd.DataFrame from columns without copying the arrays again
+    :param columns: dict of column name -> list or np.ndarray
+    :param date_columns: Column names to parse as dates
+    :param dtypes: dict of column name -> dtype ('category' for categorical), other columns are inferred
+    :param fillna: Value to replace missing values with, None to keep them
+    :return: pd.DataFrame
+    """
+    arrays = columns_to_arrays(columns, date_columns, dtypes, fillna)
+    for name, dtype in (dtypes or {}).items():
+        if dtype == "category" and name in arrays:
+            arrays[name] = pd.Categorical(arrays[name])
+    return pd.DataFrame(arrays, copy=False)
+
+
+def columns_to_lists(columns):
+    """
+    Convert columns to lists of JSON values, for columns buffered as NumPy arrays:
+    dates back to ISO date strings and NaN to None
+    :param columns: dict of column name -> list or np.ndarray
+    :return: dict of column name -> list
+    """
+    lists = {}
+    for name, values in columns.items():
+        if isinstance(values, np.ndarray):
+            if values.dtype.kind == "M":
+                missing = np.isnat(values)
+                values = np.datetime_as_string(values, unit="D").astype(object)
+                values[missing] = None
+            elif values.dtype.kind == "f" and np.isnan(values).any():
+                values = np.where(np.isnan(values), None, values)
+            values = values.tolist()
+        lists[name] = values
+    return lists
+
+
+def set_index(df, index, ascending=True):
+    """
+    Set index and sort by it, reversing instead of sorting when the payload is already ordered
+    :param df: pd.DataFrame
+    :param index: Column name(s) to set to index
+    :param ascending: True to sort index ascending
+    :return: pd.DataFrame
+    """
+    columns = index if isinstance(index, list) else [index]
+    if any(column not in df.columns for column in columns):
+        return df
+    df = df.set_index(index)
+    if df.index.is_monotonic_increasing and df.index.is_unique:
+        return df if ascending else df.iloc[::-1]
+    return df.sort_index(ascending=ascending)
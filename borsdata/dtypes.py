@@ -0,0 +1,64 @@
+"""
+Column dtypes per endpoint for BorsdataAPI's dtype_policy option.
+Columns not listed keep the dtype inferred from the JSON values.
+"""
+
+STOCK_PRICES = "stock_prices"
+REPORTS = "reports"
+KPI_VALUES = "kpi_values"
+KPI_HISTORY = "kpi_history"
+INSTRUMENTS = "instruments"
+
+COMPACT = {
+    STOCK_PRICES: {
+        "insId": "int32",
+        "stock_id": "int32",
+        "open": "float32",
+        "high": "float32",
+        "low": "float32",
+        "close": "float32",
+        "volume": "uint32",
+    },
+    REPORTS: {
+        "stock_id": "int32",
+        "year": "int16",
+        "period": "int16",
+        "currency": "category",
+        "report_start_date": "category",
+        "report_end_date": "category",
+        "report_date": "category",
+    },
+    KPI_VALUES: {
+        "insId": "int32",
+        "valueNum": "float32",
+        "valueStr": "category",
+    },
+    KPI_HISTORY: {
+        "insId": "int32",
+        "stock_id": "int32",
+        "year": "int16",
+        "period": "int16",
+        "kpiValue": "float32",
+    },
+    INSTRUMENTS: {
+        "insId": "int32",
+        "instrument": "int16",
+        "stockPriceCurrency": "category",
+        "reportCurrency": "category",
+    },
+}
+
+POLICIES = {
+    None: {},
+    "compact": COMPACT,
+}
+
+
+def get_schemas(dtype_policy):
+    """
+    :param dtype_policy: None for the inferred dtypes, or 'compact'
+    :return: dict of endpoint -> dict of column name -> dtype
+    """
+    if dtype_policy not in POLICIES:
+        raise ValueError(f"Unknown dtype_policy: {dtype_policy}, expected one of {list(POLICIES)}")
+    return POLICIES[dtype_policy]
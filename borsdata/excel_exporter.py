@@ -1,43 +1,244 @@
-from borsdata.borsdata_api import *
-import pandas as pd
+from borsdata.borsdata_api import BorsdataAPI, INSTLIST_MAX_SIZE
 import os
+import queue
+import threading
 import datetime as dt
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, ALL_COMPLETED, FIRST_COMPLETED
 from borsdata import constants as constants
+# pandas and openpyxl (which loads numpy) are imported on first use
+from borsdata.lazy import lazy_import
+
+pd = lazy_import("pandas")
+openpyxl = lazy_import("openpyxl")
+
+# marks the end of the fetched workbooks in the pipeline queue
+_DONE = object()
+
+
+def _write_workbook(path, sheets):
+    """
+    Write a workbook in openpyxl's streaming (write-only) mode, run in the writer processes.
+    The file is written next to its target and renamed, so a workbook is never left half written.
+    :param path: Target .xlsx path
+    :param sheets: list of (sheet name, pd.DataFrame)
+    :return: path
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    for sheet_name, df in sheets:
+        worksheet = workbook.create_sheet(sheet_name)
+        if len(df.columns) == 0:
+            continue
+        if any(name is not None for name in df.index.names):
+            df = df.reset_index()
+        worksheet.append([str(column) for column in df.columns])
+        # NaN/NaT are written as empty cells, like DataFrame.to_excel
+        values = df.astype(object).where(df.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            worksheet.append(row)
+    tmp_path = path[:-len(".xlsx")] + ".tmp.xlsx"
+    workbook.save(tmp_path)
+    os.replace(tmp_path, path)
+    return path
 
 
 class ExcelExporter:
     """
     A small example class that uses the BorsdataAPI to fetch and concatenate
     instrument data into excel-files.
+    Fetching and writing run as a pipeline: fetcher threads put workbooks on a bounded queue
+    and a process pool writes them. Finished instruments are recorded in a journal, so an
+    interrupted export continues where it stopped when create_excel_files is called again.
     """
-    def __init__(self):
-        self._api = BorsdataAPI(constants.API_KEY)
+    def __init__(self, borsdata_api=None):
+        """
+        :param borsdata_api: BorsdataAPI to use, default one created with constants.API_KEY
+        """
+        self._api = borsdata_api if borsdata_api is not None else BorsdataAPI(constants.API_KEY)
         self._instruments = self._api.get_instruments()
         self._markets = self._api.get_markets()
         self._countries = self._api.get_countries()
 
-    def create_excel_files(self):
-        # looping through all instruments
-        for index, instrument in self._instruments.iterrows():
-            stock_prices = self._api.get_instrument_stock_prices(instrument['insId'])
-            reports_quarter, reports_year, reports_r12 = self._api.get_instrument_reports(instrument['insId'])
+    def create_excel_files(self, workers=None, fetch_workers=2, queue_size=16):
+        """
+        Export one workbook per instrument to constants.EXPORT_PATH/<date>/<country>/<market>/
+        :param workers: Number of writer processes, default os.cpu_count(). 0 writes in this process
+        :param fetch_workers: Number of threads fetching batches of INSTLIST_MAX_SIZE instruments
+        :param queue_size: Max. number of fetched workbooks waiting to be written
+        """
+        journal_path = constants.EXPORT_PATH + "excel_export.journal"
+        export_date, done = self._read_journal(journal_path)
+        os.makedirs(constants.EXPORT_PATH, exist_ok=True)
+        with open(journal_path, "a") as journal:
+            if export_date is None:
+                export_date = str(dt.datetime.now().date())
+                journal.write(f"date {export_date}\n")
+                journal.flush()
+            ins_ids = [ins_id for ins_id in self._instruments.index.tolist() if ins_id not in done]
+            tasks = queue.Queue(maxsize=queue_size)
+            stop = threading.Event()
+            producer = threading.Thread(target=self._produce, args=(ins_ids, export_date, tasks, stop, fetch_workers),
+                                        daemon=True)
+            if workers == 0:
+                producer.start()
+                try:
+                    self._write(tasks, journal)
+                finally:
+                    stop.set()
+                    producer.join()
+            else:
+                workers = workers or os.cpu_count()
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    # start the writer processes before the fetcher threads, forking while they run is not safe
+                    pool.submit(os.getpid).result()
+                    producer.start()
+                    try:
+                        self._write_pool(tasks, journal, pool, workers)
+                    finally:
+                        stop.set()
+                        producer.join()
+        os.remove(journal_path)
+
+    @staticmethod
+    def _read_journal(journal_path):
+        """
+        :param journal_path: Journal file path
+        :return: (export date of an unfinished export or None, set of exported instrument ids)
+        """
+        if not os.path.exists(journal_path):
+            return None, set()
+        with open(journal_path) as journal:
+            lines = journal.read().split("\n")
+        # the last line may be cut off by the interruption, only complete lines count
+        lines = [line for line in lines[:-1] if line]
+        if not lines or not lines[0].startswith("date "):
+            return None, set()
+        return lines[0][len("date "):], {int(line) for line in lines[1:]}
+
+    def _produce(self, ins_ids, export_date, tasks, stop, fetch_workers):
+        """
+        Fetch instruments in batches and put (ins_id, path, sheets) on the queue, then _DONE.
+        An exception is put on the queue instead, to be raised by the consumer.
+        """
+        def put(item):
+            while not stop.is_set():
+                try:
+                    tasks.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def fetch(batch):
+            if stop.is_set():
+                return
+            for task in self._fetch_batch(batch, export_date):
+                put(task)
+
+        batches = [ins_ids[i:i + INSTLIST_MAX_SIZE] for i in range(0, len(ins_ids), INSTLIST_MAX_SIZE)]
+        try:
+            with ThreadPoolExecutor(max_workers=fetch_workers) as executor:
+                list(executor.map(fetch, batches))
+        except Exception as error:
+            put(error)
+            return
+        put(_DONE)
+
+    def _write(self, tasks, journal):
+        """
+        Write the queued workbooks in this process and record each finished instrument in the journal
+        """
+        while (task := self._next_task(tasks)) is not _DONE:
+            ins_id, path, sheets = task
+            _write_workbook(path, sheets)
+            self._finished(journal, ins_id, path)
+
+    def _write_pool(self, tasks, journal, pool, workers):
+        """
+        Write the queued workbooks in the writer processes and record each finished instrument in the journal
+        """
+        pending = {}
+        try:
+            while (task := self._next_task(tasks)) is not _DONE:
+                ins_id, path, sheets = task
+                pending[pool.submit(_write_workbook, path, sheets)] = ins_id
+                if len(pending) >= 2 * workers:
+                    self._collect(pending, journal, FIRST_COMPLETED)
+        finally:
+            # record what was written before an error, too
+            self._collect(pending, journal)
+
+    @staticmethod
+    def _next_task(tasks):
+        task = tasks.get()
+        if isinstance(task, BaseException):
+            raise task
+        return task
+
+    def _collect(self, pending, journal, return_when=ALL_COMPLETED):
+        finished, _ = wait(pending, return_when=return_when)
+        for future in finished:
+            ins_id = pending.pop(future)
+            self._finished(journal, ins_id, future.result())
+
+    @staticmethod
+    def _finished(journal, ins_id, path):
+        journal.write(f"{ins_id}\n")
+        journal.flush()
+        print(f'Excel exported: {path}')
+
+    def _fetch_batch(self, batch, export_date):
+        """
+        Fetch prices and reports for a batch of instruments with batched calls
+        :param batch: Instrument ID list, at most INSTLIST_MAX_SIZE
+        :param export_date: Export date folder, e.g. '2024-01-31'
+        :return: Generator of (ins_id, path, sheets)
+        """
+        # missing values and column names as in the single-instrument calls the export was made from
+        stock_prices = self._api.get_instrument_stock_prices_list(batch, fillna=None)
+        reports_quarter, reports_year, reports_r12 = self._api.get_instrument_report_list(batch, fillna=None,
+                                                                                         lowercase=False)
+        stock_prices = self._by_instrument(stock_prices)
+        reports_quarter = self._by_instrument(reports_quarter)
+        reports_year = self._by_instrument(reports_year)
+        reports_r12 = self._by_instrument(reports_r12)
+        for ins_id in batch:
+            instrument = self._instruments.loc[ins_id]
             # map the instruments market/country id (integer) to its string representation in the market/country-table
-            market = self._markets.loc[self._markets['id'] == instrument['marketId']]['name'].values[0].lower().replace(' ', '_')
-            country = self._countries.loc[self._countries['id'] == instrument['countryId']]['name'].values[0].lower().replace(' ', '_')
-            export_path = constants.EXPORT_PATH + f"{dt.datetime.now().date()}/{country}/{market}/"
+            market = self._markets.loc[instrument['marketId'], 'name'].lower().replace(' ', '_')
+            country = self._countries.loc[instrument['countryId'], 'name'].lower().replace(' ', '_')
+            export_path = constants.EXPORT_PATH + f"{export_date}/{country}/{market}/"
             instrument_name = instrument['name'].lower().replace(' ', '_')
             # creating necessary folders if they do not exist
-            if not os.path.exists(export_path):
-                os.makedirs(export_path)
-            # creating the writer with export location
-            excel_writer = pd.ExcelWriter(export_path + instrument_name + ".xlsx")
-            stock_prices.to_excel(excel_writer, 'stock_prices')
-            reports_quarter.to_excel(excel_writer, 'reports_quarter')
-            reports_year.to_excel(excel_writer, 'reports_year')
-            reports_r12.to_excel(excel_writer, 'reports_r12')
-            excel_writer._save()
-            print(f'Excel exported: {export_path + instrument_name + ".xlsx"}')
+            os.makedirs(export_path, exist_ok=True)
+            sheets = [('stock_prices', self._instrument_frame(stock_prices, ins_id, 'date', False)),
+                      ('reports_quarter', self._instrument_frame(reports_quarter, ins_id, ['year', 'period'], False)),
+                      ('reports_year', self._instrument_frame(reports_year, ins_id, ['year', 'period'], False)),
+                      ('reports_r12', self._instrument_frame(reports_r12, ins_id, ['year', 'period'], False))]
+            yield ins_id, export_path + instrument_name + ".xlsx", sheets
+
+    @staticmethod
+    def _by_instrument(df):
+        """
+        :param df: pd.DataFrame of a batched response
+        :return: dict of stock_id -> pd.DataFrame, empty if the response has no rows
+        """
+        if 'stock_id' not in df:
+            return {}
+        return dict(list(df.groupby('stock_id')))
 
+    @staticmethod
+    def _instrument_frame(frames, ins_id, index, ascending):
+        """
+        Get one instruments rows from a batched response, indexed like the single-instrument calls
+        :param frames: dict of stock_id -> pd.DataFrame
+        :param ins_id: Instrument ID
+        :param index: Column name(s) to set to index
+        :param ascending: True to sort index ascending
+        :return: pd.DataFrame
+        """
+        if ins_id not in frames:
+            return pd.DataFrame()
+        df = frames[ins_id].drop(columns='stock_id').set_index(index)
+        return df.sort_index(ascending=ascending)
 
 if __name__ == "__main__":
     excel = ExcelExporter()
@@ -0,0 +1,40 @@
+"""
+Deferred imports of the heavy dependencies (pandas, numpy, matplotlib), so importing the API
+core stays fast for short-lived jobs that never build a DataFrame or a plot.
+"""
+import importlib
+import sys
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access
+    """
+    def __init__(self, name):
+        """
+        :param name: Module name, e.g. 'pandas' or 'matplotlib.pylab'
+        """
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            # import_module holds the import lock, concurrent first uses get the same module
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name):
+    """
+    :param name: Module name
+    :return: LazyModule, or the module itself if it is already imported
+    """
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
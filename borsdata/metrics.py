@@ -0,0 +1,132 @@
+"""
+Per-endpoint instrumentation of BorsdataAPI: request counts, latency histogram, bytes received,
+rate limiter sleep, retries, cache hits, JSON decode time and DataFrame build time.
+
+Hooks are called with every finished span ('request', 'decode', 'frame'), e.g. to forward them
+to OpenTelemetry:
+
+    def otel_hook(name, endpoint, start, duration, attributes):
+        span = tracer.start_span(name, start_time=int(start * 1e9), attributes={"endpoint": endpoint, **attributes})
+        span.end(end_time=int((start + duration) * 1e9))
+
+    api.metrics.add_hook(otel_hook)
+"""
+import copy
+import threading
+import time
+from contextlib import contextmanager
+from borsdata.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+# upper bounds in seconds of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
+
+COUNTERS = ["requests", "errors", "retries", "cache_hits", "coalesced", "bytes", "request_seconds",
+            "limiter_wait_seconds", "decode_seconds", "frame_seconds"]
+
+
+class Metrics:
+    """
+    Thread-safe counters per endpoint template (e.g. 'instruments/{id}/stockprices')
+    """
+    def __init__(self, latency_buckets=LATENCY_BUCKETS):
+        """
+        :param latency_buckets: Ascending upper bounds in seconds of the latency histogram buckets
+        """
+        self._latency_buckets = latency_buckets
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._hooks = []
+
+    def add_hook(self, hook):
+        """
+        :param hook: Function called with (name, endpoint, start, duration, attributes) for every
+            finished span, start as a Unix timestamp and duration in seconds
+        """
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    def _endpoint(self, endpoint):
+        # called with the lock held
+        metrics = self._endpoints.get(endpoint)
+        if metrics is None:
+            metrics = self._endpoints[endpoint] = dict.fromkeys(COUNTERS, 0)
+            metrics["latency_histogram"] = [0] * len(self._latency_buckets)
+        return metrics
+
+    def add(self, endpoint, **counters):
+        """
+        Increment counters of an endpoint, e.g. add('instruments', retries=1)
+        :param endpoint: Endpoint template
+        :param counters: Counter name -> amount
+        """
+        with self._lock:
+            metrics = self._endpoint(endpoint)
+            for name, value in counters.items():
+                metrics[name] += value
+
+    def record(self, name, endpoint, duration, start=None, **attributes):
+        """
+        Record a finished span
+        :param name: 'request' (one HTTP attempt, attributes status and bytes), 'decode' or 'frame'
+        :param endpoint: Endpoint template
+        :param duration: Seconds
+        :param start: Unix timestamp of the start, default now - duration
+        :param attributes: Span attributes passed to the hooks
+        """
+        with self._lock:
+            metrics = self._endpoint(endpoint)
+            metrics[f"{name}_seconds"] += duration
+            if name == "request":
+                metrics["requests"] += 1
+                metrics["bytes"] += attributes.get("bytes", 0)
+                if attributes.get("status") != 200:
+                    metrics["errors"] += 1
+                bucket = next(i for i, bound in enumerate(self._latency_buckets) if duration <= bound)
+                metrics["latency_histogram"][bucket] += 1
+        start = time.time() - duration if start is None else start
+        for hook in list(self._hooks):
+            hook(name, endpoint, start, duration, attributes)
+
+    @contextmanager
+    def span(self, name, endpoint, **attributes):
+        """
+        Time the with-block as a span, attributes can be added to the yielded dict
+        :param name: Span name, see record
+        :param endpoint: Endpoint template
+        :param attributes: Span attributes
+        """
+        start = time.time()
+        started = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            self.record(name, endpoint, time.perf_counter() - started, start=start, **attributes)
+
+    def snapshot(self):
+        """
+        :return: dict of endpoint -> dict of counter -> value, with 'latency_histogram' as
+            dict of bucket upper bound (str) -> number of requests
+        """
+        with self._lock:
+            endpoints = copy.deepcopy(self._endpoints)
+        for metrics in endpoints.values():
+            metrics["latency_histogram"] = {str(bound): count for bound, count in
+                                            zip(self._latency_buckets, metrics["latency_histogram"])}
+        return endpoints
+
+    def to_frame(self):
+        """
+        :return: pd.DataFrame of the counters, one row per endpoint, sorted by time spent in requests
+        """
+        snapshot = self.snapshot()
+        df = pd.DataFrame([{name: metrics[name] for name in COUNTERS} for metrics in snapshot.values()],
+                          index=pd.Index(list(snapshot), name="endpoint"), columns=COUNTERS)
+        return df.sort_values("request_seconds", ascending=False)
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
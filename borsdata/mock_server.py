@@ -0,0 +1,438 @@
+"""
+Local stand-in for the Börsdata API, for offline tests and benchmarks:
+
+    with MockBorsdataServer(universe_size=1000, latency=(0.02, 0.08), rate_limit=(100, 10)) as server:
+        api = BorsdataAPI("offline", url_root=server.url_root)
+
+Requests are answered from recorded fixtures (see replay.py) if a fixture directory is given,
+otherwise with deterministic synthetic payloads.
+"""
+import collections
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+import numpy as np
+from borsdata import replay
+
+# instrument id of the synthetic OMX Stockholm Large Cap index, as in the API
+INDEX_INS_ID = 643
+FIRST_DATE = "2000-01-03"
+LAST_DATE = "2024-12-31"
+
+COUNTRIES = [{"id": 1, "name": "Sverige"}, {"id": 2, "name": "Norge"}, {"id": 3, "name": "Finland"},
+             {"id": 4, "name": "Danmark"}]
+MARKETS = [{"id": 1, "name": "Large Cap", "countryId": 1, "isIndex": False, "exchangeName": "Nasdaq Stockholm"},
+           {"id": 2, "name": "Mid Cap", "countryId": 1, "isIndex": False, "exchangeName": "Nasdaq Stockholm"},
+           {"id": 3, "name": "Small Cap", "countryId": 1, "isIndex": False, "exchangeName": "Nasdaq Stockholm"},
+           {"id": 4, "name": "First North", "countryId": 1, "isIndex": False, "exchangeName": "First North"},
+           {"id": 5, "name": "Index", "countryId": 1, "isIndex": True, "exchangeName": "Nasdaq Stockholm"},
+           {"id": 6, "name": "Oslo Børs", "countryId": 2, "isIndex": False, "exchangeName": "Oslo Børs"},
+           {"id": 7, "name": "Large Cap", "countryId": 3, "isIndex": False, "exchangeName": "Nasdaq Helsinki"},
+           {"id": 8, "name": "Large Cap", "countryId": 4, "isIndex": False, "exchangeName": "Nasdaq Copenhagen"}]
+SECTORS = [{"id": 1, "name": "Finans & Fastighet"}, {"id": 2, "name": "Industri"}, {"id": 3, "name": "Teknologi"},
+           {"id": 4, "name": "Hälsovård"}, {"id": 5, "name": "Sällanköpsvaror"}]
+BRANCHES = [{"id": sector["id"] * 10 + i, "name": f"{sector['name']} {i}", "sectorId": sector["id"]}
+            for sector in SECTORS for i in range(1, 3)]
+KPIS = {1: "Direktavkastning", 2: "P/E", 3: "P/S", 4: "P/B", 10: "EV/EBIT", 33: "ROE", 94: "Rapport"}
+REPORT_FIELDS = ["revenues", "gross_Income", "operating_Income", "profit_Before_Tax", "profit_To_Equity_Holders",
+                 "earnings_Per_Share", "number_Of_Shares", "dividend", "total_Assets", "total_Equity", "net_Debt",
+                 "free_Cash_Flow"]
+
+
+class SyntheticUniverse:
+    """
+    Deterministic synthetic payloads in the API's format for a universe of instruments.
+    The same seed and size always give the same payloads.
+    """
+    def __init__(self, size=100, seed=0):
+        """
+        :param size: Number of stocks, the index INDEX_INS_ID comes on top
+        :param seed: Random seed
+        """
+        self._seed = seed
+        rng = random.Random(seed)
+        stock_ids = [ins_id for ins_id in range(1, size + 2) if ins_id != INDEX_INS_ID][:size]
+        markets = [market for market in MARKETS if not market["isIndex"]]
+        self.instruments = {}
+        for ins_id in stock_ids:
+            market = rng.choice(markets)
+            branch = rng.choice(BRANCHES)
+            self.instruments[ins_id] = {
+                "insId": ins_id, "name": f"Bolag {ins_id}", "urlName": f"bolag-{ins_id}", "instrument": 0,
+                "isin": f"SE{ins_id:010d}", "ticker": f"BOL{ins_id}", "yahoo": f"BOL{ins_id}.ST",
+                "sectorId": branch["sectorId"], "marketId": market["id"], "branchId": branch["id"],
+                "countryId": market["countryId"], "listingDate": f"{rng.randint(1990, 2015)}-01-01T00:00:00",
+                "stockPriceCurrency": "SEK", "reportCurrency": "SEK"}
+        self.instruments[INDEX_INS_ID] = {
+            "insId": INDEX_INS_ID, "name": "OMX Stockholm Large Cap", "urlName": "omxslcpi", "instrument": 2,
+            "isin": None, "ticker": "OMXSLCPI", "yahoo": "^OMXSLCPI", "sectorId": None, "marketId": 5,
+            "branchId": None, "countryId": 1, "listingDate": None, "stockPriceCurrency": "SEK", "reportCurrency": None}
+        self.dates = np.arange(np.datetime64(FIRST_DATE), np.datetime64(LAST_DATE) + 1)
+        self.dates = self.dates[np.is_busday(self.dates)]
+        self.splits = {ins_id: f"20{10 + ins_id % 10}-06-01T00:00:00" for ins_id in stock_ids[::25]}
+        # per universe, so the payloads go away with it
+        self._prices_cache = {}
+        self._price_rows_cache = {}
+        self._routes = [
+            (r"branches", lambda params: {"branches": BRANCHES}),
+            (r"countries", lambda params: {"countries": COUNTRIES}),
+            (r"markets", lambda params: {"markets": MARKETS}),
+            (r"sectors", lambda params: {"sectors": SECTORS}),
+            (r"translationmetadata", lambda params: {"translationMetadatas": [
+                {"translationKey": "revenues", "nameSv": "Omsättning", "nameEn": "Revenues"}]}),
+            (r"instruments", lambda params: {"instruments": list(self.instruments.values())}),
+            (r"instruments/updated", lambda params: {"instruments": [
+                {"insId": ins_id, "updatedAt": f"{LAST_DATE}T06:00:00"} for ins_id in self.instruments]}),
+            (r"instruments/stocksplits", self.stock_splits),
+            (r"instruments/stockprices", self.stock_prices_list),
+            (r"instruments/stockprices/last", lambda params: self.stock_prices_date({"date": LAST_DATE})),
+            (r"instruments/stockprices/date", self.stock_prices_date),
+            (r"instruments/(\d+)/stockprices", self.stock_prices),
+            (r"instruments/reports", self.reports_list),
+            (r"instruments/reports/metadata", lambda params: {"reportMetadatas": [
+                {"reportPropery": field.lower(), "nameSv": field, "nameEn": field, "format": "mnkr"}
+                for field in REPORT_FIELDS]}),
+            (r"instruments/(\d+)/reports", self.reports),
+            (r"instruments/(\d+)/reports/(year|r12|quarter)", self.reports_type),
+            (r"instruments/kpis/metadata", lambda params: {"kpiHistoryMetadatas": [
+                {"kpiId": kpi_id, "nameSv": name, "nameEn": name, "format": "", "isString": kpi_id == 94}
+                for kpi_id, name in KPIS.items()]}),
+            (r"instruments/kpis/updated", lambda params: {"kpisCalcUpdated": f"{LAST_DATE}T06:00:00"}),
+            (r"instruments/kpis/(\d+)/(\w+)/(\w+)", self.kpi_screener),
+            (r"instruments/(\d+)/kpis/(\d+)/(\w+)/(\w+)", self.kpi_screener_instrument),
+            (r"instruments/kpis/(\d+)/(year|r12|quarter)/(\w+)/history", self.kpi_history_list),
+            (r"instruments/(\d+)/kpis/(\d+)/(year|r12|quarter)/(\w+)/history", self.kpi_history),
+            (r"instruments/(\d+)/kpis/(year|r12|quarter)/summary", self.kpi_summary),
+        ]
+
+    def payload(self, path, params):
+        """
+        :param path: Path relative to the API root, e.g. 'instruments/3/stockprices'
+        :param params: URL parameters dict
+        :return: JSON payload (dict, or already encoded str), None for unknown paths and instruments
+        """
+        for pattern, route in self._routes:
+            match = re.fullmatch(pattern, path)
+            if match:
+                try:
+                    return route(params, *match.groups())
+                except KeyError:
+                    return None
+        return None
+
+    def _rng(self, *keys):
+        return np.random.default_rng([self._seed, *keys])
+
+    def _known(self, ins_id):
+        """
+        :return: ins_id as int, KeyError (404) for instruments not in the universe
+        """
+        ins_id = int(ins_id)
+        if ins_id not in self.instruments:
+            raise KeyError(ins_id)
+        return ins_id
+
+    def _ins_ids(self, params):
+        return [int(ins_id) for ins_id in params.get("instList", "").split(",") if int(ins_id) in self.instruments]
+
+    def _prices(self, ins_id):
+        """
+        :return: (dates, close, high, low, open, volume) of a random walk from the listing date
+        """
+        if ins_id not in self._prices_cache:
+            self._prices_cache[ins_id] = self._random_walk(ins_id)
+        return self._prices_cache[ins_id]
+
+    def _random_walk(self, ins_id):
+        rng = self._rng(ins_id, 1)
+        first = 0 if ins_id == INDEX_INS_ID else int(rng.integers(0, len(self.dates) // 2))
+        returns = rng.normal(0.0002, 0.015 if ins_id != INDEX_INS_ID else 0.01, len(self.dates) - first)
+        close = np.round(rng.uniform(20, 500) * np.exp(np.cumsum(returns)), 2)
+        spread = np.abs(rng.normal(0, 0.01, len(close)))
+        high = np.round(close * (1 + spread), 2)
+        low = np.round(close * (1 - spread), 2)
+        open_ = np.round(np.clip(close * (1 + rng.normal(0, 0.005, len(close))), low, high), 2)
+        volume = rng.integers(1_000, 2_000_000, len(close))
+        if ins_id in self.splits:
+            # as traded, a 2:1 split halves the price
+            before = self.dates[first:] < np.datetime64(self.splits[ins_id][:10])
+            close, high, low, open_ = (np.where(before, values * 2, values) for values in (close, high, low, open_))
+            volume = np.where(before, volume // 2, volume)
+        return self.dates[first:], close, high, low, open_, volume
+
+    def _price_rows(self, ins_id):
+        """
+        :return: (dates, list of JSON encoded price rows), encoded once per instrument since
+            encoding dominates the time to answer price requests
+        """
+        if ins_id in self._price_rows_cache:
+            return self._price_rows_cache[ins_id]
+        dates, close, high, low, open_, volume = self._prices(ins_id)
+        rows = [f'{{"d":"{d}","h":{h},"l":{l},"c":{c},"o":{o},"v":{v}}}' for d, h, l, c, o, v in
+                zip(dates.astype(str).tolist(), high.tolist(), low.tolist(), close.tolist(), open_.tolist(),
+                    volume.tolist())]
+        self._price_rows_cache[ins_id] = dates, rows
+        return dates, rows
+
+    def _price_list(self, ins_id, from_date=None, to_date=None):
+        """
+        :return: JSON encoded price list between from_date and to_date
+        """
+        dates, rows = self._price_rows(ins_id)
+        first = np.searchsorted(dates, np.datetime64(from_date[:10])) if from_date else 0
+        last = np.searchsorted(dates, np.datetime64(to_date[:10]), side="right") if to_date else len(dates)
+        return "[" + ",".join(rows[first:last]) + "]"
+
+    def stock_prices(self, params, ins_id):
+        ins_id = self._known(ins_id)
+        price_list = self._price_list(ins_id, params.get("from"), params.get("to"))
+        return f'{{"instrument":{ins_id},"stockPricesList":{price_list}}}'
+
+    def stock_prices_list(self, params):
+        price_lists = [f'{{"instrument":{ins_id},"stockPricesList":'
+                       f'{self._price_list(ins_id, params.get("from"), params.get("to"))}}}'
+                       for ins_id in self._ins_ids(params)]
+        return '{"stockPricesArrayList":[' + ",".join(price_lists) + "]}"
+
+    def stock_prices_date(self, params):
+        date = np.datetime64(params["date"][:10])
+        prices = []
+        for ins_id in self.instruments:
+            dates, close, high, low, open_, volume = self._prices(ins_id)
+            row = np.searchsorted(dates, date)
+            if row < len(dates) and dates[row] == date:
+                prices.append({"i": ins_id, "d": str(date), "h": float(high[row]), "l": float(low[row]),
+                               "c": float(close[row]), "o": float(open_[row]), "v": int(volume[row])})
+        return {"stockPricesList": prices}
+
+    def stock_splits(self, params):
+        return {"stockSplitList": [{"instrumentId": ins_id, "splitType": "Split", "ratio": "2:1", "splitDate": date}
+                                   for ins_id, date in self.splits.items()]}
+
+    def _reports(self, ins_id, report_type, max_count=None):
+        """
+        :return: Reports of an instrument, latest first
+        """
+        if self.instruments[ins_id]["instrument"] != 0:
+            return []
+        rng = self._rng(ins_id, 2)
+        periods = [(year, quarter) for year in range(2005, 2025) for quarter in range(1, 5)]
+        shares = float(rng.integers(10, 1000)) * 1e6
+        revenues = rng.uniform(100, 20_000) * np.exp(np.cumsum(rng.normal(0.01, 0.05, len(periods))))
+        margin = rng.uniform(-0.05, 0.25) + rng.normal(0, 0.03, len(periods))
+        reports = []
+        for row, (year, quarter) in enumerate(periods):
+            window = slice(max(row - 3, 0), row + 1) if report_type != "quarter" else slice(row, row + 1)
+            if report_type == "year" and quarter != 4:
+                continue
+            quarter_revenues = revenues[window].sum() if report_type != "quarter" else revenues[row]
+            operating_income = float(np.sum(revenues[window] * margin[window]))
+            net_income = operating_income * 0.78
+            report = {"year": year, "period": 5 if report_type == "year" else quarter,
+                      "revenues": round(float(quarter_revenues), 1),
+                      "gross_Income": round(float(quarter_revenues) * 0.4, 1),
+                      "operating_Income": round(operating_income, 1),
+                      "profit_Before_Tax": round(operating_income * 0.95, 1),
+                      "profit_To_Equity_Holders": round(net_income, 1),
+                      "earnings_Per_Share": round(net_income * 1e6 / shares, 2),
+                      "number_Of_Shares": round(shares / 1e6, 2),
+                      "dividend": round(max(net_income, 0) * 0.4e6 / shares, 2) if quarter == 4 else 0.0,
+                      "total_Assets": round(float(quarter_revenues) * 2.0, 1),
+                      "total_Equity": round(float(quarter_revenues) * 0.8, 1),
+                      "net_Debt": round(float(quarter_revenues) * 0.3, 1),
+                      "free_Cash_Flow": round(net_income * 0.9, 1),
+                      "currency": "SEK",
+                      "report_Start_Date": f"{year}-{3 * quarter - 2:02d}-01T00:00:00",
+                      "report_End_Date": f"{year}-{3 * quarter:02d}-{30 if quarter in (2, 3) else 31}T00:00:00",
+                      "report_Date": f"{year + (quarter == 4)}-{(3 * quarter + 1) % 12 + 1:02d}-20T00:00:00",
+                      "broken_Fiscal_Year": False}
+            reports.append(report)
+        reports.reverse()
+        if max_count is not None:
+            reports = reports[:int(max_count)]
+        return reports
+
+    def _all_reports(self, ins_id, max_count=None):
+        return {"instrument": ins_id,
+                "reportsQuarter": self._reports(ins_id, "quarter", max_count),
+                "reportsYear": self._reports(ins_id, "year", max_count),
+                "reportsR12": self._reports(ins_id, "r12", max_count)}
+
+    def reports(self, params, ins_id):
+        return self._all_reports(self._known(ins_id), params.get("maxCount"))
+
+    def reports_type(self, params, ins_id, report_type):
+        ins_id = self._known(ins_id)
+        return {"instrument": ins_id, "reports": self._reports(ins_id, report_type, params.get("maxCount"))}
+
+    def reports_list(self, params):
+        return {"reportList": [self._all_reports(ins_id, params.get("maxCount")) for ins_id in self._ins_ids(params)]}
+
+    def _kpi_value(self, ins_id, kpi_id, *keys):
+        if int(kpi_id) == 94:
+            return {"i": ins_id, "n": None, "s": f"{LAST_DATE[:4]}-Q4"}
+        rng = self._rng(ins_id, 3, int(kpi_id), *[sum(map(ord, key)) for key in keys])
+        return {"i": ins_id, "n": round(float(rng.uniform(-5, 40)), 2), "s": None}
+
+    def kpi_screener(self, params, kpi_id, calc_group, calc):
+        return {"kpiId": int(kpi_id), "group": calc_group, "calculation": calc,
+                "values": [self._kpi_value(ins_id, kpi_id, calc_group, calc) for ins_id in self.instruments]}
+
+    def kpi_screener_instrument(self, params, ins_id, kpi_id, calc_group, calc):
+        return {"kpiId": int(kpi_id), "group": calc_group, "calculation": calc,
+                "value": self._kpi_value(self._known(ins_id), kpi_id, calc_group, calc)}
+
+    def _kpi_history(self, ins_id, kpi_id, report_type, price_type, max_count=None):
+        reports = self._reports(ins_id, report_type, max_count)
+        rng = self._rng(ins_id, 4, int(kpi_id), sum(map(ord, report_type + price_type)))
+        return [{"y": report["year"], "p": report["period"], "v": round(float(value), 3)}
+                for report, value in zip(reports, rng.uniform(-5, 40, len(reports)))]
+
+    def kpi_history(self, params, ins_id, kpi_id, report_type, price_type):
+        return {"kpiId": int(kpi_id), "reportTime": report_type, "priceValue": price_type,
+                "values": self._kpi_history(self._known(ins_id), kpi_id, report_type, price_type,
+                                            params.get("maxCount"))}
+
+    def kpi_history_list(self, params, kpi_id, report_type, price_type):
+        return {"kpiId": int(kpi_id), "reportTime": report_type, "priceValue": price_type,
+                "kpisList": [{"instrument": ins_id,
+                              "values": self._kpi_history(ins_id, kpi_id, report_type, price_type,
+                                                          params.get("maxCount"))}
+                             for ins_id in self._ins_ids(params)]}
+
+    def kpi_summary(self, params, ins_id, report_type):
+        ins_id = self._known(ins_id)
+        return {"instrument": ins_id, "reportTime": report_type,
+                "kpis": [{"KpiId": kpi_id, "values": self._kpi_history(ins_id, kpi_id, report_type, "mean",
+                                                                       params.get("maxCount"))}
+                         for kpi_id in KPIS if kpi_id != 94]}
+
+
+class MockBorsdataServer:
+    """
+    HTTP server on localhost answering like the Börsdata API, in a background thread
+    """
+    def __init__(self, fixtures=None, universe_size=100, seed=0, latency=0.0, rate_limit=None,
+                 host="127.0.0.1", port=0):
+        """
+        :param fixtures: Directory of recorded fixtures to answer from, synthetic payloads for the rest
+        :param universe_size: Number of synthetic stocks
+        :param seed: Random seed of the synthetic payloads
+        :param latency: Seconds added to every response, or a (min, max) tuple for a random latency
+        :param rate_limit: (calls, seconds) per authKey before answering 429 with Retry-After,
+            e.g. (100, 10) like the API. None for no limit
+        :param host: Interface to listen on
+        :param port: Port, 0 for a free port
+        """
+        self.universe = SyntheticUniverse(universe_size, seed)
+        self._fixtures = fixtures
+        self._latency = latency if isinstance(latency, tuple) else (latency, latency)
+        self._rate_limit = rate_limit
+        self._calls = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url_root(self):
+        """
+        :return: URL root to pass as BorsdataAPI(url_root=...)
+        """
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _retry_after(self, auth_key):
+        """
+        Count a call against the rate limit of auth_key
+        :return: Seconds until the next call is allowed, 0 if this call is allowed
+        """
+        if self._rate_limit is None:
+            return 0
+        calls, seconds = self._rate_limit
+        now = time.monotonic()
+        with self._lock:
+            window = self._calls[auth_key]
+            while window and window[0] <= now - seconds:
+                window.popleft()
+            if len(window) >= calls:
+                self.throttled += 1
+                return window[0] + seconds - now
+            window.append(now)
+            return 0
+
+    def respond(self, path, params):
+        """
+        :param path: Path relative to the API root
+        :param params: URL parameters dict
+        :return: (status code, body bytes, headers dict)
+        """
+        with self._lock:
+            self.requests += 1
+        if "authKey" not in params:
+            return 401, b'{"message":"Missing authKey"}', {}
+        retry_after = self._retry_after(params["authKey"])
+        if retry_after > 0:
+            return 429, b'{"message":"Too many requests"}', {"Retry-After": str(math.ceil(retry_after))}
+        time.sleep(random.uniform(*self._latency))
+        if self._fixtures is not None:
+            fixture = replay.load_fixture(self._fixtures, path, params)
+            if fixture is not None:
+                return fixture["status"], fixture["body"].encode("utf-8"), fixture["headers"]
+        payload = self.universe.payload(path, params)
+        if payload is None:
+            return 404, b'{"message":"Not found"}', {}
+        if not isinstance(payload, str):
+            payload = json.dumps(payload, separators=(",", ":"))
+        return 200, payload.encode("utf-8"), {}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # header and body are separate writes, avoid the delayed ACK stall on keep-alive connections
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if not url.path.startswith("/v1/"):
+                    status, body, headers = 404, b'{"message":"Not found"}', {}
+                else:
+                    status, body, headers = server.respond(replay.endpoint_path(url.path), dict(parse_qsl(url.query)))
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in headers.items():
+                    if key.lower() not in ("content-type", "content-length"):
+                        self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
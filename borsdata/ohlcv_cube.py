@@ -0,0 +1,259 @@
+"""
+Fixed-layout binary cube of daily prices for a whole instrument universe, built from a PriceStore.
+Each field is one raw float64 file of (trading day x instrument), row-major, next to a calendar
+and the instrument ids of the columns. meta.json names the current generation of these files:
+
+    cube/meta.json  calendar.<n>.npy  ins_ids.<n>.npy  open.<n>.f8  high.<n>.f8  ...  volume.<n>.f8
+
+Readers memory-map the field files, so slicing days or fields copies nothing and processes on the
+same machine share the pages. A new trading day is one row at the end of each file, appending it
+writes only that row. A rebuild writes the files of a new generation and switches to them by
+replacing meta.json, so readers never pair files of different shapes. meta.json is written last
+and holds the number of complete days and the last day stored of every instrument.
+
+Prices are as traded, like in the PriceStore: the cube is not split-adjusted. A history the store
+refetched after a split rebuilds it, still as traded. Split-adjust the panels read from it with
+borsdata.splits.SplitAdjuster.
+"""
+import glob
+import json
+import os
+import re
+import threading
+from borsdata.price_panel import PricePanel, PANEL_FIELDS
+from borsdata.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+DTYPE = "<f8"
+
+
+def _save(path, name, array):
+    # replaced, not rewritten, so readers never see a partial file
+    with open(os.path.join(path, name + ".tmp"), "wb") as file:
+        np.save(file, array)
+    os.replace(os.path.join(path, name + ".tmp"), os.path.join(path, name))
+
+
+def _rows(columns):
+    """
+    Align per-instrument columns on their common calendar
+    :param columns: List of dicts of 'date' and PANEL_FIELDS -> np.ndarray (PriceStore.read_columns), or None
+    :return: (dates, dict of field -> np.ndarray of shape (len(dates), len(columns)))
+    """
+    stored = [ins_columns["date"] for ins_columns in columns if ins_columns is not None]
+    dates = np.unique(np.concatenate(stored)) if stored else np.array([], dtype="datetime64[D]")
+    fields = {}
+    for field in PANEL_FIELDS:
+        values = np.full((len(dates), len(columns)), np.nan, dtype=DTYPE)
+        for column, ins_columns in enumerate(columns):
+            if ins_columns is not None:
+                values[np.searchsorted(dates, ins_columns["date"]), column] = ins_columns[field]
+        fields[field] = values
+    return dates, fields
+
+
+class OHLCVCube:
+    """
+    Memory-mapped (trading day x instrument) price arrays, one per field. Days an instrument has no
+    price for are NaN. The instruments are fixed when the cube is built, update rebuilds the cube
+    when the store has new instruments or refetched histories (splits).
+    """
+    def __init__(self, path):
+        """
+        :param path: Cube directory, written by build
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        with open(os.path.join(self._path, "meta.json")) as file:
+            self.meta = json.load(file)
+        generation = self.meta["generation"]
+        # the calendar is written before meta.json, it may already hold a day being appended
+        self.dates = np.load(os.path.join(self._path, f"calendar.{generation}.npy"))[:self.meta["days"]]
+        self.ins_ids = np.load(os.path.join(self._path, f"ins_ids.{generation}.npy"))
+        self._column = {ins_id: i for i, ins_id in enumerate(self.ins_ids.tolist())}
+        self._fields = {}
+
+    def _file(self, field):
+        return os.path.join(self._path, f"{field}.{self.meta['generation']}.f8")
+
+    @classmethod
+    def build(cls, path, store, ins_ids=None):
+        """
+        Write a cube of the prices in a PriceStore, as a new generation next to the one readers may have open
+        :param path: Cube directory
+        :param store: PriceStore
+        :param ins_ids: Instrument ID list, None for all stored instruments
+        :return: OHLCVCube
+        """
+        ins_ids = sorted(int(ins_id) for ins_id in (store.ins_ids() if ins_ids is None else ins_ids))
+        columns = [store.read_columns(ins_id) for ins_id in ins_ids]
+        dates, fields = _rows(columns)
+        os.makedirs(path, exist_ok=True)
+        generation = cls._generation(path) + 1
+        for field, values in fields.items():
+            values.tofile(os.path.join(path, f"{field}.{generation}.f8"))
+        _save(path, f"calendar.{generation}.npy", dates.astype("datetime64[D]"))
+        _save(path, f"ins_ids.{generation}.npy", np.array(ins_ids, dtype=np.int64))
+        meta = {"generation": generation, "fields": PANEL_FIELDS, "dtype": DTYPE, "days": len(dates),
+                "instruments": len(ins_ids),
+                "last_dates": {str(ins_id): None if ins_columns is None else str(ins_columns["date"][-1])
+                               for ins_id, ins_columns in zip(ins_ids, columns)},
+                "splits": {str(ins_id): store.splits(ins_id) for ins_id in ins_ids}}
+        cls._write_meta(path, meta)
+        # the previous generation stays for readers that opened it just before the switch
+        for name in glob.glob(os.path.join(path, "*.*.*")):
+            match = re.search(r"\.(\d+)\.(f8|npy)$", name)
+            if match and int(match.group(1)) < generation - 1:
+                os.remove(name)
+        return cls(path)
+
+    @staticmethod
+    def _generation(path):
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return 0
+        with open(meta_path) as file:
+            return json.load(file)["generation"]
+
+    @staticmethod
+    def _write_meta(path, meta):
+        meta_path = os.path.join(path, "meta.json")
+        with open(meta_path + ".tmp", "w") as file:
+            json.dump(meta, file)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def field(self, field):
+        """
+        :param field: One of PANEL_FIELDS
+        :return: Read-only np.memmap of shape (days, instruments)
+        """
+        with self._lock:
+            if field not in self._fields:
+                shape = (self.meta["days"], self.meta["instruments"])
+                if 0 in shape:
+                    self._fields[field] = np.full(shape, np.nan)
+                else:
+                    self._fields[field] = np.memmap(self._file(field), dtype=DTYPE, mode="r", shape=shape)
+            return self._fields[field]
+
+    def __getitem__(self, field):
+        return self.field(field)
+
+    def panel(self, ins_ids=None, start=None, end=None, fields=PANEL_FIELDS):
+        """
+        :param ins_ids: Instrument ID list, None for all columns. Ids not in the cube are left out
+        :param start: First date to keep, e.g. '2015-01-01'
+        :param end: Last date to keep
+        :param fields: Fields to include
+        :return: PricePanel on the memory-mapped arrays, only selecting instruments copies (those columns)
+        """
+        first = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(start, "D")))
+        stop = len(self.dates) if end is None else int(np.searchsorted(self.dates, np.datetime64(end, "D"), side="right"))
+        columns = slice(None)
+        selected = self.ins_ids
+        if ins_ids is not None:
+            columns = [self._column[int(ins_id)] for ins_id in ins_ids if int(ins_id) in self._column]
+            selected = self.ins_ids[columns]
+        return PricePanel(self.dates[first:stop].astype("datetime64[ns]"), selected,
+                          {field: self.field(field)[first:stop, columns] for field in fields})
+
+    def _last_dates(self, dates, fields):
+        """
+        :return: meta last_dates updated with the last day each instrument has a price on in fields
+        """
+        last_dates = dict(self.meta["last_dates"])
+        priced = np.zeros((len(dates), len(self.ins_ids)), dtype=bool)
+        for values in fields.values():
+            priced |= ~np.isnan(np.asarray(values, dtype=DTYPE).reshape(priced.shape))
+        for column in np.flatnonzero(priced.any(axis=0)):
+            last = dates[len(dates) - 1 - np.argmax(priced[::-1, column])]
+            ins_id = str(self.ins_ids[column])
+            if last_dates.get(ins_id) is None or str(last) > last_dates[ins_id]:
+                last_dates[ins_id] = str(last)
+        return last_dates
+
+    def append_days(self, dates, fields):
+        """
+        Append trading days after the last day of the cube, writing only their rows
+        :param dates: Dates of the new days, ascending
+        :param fields: dict of field name -> np.ndarray of shape (len(dates), instruments)
+        :return: Number of days appended
+        """
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        if len(dates) == 0:
+            return 0
+        if len(self.dates) and dates[0] <= self.dates[-1]:
+            raise ValueError(f"Can only append days after {self.dates[-1]}, got {dates[0]}")
+        with self._lock:
+            days, instruments = self.meta["days"], self.meta["instruments"]
+            for field in self.meta["fields"]:
+                values = np.asarray(fields[field], dtype=DTYPE).reshape(len(dates), instruments)
+                with open(self._file(field), "r+b") as file:
+                    # drop the rows of an append that did not finish
+                    file.truncate(days * instruments * values.itemsize)
+                    file.seek(0, os.SEEK_END)
+                    values.tofile(file)
+            _save(self._path, f"calendar.{self.meta['generation']}.npy", np.concatenate([self.dates, dates]))
+            self._write_meta(self._path, dict(self.meta, days=days + len(dates),
+                                              last_dates=self._last_dates(dates, fields)))
+        self._open()
+        return len(dates)
+
+    def _backfill(self, columns):
+        """
+        Write late prices of days the cube already covers into their slots
+        :param columns: dict of column -> dict of 'date' and PANEL_FIELDS -> np.ndarray, dates in the calendar
+        """
+        dates = np.unique(np.concatenate([ins_columns["date"] for ins_columns in columns.values()]))
+        fields = {field: np.full((len(dates), len(self.ins_ids)), np.nan) for field in self.meta["fields"]}
+        with self._lock:
+            shape = (self.meta["days"], self.meta["instruments"])
+            for field in self.meta["fields"]:
+                values = np.memmap(self._file(field), dtype=DTYPE, mode="r+", shape=shape)
+                for column, ins_columns in columns.items():
+                    values[np.searchsorted(self.dates, ins_columns["date"]), column] = ins_columns[field]
+                    fields[field][np.searchsorted(dates, ins_columns["date"]), column] = ins_columns[field]
+                values.flush()
+                del values
+            self._write_meta(self._path, dict(self.meta, last_dates=self._last_dates(dates, fields)))
+        self._open()
+
+    def update(self, store):
+        """
+        Bring the cube up to date with a PriceStore: days after the last cube day are appended, and
+        late prices of days the cube covers are written into their slots. New instruments, histories
+        refetched after a split and late prices of days missing from the calendar rebuild the cube.
+        :param store: PriceStore
+        :return: OHLCVCube, this one or the rebuilt one
+        """
+        ins_ids = self.ins_ids.tolist()
+        splits = {str(ins_id): store.splits(ins_id) for ins_id in ins_ids}
+        if set(store.ins_ids()) - set(ins_ids) or splits != self.meta.get("splits"):
+            return self.build(self._path, store, sorted(set(store.ins_ids()) | set(ins_ids)))
+        end = self.dates[-1] if len(self.dates) else None
+        late = {}
+        new = []
+        for column, ins_id in enumerate(ins_ids):
+            ins_columns = store.read_columns(ins_id)
+            if ins_columns is None:
+                new.append(None)
+                continue
+            dates = ins_columns["date"]
+            # rows after the last day the cube holds for this instrument
+            last = self.meta["last_dates"].get(str(ins_id))
+            fresh = dates > np.datetime64(last, "D") if last is not None else np.ones(len(dates), dtype=bool)
+            if end is not None:
+                if (fresh & (dates <= end)).any():
+                    late[column] = {key: values[fresh & (dates <= end)] for key, values in ins_columns.items()}
+                fresh &= dates > end
+            new.append({key: values[fresh] for key, values in ins_columns.items()})
+        if late:
+            if any(not np.isin(ins_columns["date"], self.dates).all() for ins_columns in late.values()):
+                return self.build(self._path, store, ins_ids)
+            self._backfill(late)
+        self.append_days(*_rows(new))
+        return self
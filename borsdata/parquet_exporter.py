@@ -0,0 +1,199 @@
+import datetime as dt
+import importlib.util
+import json
+import os
+import uuid
+from borsdata.borsdata_api import BorsdataAPI, INSTLIST_MAX_SIZE
+from borsdata import constants as constants
+from borsdata.lazy import lazy_import
+
+# imported on first use, pyarrow loads numpy and pandas
+pd = lazy_import("pandas")
+pa = lazy_import("pyarrow")
+ds = lazy_import("pyarrow.dataset")
+pq = lazy_import("pyarrow.parquet")
+
+DATASETS = ["stock_prices", "reports_quarter", "reports_year", "reports_r12"]
+PARTITION_COLUMNS = ["country", "market", "year"]
+# numeric columns kept as int64, the others are written as float64 so that all files share a schema
+INTEGER_COLUMNS = ["stock_id", "year", "period", "volume"]
+# file format -> file extension
+FILE_FORMATS = {"parquet": "parquet", "ipc": "arrow"}
+
+
+def _require_pyarrow():
+    # optional, only needed for the Parquet/Arrow export
+    if importlib.util.find_spec("pyarrow") is None:
+        raise ImportError("The Parquet/Arrow export needs pyarrow, install it with: pip3 install pyarrow")
+
+
+def read_dataset(path, dataset="stock_prices", columns=None, filters=None):
+    """
+    Read a dataset written by ParquetExporter. Only the requested columns are read, from the
+    partitions (country/market/year) matching the filters.
+    :param path: Export directory
+    :param dataset: One of DATASETS, or 'instruments'
+    :param columns: Column names to read, None for all
+    :param filters: e.g. [('country', '=', 'Sverige'), ('year', '>=', 2020)], or a pyarrow.dataset expression
+    :return: pd.DataFrame
+    """
+    _require_pyarrow()
+    with open(os.path.join(path, "manifest.json")) as file:
+        file_format = json.load(file)["format"]
+    if isinstance(filters, list):
+        filters = pq.filters_to_expression(filters)
+    dataset_path = os.path.join(path, dataset)
+    files = ds.dataset(dataset_path, format=file_format, partitioning="hive")
+    # files can differ in columns (e.g. a report field no instrument of a batch had), read with their union
+    schemas = [fragment.physical_schema for fragment in files.get_fragments(filter=filters)]
+    schema = pa.unify_schemas([files.schema] + schemas)
+    files = ds.dataset(dataset_path, schema=schema, format=file_format, partitioning="hive")
+    return files.to_table(columns=columns, filter=filters).to_pandas()
+
+
+class ParquetExporter:
+    """
+    Exports stock prices and quarter/year/r12 reports as Hive-partitioned Parquet (or Arrow IPC)
+    datasets: <path>/<dataset>/country=<country>/market=<market>/year=<year>/part-<id>-0.parquet.
+    Exports are append-only: each export adds new files with the rows after the last exported
+    date/report of every instrument, existing files are never rewritten.
+    """
+    def __init__(self, path=None, borsdata_api=None, file_format="parquet"):
+        """
+        :param path: Export directory, default constants.EXPORT_PATH/parquet/
+        :param borsdata_api: BorsdataAPI to use, default one created with constants.API_KEY
+        :param file_format: 'parquet' or 'ipc' (Arrow IPC/Feather v2)
+        """
+        _require_pyarrow()
+        if file_format not in FILE_FORMATS:
+            raise ValueError(f"Unknown file_format: {file_format}, expected one of {list(FILE_FORMATS)}")
+        self._path = path if path is not None else constants.EXPORT_PATH + "parquet/"
+        self._api = borsdata_api if borsdata_api is not None else BorsdataAPI(constants.API_KEY)
+        os.makedirs(self._path, exist_ok=True)
+        manifest_path = os.path.join(self._path, "manifest.json")
+        # last exported date (prices) or [year, period] (reports) per dataset and instrument
+        self._manifest = {"format": file_format, **{dataset: {} for dataset in DATASETS}}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as file:
+                self._manifest = json.load(file)
+            if self._manifest["format"] != file_format:
+                raise ValueError(f"{self._path} holds a {self._manifest['format']} export")
+        self._format = file_format
+
+    def _save_manifest(self):
+        manifest_path = os.path.join(self._path, "manifest.json")
+        with open(manifest_path + ".tmp", "w") as file:
+            json.dump(self._manifest, file)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def export(self, ins_ids=None, rows_per_write=1_000_000):
+        """
+        Append the prices and reports added since the last export
+        :param ins_ids: Instrument ID list, default all instruments
+        :param rows_per_write: Rows collected per dataset before they are written
+        :return: dict of dataset -> number of rows written
+        """
+        instruments = self._api.get_instruments()
+        countries = instruments['countryId'].map(self._api.get_countries()['name'])
+        markets = instruments['marketId'].map(self._api.get_markets()['name'])
+        self._write_instruments(instruments.assign(country=countries, market=markets))
+        self._save_manifest()
+        ins_ids = instruments.index.tolist() if ins_ids is None else list(ins_ids)
+        pending = {dataset: [] for dataset in DATASETS}
+        written = dict.fromkeys(DATASETS, 0)
+        for i in range(0, len(ins_ids), INSTLIST_MAX_SIZE):
+            batch = ins_ids[i:i + INSTLIST_MAX_SIZE]
+            for dataset, df in self._fetch_batch(batch).items():
+                df = self._new_rows(dataset, df)
+                if len(df) == 0:
+                    continue
+                df = df.assign(country=df['stock_id'].map(countries), market=df['stock_id'].map(markets))
+                pending[dataset].append(self._normalize(df))
+                if sum(len(frame) for frame in pending[dataset]) >= rows_per_write:
+                    written[dataset] += self._write(dataset, pending[dataset])
+                    pending[dataset] = []
+        for dataset, frames in pending.items():
+            if frames:
+                written[dataset] += self._write(dataset, frames)
+        return written
+
+    def _fetch_batch(self, batch):
+        """
+        :param batch: Instrument ID list, at most INSTLIST_MAX_SIZE
+        :return: dict of dataset -> pd.DataFrame with a stock_id column
+        """
+        # only prices after the earliest last exported date of the batch are fetched
+        last_dates = [self._manifest["stock_prices"].get(str(ins_id)) for ins_id in batch]
+        from_date = None
+        if all(last_dates):
+            from_date = str(dt.date.fromisoformat(min(last_dates)) + dt.timedelta(days=1))
+        stock_prices = self._api.get_instrument_stock_prices_list(batch, from_date=from_date)
+        if 'date' in stock_prices:
+            stock_prices['year'] = stock_prices['date'].dt.year
+        reports_quarter, reports_year, reports_r12 = self._api.get_instrument_report_list(batch)
+        return {"stock_prices": stock_prices, "reports_quarter": reports_quarter,
+                "reports_year": reports_year, "reports_r12": reports_r12}
+
+    def _new_rows(self, dataset, df):
+        """
+        :return: Rows of df after the last exported date (prices) or year/period (reports) of their instrument
+        """
+        if 'stock_id' not in df:
+            return df.iloc[:0]
+        marks = self._manifest[dataset]
+        if dataset == "stock_prices":
+            last = pd.to_datetime(df['stock_id'].map({int(ins_id): date for ins_id, date in marks.items()}))
+            return df[last.isna() | (df['date'] > last)]
+        last = df['stock_id'].map({int(ins_id): year * 100 + period for ins_id, (year, period) in marks.items()})
+        return df[last.isna() | (df['year'] * 100 + df['period'] > last)]
+
+    @staticmethod
+    def _normalize(df):
+        """
+        Give the columns the types all files of a dataset are written with
+        """
+        df = df.copy()
+        for column in df.columns:
+            values = df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype(object)
+            if values.dtype.kind in "iub" and column in INTEGER_COLUMNS:
+                df[column] = values.astype("int64")
+            elif values.dtype.kind in "iuf":
+                df[column] = values.astype("float64")
+            elif values.dtype.kind == "O":
+                # missing strings are filled with 0 by the list endpoints
+                df[column] = values.map(lambda value: value if isinstance(value, str) else None)
+        return df
+
+    def _write(self, dataset, frames):
+        """
+        Append rows as new files and move the dataset's marks to the last written rows
+        :return: Number of rows written
+        """
+        df = pd.concat(frames, ignore_index=True)
+        ds.write_dataset(pa.Table.from_pandas(df, preserve_index=False), os.path.join(self._path, dataset),
+                         format=self._format, partitioning=PARTITION_COLUMNS, partitioning_flavor="hive",
+                         basename_template=f"part-{uuid.uuid4().hex}-{{i}}.{FILE_FORMATS[self._format]}",
+                         existing_data_behavior="overwrite_or_ignore")
+        marks = self._manifest[dataset]
+        if dataset == "stock_prices":
+            for ins_id, date in df.groupby('stock_id')['date'].max().items():
+                marks[str(ins_id)] = str(date.date())
+        else:
+            last = df.sort_values(['year', 'period']).groupby('stock_id').last()
+            for ins_id, (year, period) in last[['year', 'period']].iterrows():
+                marks[str(ins_id)] = [int(year), int(period)]
+        self._save_manifest()
+        return len(df)
+
+    def _write_instruments(self, instruments):
+        """
+        Replace the instruments dataset, the metadata to join the other datasets with
+        """
+        instruments = self._normalize(instruments.reset_index())
+        ds.write_dataset(pa.Table.from_pandas(instruments, preserve_index=False),
+                         os.path.join(self._path, "instruments"), format=self._format,
+                         basename_template=f"part-{{i}}.{FILE_FORMATS[self._format]}",
+                         existing_data_behavior="delete_matching")
+
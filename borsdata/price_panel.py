@@ -0,0 +1,185 @@
+from borsdata.lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+PANEL_FIELDS = ["open", "high", "low", "close", "volume"]
+
+
+class PricePanel:
+    """
+    Stock prices for many instruments as aligned 2-D arrays (trading day x instrument) on a shared
+    calendar. Days an instrument has no price for are NaN. Calculations run on all instruments at once.
+    """
+    def __init__(self, dates, ins_ids, fields):
+        """
+        :param dates: np.ndarray of datetime64, ascending, one per row
+        :param ins_ids: np.ndarray of instrument ids, one per column
+        :param fields: dict of field name -> 2-D np.ndarray (len(dates) x len(ins_ids))
+        """
+        self.dates = dates
+        self.ins_ids = ins_ids
+        self.fields = fields
+        self._column = {ins_id: i for i, ins_id in enumerate(ins_ids.tolist())}
+
+    @classmethod
+    def from_long_frame(cls, df, id_column="stock_id", date_column="date"):
+        """
+        Build a panel from one row per instrument and day, e.g. get_instrument_stock_prices_list
+        :param df: pd.DataFrame with id, date and PANEL_FIELDS columns
+        :param id_column: Instrument id column
+        :param date_column: Date column
+        :return: PricePanel
+        """
+        dates, rows = np.unique(df[date_column].to_numpy(), return_inverse=True)
+        ins_ids, columns = np.unique(df[id_column].to_numpy(), return_inverse=True)
+        fields = {}
+        for field in PANEL_FIELDS:
+            if field not in df:
+                continue
+            values = np.full((len(dates), len(ins_ids)), np.nan)
+            values[rows, columns] = df[field].to_numpy(dtype=np.float64)
+            if field != "volume":
+                # missing prices are filled with 0 by the API wrapper, they are gaps, not prices
+                values[values <= 0] = np.nan
+            fields[field] = values
+        return cls(dates, ins_ids, fields)
+
+    @classmethod
+    def from_api(cls, api, ins_ids, from_date=None, to_date=None):
+        """
+        Fetch stock prices for instruments with batched calls and build a panel
+        :param api: BorsdataAPI
+        :param ins_ids: Instrument ID list
+        :param from_date: Start date in string format, e.g. '2000-01-01'
+        :param to_date: Stop date in string format, e.g. '2000-01-01'
+        :return: PricePanel
+        """
+        stock_prices = api.get_instrument_stock_prices_list(list(ins_ids), from_date=from_date, to_date=to_date)
+        if len(stock_prices) == 0:
+            return cls(np.array([], dtype="datetime64[ns]"), np.array([], dtype=np.int64),
+                       {field: np.empty((0, 0)) for field in PANEL_FIELDS})
+        return cls.from_long_frame(stock_prices)
+
+    def __getitem__(self, field):
+        return self.fields[field]
+
+    def frame(self, values="close"):
+        """
+        :param values: Field name or 2-D array with the panel's shape
+        :return: pd.DataFrame indexed by date with one column per instrument id
+        """
+        if isinstance(values, str):
+            values = self.fields[values]
+        return pd.DataFrame(values, index=pd.DatetimeIndex(self.dates, name="date"), columns=self.ins_ids)
+
+    def instrument(self, ins_id):
+        """
+        :param ins_id: Instrument ID
+        :return: pd.DataFrame of one instrument's fields, indexed by date
+        """
+        column = self._column[ins_id]
+        df = pd.DataFrame({field: values[:, column] for field, values in self.fields.items()},
+                          index=pd.DatetimeIndex(self.dates, name="date"))
+        return df.dropna(how="all")
+
+    def select(self, start=None, end=None):
+        """
+        :param start: First date to keep, e.g. '2015-01-01'
+        :param end: Last date to keep
+        :return: PricePanel with the rows in [start, end]
+        """
+        keep = np.ones(len(self.dates), dtype=bool)
+        if start is not None:
+            keep &= self.dates >= np.datetime64(start)
+        if end is not None:
+            keep &= self.dates <= np.datetime64(end)
+        return PricePanel(self.dates[keep], self.ins_ids, {field: values[keep] for field, values in self.fields.items()})
+
+    def fill_gaps(self):
+        """
+        Forward fill prices over days an instrument did not trade, after its first price.
+        Volume is set to 0 on those days.
+        :return: PricePanel
+        """
+        fields = {field: self._ffill(values) for field, values in self.fields.items() if field != "volume"}
+        if "volume" in self.fields:
+            volume = self.fields["volume"]
+            listed = ~np.isnan(fields["close"]) if "close" in fields else ~np.isnan(volume)
+            fields["volume"] = np.where(np.isnan(volume) & listed, 0, volume)
+        return PricePanel(self.dates, self.ins_ids, fields)
+
+    @staticmethod
+    def _ffill(values):
+        # index of the last row with a price, rows before the first price point at row 0 (NaN)
+        rows = np.where(np.isnan(values), 0, np.arange(len(values))[:, None])
+        np.maximum.accumulate(rows, axis=0, out=rows)
+        return values[rows, np.arange(values.shape[1])]
+
+    def rolling_mean(self, window, field="close"):
+        """
+        Rolling mean over 'window' rows for all instruments, NaN until the window is full of prices
+        (like pd.Series.rolling(window).mean())
+        :param window: Number of trading days
+        :param field: Field name
+        :return: 2-D np.ndarray
+        """
+        values = self.fields[field]
+        valid = ~np.isnan(values)
+        sums = np.zeros((len(values) + 1, values.shape[1]))
+        counts = np.zeros((len(values) + 1, values.shape[1]))
+        np.cumsum(np.where(valid, values, 0), axis=0, out=sums[1:])
+        np.cumsum(valid, axis=0, out=counts[1:])
+        result = np.full(values.shape, np.nan)
+        if len(values) >= window:
+            window_sums = sums[window:] - sums[:-window]
+            window_counts = counts[window:] - counts[:-window]
+            result[window - 1:] = np.where(window_counts == window, window_sums / window, np.nan)
+        return result
+
+    def returns(self, periods=1, field="close"):
+        """
+        Percent change over 'periods' rows for all instruments (like pd.Series.pct_change(periods))
+        :param periods: Number of trading days
+        :param field: Field name
+        :return: 2-D np.ndarray
+        """
+        values = self.fields[field]
+        result = np.full(values.shape, np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result[periods:] = values[periods:] / values[:-periods] - 1
+        return result
+
+    def above_ma(self, window, field="close"):
+        """
+        :param window: Moving average length in trading days
+        :param field: Field name
+        :return: 2-D bool np.ndarray, True where the price is above its moving average
+        """
+        with np.errstate(invalid="ignore"):
+            return self.fields[field] > self.rolling_mean(window, field)
+
+    def above_ma_count(self, window, field="close"):
+        """
+        Breadth: number of instruments above their moving average, per day
+        :param window: Moving average length in trading days
+        :param field: Field name
+        :return: pd.Series indexed by date
+        """
+        counts = self.above_ma(window, field).sum(axis=1)
+        return pd.Series(counts, index=pd.DatetimeIndex(self.dates, name="date"), name=f"above_ma{window}")
+
+    def last(self, values="close"):
+        """
+        Last non-NaN value of every instrument
+        :param values: Field name or 2-D array with the panel's shape
+        :return: pd.Series indexed by instrument id
+        """
+        if isinstance(values, str):
+            values = self.fields[values]
+        if len(values) == 0:
+            return pd.Series(np.full(values.shape[1], np.nan), index=self.ins_ids)
+        valid = ~np.isnan(values)
+        rows = len(values) - 1 - np.argmax(valid[::-1], axis=0)
+        last = np.where(valid.any(axis=0), values[rows, np.arange(values.shape[1])], np.nan)
+        return pd.Series(last, index=self.ins_ids)
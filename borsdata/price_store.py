@@ -0,0 +1,164 @@
+import datetime as dt
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from borsdata.ohlcv_cube import OHLCVCube
+from borsdata.lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# stored columns, in the order get_instrument_stock_prices returns them
+PRICE_FIELDS = ["close", "high", "low", "open", "volume"]
+
+
+class PriceStore:
+    """
+    Local columnar store of daily stock prices, one partition (insId=<id>/prices.npz) per instrument.
+    sync_prices only downloads trading days after the last stored date, and refetches the full
+    history of instruments with a new stock split, so corrections the API makes around a split
+    replace the stored rows. Prices are stored as traded, the way get_instrument_stock_prices returns
+    them, also after a refetch. Split-adjust what is read with borsdata.splits.SplitAdjuster.
+    """
+    def __init__(self, path, api=None):
+        """
+        :param path: Store directory
+        :param api: BorsdataAPI used by sync_prices
+        """
+        self._path = path
+        self._api = api
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        manifest_path = os.path.join(path, "manifest.json")
+        self._manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as file:
+                self._manifest = json.load(file)
+
+    def _partition(self, ins_id):
+        return os.path.join(self._path, f"insId={ins_id}", "prices.npz")
+
+    def _save_manifest(self):
+        manifest_path = os.path.join(self._path, "manifest.json")
+        with open(manifest_path + ".tmp", "w") as file:
+            json.dump(self._manifest, file)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def ins_ids(self):
+        """
+        :return: List of stored instrument ids
+        """
+        return sorted(int(ins_id) for ins_id in self._manifest)
+
+    def last_date(self, ins_id):
+        """
+        :param ins_id: Instrument ID
+        :return: Last stored date as string, e.g. '2024-01-31', None if nothing is stored
+        """
+        return self._manifest.get(str(ins_id), {}).get("last_date")
+
+    def splits(self, ins_id):
+        """
+        :param ins_id: Instrument ID
+        :return: List of split dates (str) known when the stored history was fetched
+        """
+        return self._manifest.get(str(ins_id), {}).get("splits", [])
+
+    def read_columns(self, ins_id):
+        """
+        Read the stored columns of an instrument, sorted by date ascending
+        :param ins_id: Instrument ID
+        :return: dict of 'date' (datetime64[D]) and PRICE_FIELDS -> np.ndarray, None if nothing is stored
+        """
+        partition = self._partition(ins_id)
+        if not os.path.exists(partition):
+            return None
+        with np.load(partition) as data:
+            return {key: data[key] for key in data.files}
+
+    def read_prices(self, ins_id):
+        """
+        Read stored prices in the same shape as BorsdataAPI.get_instrument_stock_prices
+        :param ins_id: Instrument ID
+        :return: pd.DataFrame indexed by date, descending
+        """
+        columns = self.read_columns(ins_id)
+        if columns is None:
+            return pd.DataFrame(columns=PRICE_FIELDS, index=pd.DatetimeIndex([], name="date"))
+        df = pd.DataFrame({field: columns[field] for field in PRICE_FIELDS},
+                          index=pd.DatetimeIndex(columns["date"].astype("datetime64[ns]"), name="date"))
+        return df.sort_index(ascending=False)
+
+    def write_prices(self, ins_id, stock_prices, splits=None, append=False):
+        """
+        Write prices for an instrument
+        :param ins_id: Instrument ID
+        :param stock_prices: pd.DataFrame as returned by get_instrument_stock_prices
+        :param splits: List of split dates (str) known when the history was fetched
+        :param append: True to add rows after the last stored date, False to replace the partition
+        :return: Number of rows written
+        """
+        if len(stock_prices) == 0:
+            return 0
+        stock_prices = stock_prices.sort_index()
+        columns = {"date": stock_prices.index.values.astype("datetime64[D]")}
+        for field in PRICE_FIELDS:
+            columns[field] = stock_prices[field].to_numpy()
+        stored = self.read_columns(ins_id) if append else None
+        if stored is not None:
+            new_rows = columns["date"] > stored["date"][-1]
+            columns = {key: np.concatenate([stored[key], values[new_rows]]) for key, values in columns.items()}
+            written = int(new_rows.sum())
+        else:
+            written = len(columns["date"])
+        partition = self._partition(ins_id)
+        os.makedirs(os.path.dirname(partition), exist_ok=True)
+        np.savez(partition + ".tmp.npz", **columns)
+        os.replace(partition + ".tmp.npz", partition)
+        with self._lock:
+            entry = self._manifest.setdefault(str(ins_id), {"splits": []})
+            entry["last_date"] = str(columns["date"][-1])
+            if splits is not None:
+                entry["splits"] = sorted(splits)
+            self._save_manifest()
+        return written
+
+    def sync_prices(self, ins_ids):
+        """
+        Bring the store up to date for instruments, fetching only trading days after the last
+        stored date. Instruments with a stock split not yet seen are refetched in full.
+        :param ins_ids: Instrument ID list
+        :return: dict of ins_id -> number of new rows
+        """
+        stock_splits = self._api.get_stock_splits()
+        splits = {}
+        if "splitDate" in stock_splits:
+            for ins_id, split_date in stock_splits["splitDate"].items():
+                splits.setdefault(int(ins_id), []).append(str(split_date.date()))
+
+        def sync(ins_id):
+            ins_splits = splits.get(ins_id, [])
+            last_date = self.last_date(ins_id)
+            known_splits = self.splits(ins_id)
+            if last_date is None or set(ins_splits) - set(known_splits):
+                stock_prices = self._api.get_instrument_stock_prices(ins_id)
+                return self.write_prices(ins_id, stock_prices, splits=ins_splits)
+            from_date = dt.date.fromisoformat(last_date) + dt.timedelta(days=1)
+            if from_date > dt.date.today():
+                return 0
+            stock_prices = self._api.get_instrument_stock_prices(ins_id, from_date=str(from_date))
+            return self.write_prices(ins_id, stock_prices, append=True)
+
+        ins_ids = [int(ins_id) for ins_id in ins_ids]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            return dict(zip(ins_ids, executor.map(sync, ins_ids)))
+
+    def write_cube(self, path, ins_ids=None):
+        """
+        Persist the stored prices as a memory-mappable OHLCVCube, see borsdata.ohlcv_cube
+        :param path: Cube directory
+        :param ins_ids: Instrument ID list, None for all stored instruments
+        :return: OHLCVCube
+        """
+        return OHLCVCube.build(path, self, ins_ids)
@@ -0,0 +1,102 @@
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+    Tokens are refilled continuously at 'rate' per second up to 'capacity' (burst).
+    """
+    def __init__(self, rate=10, capacity=10):
+        """
+        :param rate: Tokens (API calls) added per second
+        :param capacity: Max. number of tokens, i.e. burst size
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        # _last_refill lies in the future while the bucket is paused
+        if now > self._last_refill:
+            self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+
+    def reserve(self, tokens=1):
+        """
+        Reserve tokens and return how long the caller has to wait before using them.
+        Does not sleep, so it can be used from both threads and coroutines.
+        :param tokens: Number of tokens to take
+        :return: Seconds to wait
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= tokens
+            wait = max(self._last_refill - now, 0)
+            if self._tokens < 0:
+                wait += -self._tokens / self.rate
+            return wait
+
+    def acquire(self, tokens=1):
+        """
+        Block until tokens are available
+        :param tokens: Number of tokens to take
+        :return: Seconds slept
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """
+        Stop handing out tokens for all callers, e.g. when the server answered 429
+        :param seconds: Seconds from now
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # drop the burst, the server has told us we are over the quota
+            self._tokens = min(self._tokens, 0)
+            self._last_refill = max(self._last_refill, now + seconds)
+
+
+def backoff_delay(attempt, base=0.5, cap=30):
+    """
+    Exponential backoff with full jitter
+    :param attempt: Retry number, starting at 0
+    :param base: Delay in seconds for the first retry
+    :param cap: Max. delay in seconds
+    :return: Seconds to wait
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_after_seconds(response, default=1):
+    """
+    Parse the Retry-After header of a response (delay-seconds form)
+    :param response: requests.Response
+    :param default: Seconds to use if the header is missing or unreadable
+    :return: Seconds to wait
+    """
+    value = response.headers.get("Retry-After")
+    try:
+        return max(float(value), 0)
+    except (TypeError, ValueError):
+        return default
+
+
+# Börsdata allows 100 calls per 10 seconds per API key, shared by every BorsdataAPI in the process.
+_shared_limiter = TokenBucket(rate=10, capacity=10)
+
+
+def get_shared_limiter():
+    """
+    Get the process-wide rate limiter
+    :return: TokenBucket
+    """
+    return _shared_limiter
@@ -0,0 +1,133 @@
+"""
+Offline record/replay of API exchanges.
+RecordingTransport saves every response as a fixture file (without the authKey), ReplayTransport
+and MockBorsdataServer serve them again, so the client can run without network and API quota:
+
+    api = BorsdataAPI(constants.API_KEY, transport=RecordingTransport("fixtures/"))
+    ...
+    api = BorsdataAPI("offline", transport=ReplayTransport("fixtures/"))
+"""
+import hashlib
+import json
+import os
+from urllib.parse import urlsplit, urlencode
+import requests
+from borsdata.transport import HttpTransport
+
+# parameters left out of fixture names and files
+SCRUBBED_PARAMS = ["authKey"]
+
+
+def endpoint_path(url):
+    """
+    :param url: Full URL, e.g. 'https://apiservice.borsdata.se/v1/instruments/3/stockprices?authKey=...'
+    :return: Path relative to the API root, e.g. 'instruments/3/stockprices'
+    """
+    return urlsplit(url).path.split("/v1/", 1)[-1].strip("/")
+
+
+def scrub_params(params):
+    """
+    :param params: URL parameters dict
+    :return: Parameters without SCRUBBED_PARAMS, values as strings
+    """
+    return {key: str(value) for key, value in (params or {}).items() if key not in SCRUBBED_PARAMS}
+
+
+def fixture_name(path, params):
+    """
+    :param path: Path relative to the API root
+    :param params: URL parameters dict
+    :return: File name of the fixture, e.g. 'instruments_3_stockprices-1a2b3c4d5e6f.json'
+    """
+    query = urlencode(sorted(scrub_params(params).items()))
+    return f"{path.replace('/', '_')}-{hashlib.sha1(query.encode()).hexdigest()[:12]}.json"
+
+
+def load_fixture(directory, path, params):
+    """
+    :param directory: Fixture directory
+    :param path: Path relative to the API root
+    :param params: URL parameters dict
+    :return: Fixture dict (path, params, status, headers, body), None if nothing is recorded
+    """
+    fixture_path = os.path.join(directory, fixture_name(path, params))
+    if not os.path.exists(fixture_path):
+        return None
+    with open(fixture_path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def make_response(url, status_code, body, headers=None):
+    """
+    Build a requests.Response with a read body
+    :param url: URL to report as response.url
+    :param status_code: HTTP status code
+    :param body: bytes
+    :param headers: Response headers dict
+    :return: requests.Response
+    """
+    response = requests.Response()
+    response.url = url
+    response.status_code = status_code
+    response._content = body
+    response._content_consumed = True
+    response.headers.update(headers or {})
+    response.encoding = "utf-8"
+    return response
+
+
+class RecordingTransport:
+    """
+    Transport that passes requests on and saves the responses as fixture files.
+    Throttled (429) and server error responses are not recorded.
+    """
+    def __init__(self, directory, transport=None):
+        """
+        :param directory: Fixture directory
+        :param transport: Transport making the requests, default a new HttpTransport
+        """
+        self._directory = directory
+        self._transport = transport if transport is not None else HttpTransport()
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, url, params=None, stream=False):
+        # the body is read at once to record it, a streamed caller reads it from memory
+        response = self._transport.get(url, params)
+        if response.status_code == 429 or response.status_code >= 500:
+            return response
+        path = endpoint_path(url)
+        fixture = {"path": path, "params": scrub_params(params), "status": response.status_code,
+                   "headers": {key: response.headers[key] for key in ["Content-Type"] if key in response.headers},
+                   "body": response.content.decode("utf-8")}
+        fixture_path = os.path.join(self._directory, fixture_name(path, params))
+        with open(fixture_path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(fixture, file)
+        os.replace(fixture_path + ".tmp", fixture_path)
+        return response
+
+    def close(self):
+        self._transport.close()
+
+
+class ReplayTransport:
+    """
+    Transport that answers from recorded fixture files, without network
+    """
+    def __init__(self, directory):
+        """
+        :param directory: Fixture directory
+        """
+        self._directory = directory
+
+    def get(self, url, params=None, stream=False):
+        path = endpoint_path(url)
+        fixture = load_fixture(self._directory, path, params)
+        if fixture is None:
+            raise FileNotFoundError(f"No recorded response for {path} {scrub_params(params)} in {self._directory}")
+        query = urlencode(sorted(fixture["params"].items()))
+        return make_response(url.split("?")[0] + (f"?{query}" if query else ""), fixture["status"],
+                             fixture["body"].encode("utf-8"), fixture["headers"])
+
+    def close(self):
+        pass
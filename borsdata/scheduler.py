@@ -0,0 +1,190 @@
+"""
+Change-driven refresh of a Warehouse. Instead of refetching everything every night, RefreshScheduler
+polls instruments/updated and instruments/kpis/updated, compares them with the watermarks of the
+previous run and queues only what changed:
+
+- instruments with a new updatedAt: reports and KPI history
+- a new KPI calculation (run daily once the prices are in): stock prices, KPI history and screener values
+- instruments not seen before: metadata, stock prices, reports and KPI history
+
+The work runs in priority order (prices, reports, KPIs, metadata) on a few threads sharing the
+API's rate limiter. A watermark is saved once all work queued for it has succeeded, so failed or
+interrupted work is planned again on the next run.
+
+    scheduler = RefreshScheduler(api, Warehouse("warehouse/", api), "warehouse/watermarks.json",
+                                 kpi_history=[(2, "year", "mean")])
+    scheduler.run()
+"""
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from borsdata.borsdata_api import INSTLIST_MAX_SIZE
+
+logger = logging.getLogger(__name__)
+
+# lower runs first, each task kind runs the Warehouse method sync_<kind>
+PRIORITIES = {"stock_prices": 0, "reports": 1, "kpi_history": 2, "kpi_values": 2, "metadata": 3}
+KPIS_KEY = ("kpis_calc_updated",)
+
+
+class RefreshScheduler:
+    """
+    Plans the minimal refresh of a Warehouse from the API's update times and runs it
+    """
+    def __init__(self, api, warehouse, path, ins_ids=None, kpi_history=(), kpi_values=(), workers=2):
+        """
+        :param api: BorsdataAPI to poll, the one the warehouse syncs with so all work shares its rate limiter
+        :param warehouse: Warehouse to refresh
+        :param path: Watermark file (JSON)
+        :param ins_ids: Instrument IDs to keep up to date, None for all instruments
+        :param kpi_history: KPI history to keep up to date, list of (kpi_id, report_type, price_type)
+        :param kpi_values: Screener values to keep up to date, list of (kpi_id, calc_group, calc)
+        :param workers: Number of threads running the queued work
+        """
+        self._api = api
+        self._warehouse = warehouse
+        self._path = path
+        self._ins_ids = None if ins_ids is None else {int(ins_id) for ins_id in ins_ids}
+        self._kpi_history = list(kpi_history)
+        self._kpi_values = list(kpi_values)
+        self._workers = workers
+        self._lock = threading.Lock()
+        self._watermarks = {"kpis_calc_updated": None, "instruments": {}}
+        if os.path.exists(path):
+            with open(path) as file:
+                self._watermarks.update(json.load(file))
+        # heap of (priority, sequence number, kind, args, watermark keys)
+        self._queue = []
+        self._sequence = itertools.count()
+        # watermark key -> [number of unfinished tasks, new value, failed]
+        self._pending = {}
+        self._progress = {kind: {"queued": 0, "running": 0, "done": 0, "failed": 0} for kind in PRIORITIES}
+        self._rows = 0
+
+    def _save_watermarks(self):
+        with open(self._path + ".tmp", "w") as file:
+            json.dump(self._watermarks, file)
+        os.replace(self._path + ".tmp", self._path)
+
+    def _watermark(self, key):
+        if key == KPIS_KEY:
+            return self._watermarks["kpis_calc_updated"]
+        return self._watermarks["instruments"].get(key[1])
+
+    def _set_watermark(self, key, value):
+        if key == KPIS_KEY:
+            self._watermarks["kpis_calc_updated"] = value
+        else:
+            self._watermarks["instruments"][key[1]] = value
+
+    def _put(self, kind, args, keys):
+        """
+        Queue a task, keys are (watermark key, new value) pairs saved when all their tasks succeed
+        """
+        for key, value in keys:
+            entry = self._pending.setdefault(key, [0, value, False])
+            entry[0] += 1
+            entry[1] = value
+        heapq.heappush(self._queue, (PRIORITIES[kind], next(self._sequence), kind, args, [key for key, _ in keys]))
+        self._progress[kind]["queued"] += 1
+
+    def plan(self):
+        """
+        Poll the updated endpoints and queue the work needed to bring the warehouse up to date
+        :return: Number of queued tasks
+        """
+        updated = self._api.get_instruments_updated(format="dict")
+        updated_at = {str(ins_id): value for ins_id, value in zip(updated.get("insId", []), updated.get("updatedAt", []))
+                      if self._ins_ids is None or int(ins_id) in self._ins_ids}
+        kpis_calc_updated = self._api.get_updated_kpis().isoformat()
+        ins_ids = sorted(updated_at, key=int)
+        with self._lock:
+            known = self._watermarks["instruments"]
+            new_ids = [ins_id for ins_id in ins_ids if ins_id not in known]
+            changed = {ins_id for ins_id in ins_ids if self._watermark(("instruments", ins_id)) != updated_at[ins_id]}
+            new_calc = self._watermark(KPIS_KEY) != kpis_calc_updated
+            kpis_key = [(KPIS_KEY, kpis_calc_updated)] if new_calc else []
+            queued = len(self._queue)
+
+            def chunks(ids):
+                for i in range(0, len(ids), INSTLIST_MAX_SIZE):
+                    chunk = ids[i:i + INSTLIST_MAX_SIZE]
+                    keys = [(("instruments", ins_id), updated_at[ins_id]) for ins_id in chunk if ins_id in changed]
+                    yield [int(ins_id) for ins_id in chunk], keys
+
+            for chunk, keys in chunks(ins_ids if new_calc else new_ids):
+                self._put("stock_prices", (chunk,), keys + kpis_key)
+            for chunk, keys in chunks([ins_id for ins_id in ins_ids if ins_id in changed]):
+                self._put("reports", (chunk,), keys)
+            for chunk, keys in chunks(ins_ids if new_calc else [ins_id for ins_id in ins_ids if ins_id in changed]):
+                for kpi_id, report_type, price_type in self._kpi_history:
+                    self._put("kpi_history", (chunk, kpi_id, report_type, price_type), keys + kpis_key)
+            if new_calc:
+                for kpi_id, calc_group, calc in self._kpi_values:
+                    self._put("kpi_values", (kpi_id, calc_group, calc), kpis_key)
+            if new_ids or self._warehouse.last_sync("metadata") is None:
+                self._put("metadata", (), [(("instruments", ins_id), updated_at[ins_id]) for ins_id in new_ids])
+            return len(self._queue) - queued
+
+    def run(self):
+        """
+        Plan, then run the queued work until the queue is empty
+        :return: progress()
+        """
+        self.plan()
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            for _ in range(self._workers):
+                executor.submit(self._work)
+        return self.progress()
+
+    def _work(self):
+        while True:
+            with self._lock:
+                if not self._queue:
+                    return
+                _, _, kind, args, keys = heapq.heappop(self._queue)
+                self._progress[kind]["queued"] -= 1
+                self._progress[kind]["running"] += 1
+            try:
+                rows = getattr(self._warehouse, f"sync_{kind}")(*args)
+                failed = False
+            except Exception:
+                logger.exception("Refresh of %s %s failed", kind, args)
+                rows, failed = 0, True
+            self._finish(kind, keys, rows, failed)
+
+    def _finish(self, kind, keys, rows, failed):
+        with self._lock:
+            self._progress[kind]["running"] -= 1
+            self._progress[kind]["failed" if failed else "done"] += 1
+            self._rows += rows
+            saved = False
+            for key in keys:
+                entry = self._pending[key]
+                entry[0] -= 1
+                entry[2] = entry[2] or failed
+                if entry[0] == 0:
+                    del self._pending[key]
+                    if not entry[2]:
+                        self._set_watermark(key, entry[1])
+                        saved = True
+            if saved:
+                self._save_watermarks()
+
+    def progress(self):
+        """
+        :return: dict of queued, running, done and failed task counts, rows written, and the counts per
+            task kind under 'tasks'
+        """
+        with self._lock:
+            tasks = {kind: dict(counts) for kind, counts in self._progress.items()}
+            rows = self._rows
+        progress = {state: sum(counts[state] for counts in tasks.values())
+                    for state in ["queued", "running", "done", "failed"]}
+        progress["rows"] = rows
+        progress["tasks"] = tasks
+        return progress
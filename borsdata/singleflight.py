@@ -0,0 +1,74 @@
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Thread-safe coalescing of identical calls: while a call for a key is in flight, other callers
+    with the same key wait for it and share its result instead of making the call again.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        # key -> number of callers waiting for the flight in progress
+        self._followers = {}
+        self.calls = 0
+        self.saved = 0
+
+    def do(self, key, function, on_land=None):
+        """
+        Call function, or wait for the call already in flight for key
+        :param key: Hashable call identity, e.g. URL and parameters
+        :param function: Function without arguments making the call
+        :param on_land: Called by the leader with the result and the number of callers sharing it
+            (leader included) once no more callers can join, before they get the result
+        :return: Result of function, shared by every caller of the same flight
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+                self._followers[key] = 0
+                self.calls += 1
+            else:
+                self._followers[key] += 1
+                self.saved += 1
+        if not leader:
+            # raises the leader's exception, too
+            return call.result()
+        try:
+            result = function()
+        except BaseException as error:
+            self._land(key)
+            call.set_exception(error)
+            raise
+        followers = self._land(key)
+        if on_land is not None:
+            on_land(result, followers + 1)
+        call.set_result(result)
+        return result
+
+    def _land(self, key):
+        # callers arriving from now on start a new flight
+        with self._lock:
+            del self._calls[key]
+            return self._followers.pop(key)
+
+    def stats(self):
+        """
+        :return: dict with the number of calls made and of calls saved by sharing a flight
+        """
+        with self._lock:
+            return {"calls": self.calls, "saved": self.saved, "in_flight": len(self._calls)}
+
+
+_shared_single_flight = SingleFlight()
+
+
+def get_shared_single_flight():
+    """
+    Get the process-wide single flight, shared by all BorsdataAPI instances
+    :return: SingleFlight
+    """
+    return _shared_single_flight
@@ -0,0 +1,174 @@
+"""
+Split adjustment of stock prices. get_instrument_stock_prices returns prices as traded, so rolling
+means and returns are off across a split. SplitAdjuster restates prices before a split in today's
+shares (divided by the split factor) and volumes the other way (multiplied by it).
+
+This is the only place prices are adjusted: the PriceStore and the OHLCVCube keep them as traded,
+so frames and panels from the API, the store and the cube are all adjusted the same way, once.
+"""
+import logging
+import threading
+from borsdata import decode
+from borsdata.price_panel import PricePanel
+from borsdata.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+PRICE_COLUMNS = ["open", "high", "low", "close"]
+VOLUME_COLUMN = "volume"
+
+
+def split_factor(ratio):
+    """
+    :param ratio: Split ratio 'new:old', e.g. '2:1' for a 2-for-1 split or '1:10' for a reverse split
+    :return: Number of shares after the split per share before it, e.g. 2.0
+    """
+    new, old = (float(part) for part in str(ratio).split(":"))
+    if new <= 0 or old <= 0:
+        raise ValueError(f"Invalid split ratio: {ratio}")
+    return new / old
+
+
+def _scale(values, factors):
+    """
+    Multiply a column by per-row factors, keeping its dtype (integer columns are rounded)
+    """
+    scaled = values * factors
+    if values.dtype.kind in "iu":
+        return decode.to_array(np.rint(scaled), values.dtype)
+    return scaled.astype(values.dtype, copy=False)
+
+
+class SplitAdjuster:
+    """
+    Cumulative split factors per instrument, computed once when splits are added and cached.
+    A price on a date before a split is divided by the product of the factors of all splits after
+    that date. Prices from the split date on are left as they are.
+    """
+    def __init__(self, api=None, splits=None):
+        """
+        :param api: BorsdataAPI to fetch the splits from in refresh
+        :param splits: Initial splits, dict of ins_id -> list of (split date, ratio)
+        """
+        self._api = api
+        self._lock = threading.Lock()
+        # ins_id -> dict of split date (datetime64[D]) -> ratio
+        self._splits = {}
+        # ins_id -> (split dates ascending, cumulative factors with a trailing 1.0)
+        self._factors = {}
+        if splits:
+            self.update(splits)
+
+    def refresh(self):
+        """
+        Fetch the splits with get_stock_splits and add the ones not seen before
+        :return: List of instrument ids whose factors changed
+        """
+        columns = self._api.get_stock_splits(format="numpy")
+        splits = {}
+        for ins_id, split_date, ratio in zip(columns.get("insId", []), columns.get("splitDate", []),
+                                             columns.get("ratio", [])):
+            splits.setdefault(int(ins_id), []).append((split_date, ratio))
+        return self.update(splits)
+
+    def update(self, splits):
+        """
+        Add splits, keeping the ones already known (the API only lists recent splits).
+        Only instruments with a new or changed split get their factors recomputed.
+        :param splits: dict of ins_id -> list of (split date, ratio)
+        :return: List of instrument ids whose factors changed
+        """
+        changed = []
+        with self._lock:
+            for ins_id, ins_splits in splits.items():
+                ins_id = int(ins_id)
+                known = self._splits.get(ins_id, {})
+                merged = dict(known)
+                for split_date, ratio in ins_splits:
+                    try:
+                        split_factor(ratio)
+                    except ValueError:
+                        logger.warning("Ignoring split of %s on %s with ratio %r", ins_id, split_date, ratio)
+                        continue
+                    merged[np.datetime64(split_date).astype("datetime64[D]")] = ratio
+                if merged != known:
+                    self._splits[ins_id] = merged
+                    self._factors[ins_id] = self._cumulative(merged)
+                    changed.append(ins_id)
+        return changed
+
+    @staticmethod
+    def _cumulative(splits):
+        split_dates = sorted(splits)
+        factors = np.array([split_factor(splits[split_date]) for split_date in split_dates])
+        # cumulative[i]: product of the factors of splits i and later, 1.0 after the last split
+        cumulative = np.append(np.cumprod(factors[::-1])[::-1], 1.0)
+        return np.array(split_dates, dtype="datetime64[ns]"), cumulative
+
+    def ins_ids(self):
+        """
+        :return: List of instrument ids with splits
+        """
+        return sorted(self._factors)
+
+    def factors(self, ins_id, dates):
+        """
+        :param ins_id: Instrument ID
+        :param dates: Price dates, np.ndarray of datetime64
+        :return: np.ndarray of the cumulative split factor of each date, 1.0 when no split follows it
+        """
+        dates = np.asarray(dates, dtype="datetime64[ns]")
+        entry = self._factors.get(int(ins_id))
+        if entry is None:
+            return np.ones(len(dates))
+        split_dates, cumulative = entry
+        return cumulative[np.searchsorted(split_dates, dates, side="right")]
+
+    def adjust(self, df, ins_id=None, id_column="stock_id", date_column="date"):
+        """
+        Split-adjust a price frame, either of one instrument (get_instrument_stock_prices, dates as index)
+        or of many (get_instrument_stock_prices_list, id and date columns)
+        :param df: pd.DataFrame with PRICE_COLUMNS and volume
+        :param ins_id: Instrument ID of a one-instrument frame, None to read it from id_column
+        :param id_column: Instrument id column
+        :param date_column: Date column, the index is used if there is no such column
+        :return: Adjusted copy of the frame, or the frame itself if no split applies to it
+        """
+        dates = df[date_column].to_numpy() if date_column in df else df.index.to_numpy()
+        if ins_id is not None:
+            factors = self.factors(ins_id, dates)
+        else:
+            factors = np.ones(len(df))
+            for split_id, rows in df.groupby(id_column, sort=False).indices.items():
+                if int(split_id) in self._factors:
+                    factors[rows] = self.factors(split_id, dates[rows])
+        if (factors == 1).all():
+            return df
+        df = df.copy()
+        for column in PRICE_COLUMNS:
+            if column in df:
+                df[column] = _scale(df[column].to_numpy(), 1 / factors)
+        if VOLUME_COLUMN in df:
+            df[VOLUME_COLUMN] = _scale(df[VOLUME_COLUMN].to_numpy(), factors)
+        return df
+
+    def adjust_panel(self, panel):
+        """
+        Split-adjust a PricePanel, only the columns of instruments with splits are touched
+        :param panel: PricePanel
+        :return: PricePanel
+        """
+        columns = [column for column, ins_id in enumerate(panel.ins_ids.tolist()) if int(ins_id) in self._factors]
+        if not columns:
+            return panel
+        factors = np.column_stack([self.factors(panel.ins_ids[column], panel.dates) for column in columns])
+        fields = {}
+        for field, values in panel.fields.items():
+            if field in PRICE_COLUMNS or field == VOLUME_COLUMN:
+                values = values.copy()
+                values[:, columns] = values[:, columns] / factors if field != VOLUME_COLUMN \
+                    else values[:, columns] * factors
+            fields[field] = values
+        return PricePanel(panel.dates, panel.ins_ids, fields)
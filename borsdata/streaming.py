@@ -0,0 +1,336 @@
+"""
+Incremental parsing of large list responses (reportList, stockPricesArrayList).
+The body is read in chunks and the elements of one top-level array are decoded one at a time,
+so only a single instrument's JSON is held in memory besides the growing column buffers.
+"""
+import codecs
+import json
+import math
+import re
+import threading
+from array import array
+from borsdata import decode
+from borsdata.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+_decoder = json.JSONDecoder()
+_SEPARATORS = " \t\n\r,"
+_SCALAR_END = re.compile(r'[,\]\s]')
+
+
+def iter_array_items(chunks, key):
+    """
+    Yield the elements of the array stored under 'key' in a JSON object, as they arrive
+    :param chunks: Iterable of bytes, e.g. response.iter_content(), closed when the array ends
+    :param key: Object key of the array, e.g. 'reportList'
+    :return: Generator of parsed elements
+    """
+    chunks = iter(chunks)
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    eof = False
+
+    def read(size=1):
+        """
+        Read chunks until the buffer holds at least size characters or the body ends, joined once
+        """
+        nonlocal buffer, eof
+        pieces = [buffer]
+        length = len(buffer)
+        while True:
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+                pieces.append(utf8.decode(b"", final=True))
+                break
+            pieces.append(utf8.decode(chunk))
+            length += len(pieces[-1])
+            if length >= size:
+                break
+        buffer = "".join(pieces)
+
+    try:
+        # find the start of the array
+        marker = f'"{key}"'
+        while True:
+            start = buffer.find(marker)
+            if start >= 0:
+                bracket = buffer.find("[", start)
+                if bracket >= 0:
+                    buffer = buffer[bracket + 1:]
+                    break
+            if eof:
+                return
+            read()
+
+        position = 0
+        # length of the incomplete element at the last failed decode, it is decoded again once the
+        # buffer holds twice as much, so an element spread over many chunks costs at most ~2 decodes
+        attempted = 0
+        while True:
+            while position < len(buffer) and buffer[position] in _SEPARATORS:
+                position += 1
+            if position == len(buffer):
+                if eof:
+                    raise ValueError(f"Unterminated JSON array '{key}'")
+                buffer, position = "", 0
+                read()
+                continue
+            if buffer[position] == "]":
+                return
+            # a number at the end of the buffer may continue in the next chunk
+            complete = eof or buffer[position] in '{["' or _SCALAR_END.search(buffer, position)
+            if complete and (eof or len(buffer) - position >= 2 * attempted):
+                try:
+                    item, position = _decoder.raw_decode(buffer, position)
+                except ValueError:
+                    if eof:
+                        raise ValueError(f"Invalid or unterminated JSON array '{key}'")
+                    attempted = len(buffer) - position
+                else:
+                    attempted = 0
+                    yield item
+                    continue
+            # keep only the incomplete element
+            buffer = buffer[position:]
+            position = 0
+            read(2 * attempted)
+    finally:
+        # release the connection of a body that is not read to the end
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+class SharedStream:
+    """
+    Body of one streamed response, read by the callers sharing its request (see SingleFlight).
+    Chunks are kept for the other readers only if the response is shared or its whole body is
+    needed (on_complete). The response is closed once every reader is done or has stopped.
+    """
+    def __init__(self, chunks, close=None, on_complete=None):
+        """
+        :param chunks: Iterable of bytes, e.g. response.iter_content()
+        :param close: Called once when the last reader is done, e.g. response.close
+        :param on_complete: Called with the whole body (bytes) once it is read, e.g. to cache it.
+            The body is then read to the end even if the readers stop before
+        """
+        self._chunks = iter(chunks)
+        self._close = close
+        self._on_complete = on_complete
+        self._lock = threading.Lock()
+        self._kept = []
+        self._keep = on_complete is not None
+        self._eof = False
+        self._readers = 1
+        self._finished = 0
+
+    def share(self, readers):
+        """
+        :param readers: Number of callers that will read the body
+        """
+        with self._lock:
+            self._readers = readers
+            self._keep = self._keep or readers > 1
+
+    def _next(self, index):
+        """
+        :return: Chunk number index, None at the end of the body
+        """
+        with self._lock:
+            if index < len(self._kept):
+                return self._kept[index]
+            if self._eof:
+                return None
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._eof = True
+                if self._on_complete is not None:
+                    self._on_complete(b"".join(self._kept))
+                return None
+            if self._keep:
+                self._kept.append(chunk)
+            return chunk
+
+    def reader(self):
+        """
+        :return: Generator of the body's chunks
+        """
+        index = 0
+        try:
+            while True:
+                chunk = self._next(index)
+                if chunk is None:
+                    return
+                index += 1
+                yield chunk
+        finally:
+            with self._lock:
+                self._finished += 1
+                done = self._finished == self._readers
+            if done:
+                # a parser stops at the end of its array, the rest of the body (the closing
+                # braces) is still read when the whole body is needed
+                while self._on_complete is not None and self._next(len(self._kept)) is not None:
+                    pass
+                self._kept = []
+                if self._close is not None:
+                    self._close()
+
+
+class ColumnBuffer:
+    """
+    Growable typed column: int64 while all values are ints, float64 once a float or null appears,
+    a list of Python objects once anything else (e.g. a string) appears
+    """
+    def __init__(self, missing=0):
+        """
+        :param missing: Number of missing (null) values to start with
+        """
+        self._data = array("d", [math.nan] * missing) if missing else array("q")
+
+    def append(self, value):
+        data = self._data
+        value_type = type(value)
+        if isinstance(data, list):
+            data.append(value)
+        elif value_type is int and data.typecode == "q":
+            data.append(value)
+        elif data.typecode == "d" and (value_type is float or value_type is int):
+            data.append(value)
+        elif data.typecode == "d" and value is None:
+            data.append(math.nan)
+        elif value is None or value_type is float:
+            # the int64 column turns float64 once, on its first float or null
+            data = self._data = array("d", data)
+            data.append(math.nan if value is None else value)
+        else:
+            values = data.tolist()
+            if data.typecode == "d":
+                values = [None if math.isnan(x) else x for x in values]
+            values.append(value)
+            self._data = values
+
+    def extend(self, values):
+        """
+        Append a batch of values, typed in one pass when they are all numbers or nulls
+        :param values: list
+        """
+        data = self._data
+        types = set(map(type, values))
+        if isinstance(data, list) or not types <= {int, float, type(None)}:
+            for value in values:
+                self.append(value)
+        elif types <= {int} and data.typecode == "q":
+            try:
+                data.extend(array("q", values))
+            except OverflowError:
+                for value in values:
+                    self.append(value)
+        else:
+            if data.typecode == "q":
+                data = self._data = array("d", data)
+            data.extend(array("d", [math.nan if value is None else value for value in values]))
+
+    def __len__(self):
+        return len(self._data)
+
+    def to_numpy(self):
+        """
+        :return: np.ndarray, sharing memory with the buffer for numeric columns
+        """
+        if isinstance(self._data, list):
+            return decode.to_array(self._data)
+        dtype = np.int64 if self._data.typecode == "q" else np.float64
+        return np.frombuffer(self._data, dtype=dtype) if len(self._data) else np.array([], dtype=dtype)
+
+
+class RecordBuffers:
+    """
+    Column buffers for a stream of flat records, rows are written directly into the columns
+    """
+    def __init__(self, rename=None, date_keys=()):
+        """
+        :param rename: Function or dict mapping JSON key -> column name
+        :param date_keys: JSON keys holding ISO dates, buffered as datetime64[ns]
+        """
+        self._rename = rename or {}
+        self._date_keys = set(date_keys)
+        self._keys = []
+        self._columns = {}
+        self._dates = {}
+        self._meta = {}
+        self._rows = 0
+
+    def _column_name(self, key):
+        return self._rename(key) if callable(self._rename) else self._rename.get(key, key)
+
+    def _column(self, key):
+        """
+        :return: ColumnBuffer of a key, a new one with the rows so far missing if it is a new key
+        """
+        column = self._columns.get(key)
+        if column is None:
+            column = self._columns[key] = ColumnBuffer(missing=self._rows)
+            self._keys.append(key)
+        return column
+
+    def _add_dates(self, key):
+        if key not in self._dates:
+            self._dates[key] = array("q", np.full(self._rows, np.datetime64("NaT"), "datetime64[ns]").view("i8"))
+            self._keys.append(key)
+
+    def extend(self, records, **meta):
+        """
+        Append records, with meta values repeated on every row
+        :param records: list of dict
+        :param meta: Column name -> value
+        """
+        date_keys = self._date_keys
+        keys = records[0].keys() if records else {}
+        if all(record.keys() == keys for record in records):
+            # the usual case, every record has the same keys: one column at a time
+            for key in keys:
+                if key in date_keys:
+                    self._add_dates(key)
+                else:
+                    self._column(key).extend([record[key] for record in records])
+            for key, column in self._columns.items():
+                if key not in keys:
+                    column.extend([None] * len(records))
+            self._rows += len(records)
+        else:
+            # date buffers first, they are filled for the whole batch below
+            for record in records:
+                for key in date_keys.intersection(record):
+                    self._add_dates(key)
+            for record in records:
+                for key, value in record.items():
+                    if key not in date_keys:
+                        self._column(key).append(value)
+                self._rows += 1
+                # keys missing in this record
+                for column in self._columns.values():
+                    if len(column) < self._rows:
+                        column.append(None)
+        for key, dates in self._dates.items():
+            # parse the batch of dates at once instead of per row
+            parsed = decode.to_datetime([record.get(key) for record in records])
+            dates.extend(np.asarray(parsed, dtype="datetime64[ns]").view("i8"))
+        for name, value in meta.items():
+            self._meta.setdefault(name, ColumnBuffer()).extend([value] * len(records))
+
+    def to_columns(self):
+        """
+        :return: dict of column name -> np.ndarray, meta columns last
+        """
+        columns = {}
+        for key in self._keys:
+            if key in self._dates:
+                column = np.frombuffer(self._dates[key], dtype="datetime64[ns]") if self._rows else \
+                    np.array([], dtype="datetime64[ns]")
+            else:
+                column = self._columns[key].to_numpy()
+            columns[self._column_name(key)] = column
+        columns.update({name: column.to_numpy() for name, column in self._meta.items()})
+        return columns
@@ -0,0 +1,47 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HttpTransport:
+    """
+    Pooled keep-alive HTTP transport used by BorsdataAPI.
+    One requests.Session is kept open so consecutive calls reuse the same
+    TCP/TLS connection instead of doing a new handshake for every request.
+    """
+    def __init__(self, pool_size=10, timeout=(5, 30), compress=True):
+        """
+        :param pool_size: Max. number of pooled connections per host
+        :param timeout: Seconds, either one value or a (connect, read) tuple
+        :param compress: True to negotiate gzip/deflate encoded responses
+        """
+        self._timeout = timeout
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        if compress:
+            self._session.headers["Accept-Encoding"] = "gzip, deflate"
+        else:
+            self._session.headers["Accept-Encoding"] = "identity"
+
+    def get(self, url, params=None, stream=False):
+        """
+        Send a GET request over the pooled session
+        :param url: Full URL
+        :param params: URL parameters dict
+        :param stream: True to leave the body unread (for incremental parsing)
+        :return: requests.Response
+        """
+        return self._session.get(url, params=params, timeout=self._timeout, stream=stream)
+
+    def close(self):
+        """
+        Close all pooled connections
+        """
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
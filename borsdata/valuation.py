@@ -0,0 +1,165 @@
+"""
+Daily point-in-time valuation ratios (P/E, P/S, EV/EBIT) for many instruments at once.
+Each trading day is as-of joined to the latest report published on or before it (report_date), per
+instrument, so a ratio never uses a report before its release.
+Report values and number_of_shares are both in millions, so market_cap = close * number_of_shares
+is in millions of the report currency (price and report currency are taken to be the same).
+"""
+import datetime as dt
+import threading
+from borsdata.lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+REPORT_TYPES = ["quarter", "year", "r12"]
+# report values joined onto the prices
+REPORT_COLUMNS = ["revenues", "operating_income", "profit_to_equity_holders", "net_debt", "number_of_shares"]
+VALUATION_COLUMNS = ["stock_id", "date", "close", "report_date", "market_cap", "pe", "ps", "ev_ebit"]
+
+
+class ValuationSeries:
+    """
+    Cached valuation series of an instrument universe. update fetches only prices after the last
+    cached day, and recomputes an instrument's whole series only when it has a new report.
+    """
+    def __init__(self, api, report_type="r12", split_adjuster=None):
+        """
+        :param api: BorsdataAPI
+        :param report_type: 'r12' (default, trailing twelve months), 'quarter' or 'year'
+        :param split_adjuster: SplitAdjuster to restate reported share counts after later splits,
+            None to use them as reported
+        """
+        if report_type not in REPORT_TYPES:
+            raise ValueError(f"Unknown report_type: {report_type}, expected one of {REPORT_TYPES}")
+        self._api = api
+        self._report_type = report_type
+        self._split_adjuster = split_adjuster
+        self._lock = threading.Lock()
+        self._prices = None
+        self._reports = None
+        self._valuations = None
+
+    def update(self, ins_ids):
+        """
+        Bring the series of instruments up to date
+        :param ins_ids: Instrument ID list
+        :return: pd.DataFrame of VALUATION_COLUMNS, one row per instrument and trading day, sorted by
+            stock_id and date
+        """
+        ins_ids = sorted({int(ins_id) for ins_id in ins_ids})
+        with self._lock:
+            cached = set() if self._prices is None else set(self._prices["stock_id"].unique().tolist())
+            new_prices = [self._fetch_prices([ins_id for ins_id in ins_ids if ins_id not in cached])]
+            known_ids = [ins_id for ins_id in ins_ids if ins_id in cached]
+            if known_ids:
+                # from the earliest last day, instruments updated alone before are behind the others
+                last_dates = self._prices[self._prices["stock_id"].isin(known_ids)].groupby("stock_id")["date"].max()
+                from_date = pd.Timestamp(last_dates.min()).date() + dt.timedelta(days=1)
+                new_prices.append(self._fetch_prices(known_ids, from_date=str(from_date)))
+            new_prices = pd.concat(new_prices, ignore_index=True)
+
+            reports = self._fetch_reports(ins_ids)
+            changed = self._changed(reports, ins_ids)
+            if self._reports is not None:
+                reports = pd.concat([self._reports[~self._reports["stock_id"].isin(ins_ids)], reports],
+                                    ignore_index=True)
+            self._reports = reports
+            prices = new_prices if self._prices is None else \
+                pd.concat([self._prices, new_prices], ignore_index=True).drop_duplicates(["stock_id", "date"], keep="last")
+            self._prices = prices
+
+            # new trading days of every instrument, all days of instruments with a new report
+            stale = pd.concat([prices[prices["stock_id"].isin(changed)],
+                               new_prices[~new_prices["stock_id"].isin(changed)]], ignore_index=True)
+            valuations = [self._valuate(stale, reports)]
+            if self._valuations is not None:
+                valuations.insert(0, self._valuations[~self._valuations["stock_id"].isin(changed)])
+            valuations = pd.concat(valuations, ignore_index=True) \
+                .drop_duplicates(["stock_id", "date"], keep="last") \
+                .sort_values(["stock_id", "date"], ignore_index=True)
+            self._valuations = valuations
+        return valuations[valuations["stock_id"].isin(ins_ids)].reset_index(drop=True)
+
+    def panel(self, ratio="pe"):
+        """
+        :param ratio: Valuation column, e.g. 'pe', 'ps', 'ev_ebit' or 'market_cap'
+        :return: pd.DataFrame indexed by date with one column per instrument id, of the cached series
+        """
+        if self._valuations is None:
+            return pd.DataFrame()
+        return self._valuations.pivot(index="date", columns="stock_id", values=ratio)
+
+    def _fetch_prices(self, ins_ids, from_date=None):
+        """
+        :return: pd.DataFrame with stock_id, date and close columns
+        """
+        if not ins_ids:
+            return pd.DataFrame({"stock_id": np.array([], dtype=np.int64), "date": np.array([], dtype="datetime64[ns]"),
+                                 "close": np.array([], dtype=np.float64)})
+        stock_prices = self._api.get_instrument_stock_prices_list(ins_ids, from_date=from_date)
+        if "stock_id" not in stock_prices:
+            return self._fetch_prices([])
+        # missing prices are filled with 0 by the API wrapper
+        return pd.DataFrame({"stock_id": stock_prices["stock_id"].to_numpy(dtype=np.int64),
+                             "date": stock_prices["date"].to_numpy(),
+                             "close": stock_prices["close"].where(stock_prices["close"] > 0).to_numpy(dtype=np.float64)})
+
+    def _fetch_reports(self, ins_ids):
+        """
+        :return: pd.DataFrame with stock_id, report_date, year, period and REPORT_COLUMNS
+        """
+        reports = self._api.get_instrument_report_list(ins_ids)[REPORT_TYPES.index(self._report_type)]
+        columns = ["stock_id", "report_date", "year", "period"] + REPORT_COLUMNS
+        if "stock_id" not in reports or "report_date" not in reports:
+            return pd.DataFrame({column: [] for column in columns}).astype({"stock_id": np.int64,
+                                                                            "report_date": "datetime64[ns]"})
+        reports = reports.reindex(columns=columns)
+        reports["stock_id"] = reports["stock_id"].astype(np.int64)
+        # unreleased reports have no date (filled with 0)
+        reports["report_date"] = pd.to_datetime(reports["report_date"].astype(str), errors="coerce")
+        return reports.dropna(subset=["report_date"])
+
+    def _changed(self, reports, ins_ids):
+        """
+        :return: List of instruments whose latest report differs from the cached one (all of them on the first update)
+        """
+        latest = reports.groupby("stock_id")["report_date"].max()
+        if self._reports is None:
+            return ins_ids
+        cached = self._reports.groupby("stock_id")["report_date"].max()
+        return [ins_id for ins_id in ins_ids if latest.get(ins_id) != cached.get(ins_id)]
+
+    def _valuate(self, prices, reports):
+        """
+        As-of join the latest released report onto every price row and compute the ratios
+        :return: pd.DataFrame of VALUATION_COLUMNS
+        """
+        # of reports released the same day the latest period wins
+        reports = reports.sort_values(["report_date", "year", "period"]).drop(columns=["year", "period"])
+        df = pd.merge_asof(prices.sort_values("date"), reports, left_on="date", right_on="report_date", by="stock_id",
+                           direction="backward")
+        shares = df["number_of_shares"]
+        if self._split_adjuster is not None:
+            shares = shares * self._split_correction(df)
+        df["market_cap"] = df["close"] * shares
+        # ratios of losses or of a missing denominator are left out
+        df["pe"] = df["market_cap"] / df["profit_to_equity_holders"].where(df["profit_to_equity_holders"] > 0)
+        df["ps"] = df["market_cap"] / df["revenues"].where(df["revenues"] > 0)
+        df["ev_ebit"] = (df["market_cap"] + df["net_debt"]) / df["operating_income"].where(df["operating_income"] > 0)
+        return df[VALUATION_COLUMNS]
+
+    def _split_correction(self, df):
+        """
+        Share count factor of splits between each row's report date and its price date
+        :return: np.ndarray, 1.0 for rows without a split in between
+        """
+        correction = np.ones(len(df))
+        split_ids = set(self._split_adjuster.ins_ids())
+        for ins_id, rows in df.groupby("stock_id", sort=False).indices.items():
+            if ins_id in split_ids:
+                report_dates = df["report_date"].to_numpy()[rows]
+                dates = df["date"].to_numpy()[rows]
+                correction[rows] = self._split_adjuster.factors(ins_id, report_dates) / \
+                    self._split_adjuster.factors(ins_id, dates)
+        return correction
@@ -0,0 +1,268 @@
+"""
+Local analytical warehouse of fetched API data in a SQLite file: metadata, instruments, daily
+stock prices, reports, KPI history and screener values in tables with primary keys, so loads
+are incremental upserts and queries are indexed SQL returning DataFrames:
+
+    warehouse = Warehouse("warehouse/", api)
+    warehouse.sync_metadata()
+    ins_ids = warehouse.instruments(market="Large Cap", country="Sverige")["ins_id"]
+    warehouse.sync_stock_prices(ins_ids)
+    warehouse.query("SELECT ins_id, MAX(close) FROM stock_prices WHERE date >= ? GROUP BY ins_id", ["2024-01-01"])
+"""
+import datetime as dt
+import os
+import re
+import sqlite3
+import threading
+from borsdata.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+REPORT_TYPES = {"reportsQuarter": "quarter", "reportsYear": "year", "reportsR12": "r12"}
+REPORT_VALUE_COLUMNS = [
+    "revenues", "gross_income", "operating_income", "profit_before_tax", "profit_to_equity_holders",
+    "earnings_per_share", "number_of_shares", "dividend", "intangible_assets", "tangible_assets", "financial_assets",
+    "non_current_assets", "cash_and_equivalents", "current_assets", "total_assets", "total_equity",
+    "non_current_liabilities", "current_liabilities", "total_liabilities_and_equity", "net_debt",
+    "cash_flow_from_operating_activities", "cash_flow_from_investing_activities",
+    "cash_flow_from_financing_activities", "cash_flow_for_the_year", "free_cash_flow", "stock_price_average",
+    "stock_price_high", "stock_price_low", "currency_ratio", "net_sales"]
+
+SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS countries (id INTEGER PRIMARY KEY, name TEXT);
+    CREATE TABLE IF NOT EXISTS markets (id INTEGER PRIMARY KEY, name TEXT, country_id INTEGER, is_index INTEGER,
+        exchange_name TEXT);
+    CREATE TABLE IF NOT EXISTS sectors (id INTEGER PRIMARY KEY, name TEXT);
+    CREATE TABLE IF NOT EXISTS branches (id INTEGER PRIMARY KEY, name TEXT, sector_id INTEGER);
+    CREATE TABLE IF NOT EXISTS instruments (
+        ins_id INTEGER PRIMARY KEY, name TEXT, url_name TEXT, instrument INTEGER, isin TEXT, ticker TEXT, yahoo TEXT,
+        sector_id INTEGER, market_id INTEGER, branch_id INTEGER, country_id INTEGER, listing_date TEXT,
+        stock_price_currency TEXT, report_currency TEXT);
+    CREATE INDEX IF NOT EXISTS instruments_market_country ON instruments (market_id, country_id);
+    CREATE TABLE IF NOT EXISTS stock_prices (
+        ins_id INTEGER, date TEXT, open REAL, high REAL, low REAL, close REAL, volume INTEGER,
+        PRIMARY KEY (ins_id, date)) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS stock_prices_date ON stock_prices (date);
+    CREATE TABLE IF NOT EXISTS reports (
+        ins_id INTEGER, year INTEGER, period INTEGER, report_type TEXT,
+        {", ".join(f"{column} REAL" for column in REPORT_VALUE_COLUMNS)},
+        currency TEXT, report_start_date TEXT, report_end_date TEXT, report_date TEXT, broken_fiscal_year INTEGER,
+        PRIMARY KEY (ins_id, year, period, report_type)) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS reports_report_date ON reports (report_date);
+    CREATE TABLE IF NOT EXISTS kpi_history (
+        ins_id INTEGER, year INTEGER, period INTEGER, kpi_id INTEGER, report_type TEXT, price_type TEXT, value REAL,
+        PRIMARY KEY (ins_id, year, period, kpi_id, report_type, price_type)) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS kpi_history_kpi ON kpi_history (kpi_id, report_type, price_type, year);
+    CREATE TABLE IF NOT EXISTS kpi_values (
+        ins_id INTEGER, kpi_id INTEGER, calc_group TEXT, calc TEXT, value_num REAL, value_str TEXT,
+        PRIMARY KEY (ins_id, kpi_id, calc_group, calc)) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS kpi_values_kpi ON kpi_values (kpi_id, calc_group, calc);
+    CREATE TABLE IF NOT EXISTS syncs (name TEXT PRIMARY KEY, value TEXT);
+    CREATE VIEW IF NOT EXISTS instruments_with_meta_data AS
+        SELECT i.ins_id, i.name, i.ticker, i.isin, i.instrument, m.name AS market, c.name AS country,
+               COALESCE(s.name, 'N/A') AS sector, COALESCE(b.name, 'N/A') AS branch, i.market_id, i.country_id
+        FROM instruments i
+        LEFT JOIN markets m ON m.id = i.market_id
+        LEFT JOIN countries c ON c.id = i.country_id
+        LEFT JOIN sectors s ON s.id = i.sector_id
+        LEFT JOIN branches b ON b.id = i.branch_id;
+"""
+
+PRIMARY_KEYS = {
+    "countries": ["id"],
+    "markets": ["id"],
+    "sectors": ["id"],
+    "branches": ["id"],
+    "instruments": ["ins_id"],
+    "stock_prices": ["ins_id", "date"],
+    "reports": ["ins_id", "year", "period", "report_type"],
+    "kpi_history": ["ins_id", "year", "period", "kpi_id", "report_type", "price_type"],
+    "kpi_values": ["ins_id", "kpi_id", "calc_group", "calc"],
+}
+
+DATE_COLUMNS = ["listing_date", "date", "report_start_date", "report_end_date", "report_date"]
+
+
+def column_name(name):
+    """
+    :param name: API column name, e.g. 'insId', 'marketId' or 'stock_id'
+    :return: Table column name, e.g. 'ins_id', 'market_id' or 'ins_id'
+    """
+    name = re.sub(r"(?<=[a-z0-9])(?=[A-Z])", "_", name).lower()
+    return "ins_id" if name == "stock_id" else name
+
+
+class Warehouse:
+    """
+    SQLite warehouse of API data, loaded with the sync_* methods and read with query
+    """
+    def __init__(self, path, api=None):
+        """
+        :param path: Warehouse directory
+        :param api: BorsdataAPI used by the sync_* methods
+        """
+        os.makedirs(path, exist_ok=True)
+        self._api = api
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(path, "warehouse.sqlite"), check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._columns = {table: [row[1] for row in self._db.execute(f"PRAGMA table_info({table})")]
+                         for table in PRIMARY_KEYS}
+
+    def upsert(self, table, columns):
+        """
+        Insert rows, updating the rows that already exist with the same primary key
+        :param table: Table name
+        :param columns: dict of column name -> list of values, columns the table does not have are left out
+        :return: Number of rows written
+        """
+        names = [name for name in columns if name in self._columns[table]]
+        keys = PRIMARY_KEYS[table]
+        updates = ", ".join(f"{name} = excluded.{name}" for name in names if name not in keys)
+        sql = f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))}) " \
+              f"ON CONFLICT ({', '.join(keys)}) DO {f'UPDATE SET {updates}' if updates else 'NOTHING'}"
+        rows = list(zip(*(columns[name] for name in names)))
+        with self._lock:
+            self._db.executemany(sql, rows)
+            self._db.commit()
+        return len(rows)
+
+    def query(self, sql, params=()):
+        """
+        :param sql: SQL query
+        :param params: Query parameters
+        :return: pd.DataFrame
+        """
+        with self._lock:
+            return pd.read_sql_query(sql, self._db, params=params)
+
+    def instruments(self, market=None, country=None):
+        """
+        Instruments with market, country, sector and branch names, filtered with indexed SQL
+        :param market: Market name, e.g. 'Large Cap', None for all
+        :param country: Country name, e.g. 'Sverige', None for all
+        :return: pd.DataFrame with ins_id, name, ticker, isin, instrument, market, country, sector and branch columns
+        """
+        conditions = []
+        # by id, so the lookup uses the instruments (market_id, country_id) index
+        if market is not None:
+            conditions.append("market_id IN (SELECT id FROM markets WHERE name = :market)")
+        if country is not None:
+            conditions.append("country_id IN (SELECT id FROM countries WHERE name = :country)")
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self.query(f"SELECT * FROM instruments_with_meta_data{where} ORDER BY ins_id",
+                          {"market": market, "country": country})
+
+    def last_sync(self, name):
+        """
+        :param name: Dataset name, e.g. 'metadata' or 'stock_prices'
+        :return: ISO timestamp of the last sync, None if never synced
+        """
+        with self._lock:
+            row = self._db.execute("SELECT value FROM syncs WHERE name = ?", (name,)).fetchone()
+        return None if row is None else row[0]
+
+    def _synced(self, name):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO syncs VALUES (?, ?)",
+                             (name, dt.datetime.now().isoformat(timespec="seconds")))
+            self._db.commit()
+
+    def _load(self, table, columns, **constants):
+        """
+        Upsert columns of a get_* result in 'dict' format, with API names, dates as 'YYYY-MM-DD'
+        and constant columns (e.g. report_type) added
+        """
+        columns = {column_name(name): values for name, values in columns.items()}
+        for name in DATE_COLUMNS:
+            if name in columns:
+                columns[name] = [value[:10] if isinstance(value, str) else None for value in columns[name]]
+        rows = len(next(iter(columns.values()), []))
+        columns.update({name: [value] * rows for name, value in constants.items()})
+        return self.upsert(table, columns) if rows else 0
+
+    def sync_metadata(self):
+        """
+        Load countries, markets, sectors, branches and instruments
+        :return: Number of rows written
+        """
+        rows = self._load("countries", self._api.get_countries(format="dict"))
+        rows += self._load("markets", self._api.get_markets(format="dict"))
+        rows += self._load("sectors", self._api.get_sectors(format="dict"))
+        rows += self._load("branches", self._api.get_branches(format="dict"))
+        rows += self._load("instruments", self._api.get_instruments(format="dict"))
+        self._synced("metadata")
+        return rows
+
+    def last_dates(self, ins_ids):
+        """
+        :param ins_ids: Instrument ID list
+        :return: dict of ins_id -> last stored price date ('YYYY-MM-DD'), for instruments with prices
+        """
+        ins_ids = [int(ins_id) for ins_id in ins_ids]
+        with self._lock:
+            rows = self._db.execute(f"SELECT ins_id, MAX(date) FROM stock_prices WHERE ins_id IN "
+                                    f"({', '.join('?' * len(ins_ids))}) GROUP BY ins_id", ins_ids).fetchall()
+        return dict(rows)
+
+    def sync_stock_prices(self, ins_ids):
+        """
+        Load daily prices, for stored instruments only the days after the earliest of their last stored dates
+        :param ins_ids: Instrument ID list
+        :return: Number of rows written
+        """
+        ins_ids = [int(ins_id) for ins_id in ins_ids]
+        last_dates = self.last_dates(ins_ids)
+        new_ids = [ins_id for ins_id in ins_ids if ins_id not in last_dates]
+        rows = 0
+        if new_ids:
+            rows += self._load("stock_prices", self._api.get_instrument_stock_prices_list(new_ids, format="dict"))
+        if last_dates:
+            from_date = dt.date.fromisoformat(min(last_dates.values())) + dt.timedelta(days=1)
+            rows += self._load("stock_prices", self._api.get_instrument_stock_prices_list(
+                list(last_dates), from_date=str(from_date), format="dict"))
+        self._synced("stock_prices")
+        return rows
+
+    def sync_reports(self, ins_ids):
+        """
+        Load quarter, year and r12 reports
+        :param ins_ids: Instrument ID list
+        :return: Number of rows written
+        """
+        reports = self._api.get_instrument_report_list(list(ins_ids), format="dict")
+        rows = sum(self._load("reports", columns, report_type=report_type)
+                   for columns, report_type in zip(reports, REPORT_TYPES.values()))
+        self._synced("reports")
+        return rows
+
+    def sync_kpi_history(self, ins_ids, kpi_id, report_type, price_type):
+        """
+        Load KPI history
+        :param ins_ids: Instrument ID list
+        :param kpi_id: KPI ID
+        :param report_type: ['quarter', 'year', 'r12']
+        :param price_type: ['mean', 'high', 'low']
+        :return: Number of rows written
+        """
+        history = self._api.get_kpi_history_list(list(ins_ids), kpi_id, report_type, price_type, format="dict")
+        history["value"] = history.pop("kpiValue", [])
+        rows = self._load("kpi_history", history, kpi_id=kpi_id, report_type=report_type, price_type=price_type)
+        self._synced(f"kpi_history/{kpi_id}/{report_type}/{price_type}")
+        return rows
+
+    def sync_kpi_values(self, kpi_id, calc_group, calc):
+        """
+        Load screener values of all instruments
+        :param kpi_id: KPI ID
+        :param calc_group: ['1year', '3year', '5year', '7year', '10year', '15year']
+        :param calc: ['high', 'latest', 'mean', 'low', 'sum', 'cagr']
+        :return: Number of rows written
+        """
+        values = self._api.get_kpi_data_all_instruments(kpi_id, calc_group, calc, format="dict")
+        rows = self._load("kpi_values", values, kpi_id=kpi_id, calc_group=calc_group, calc=calc)
+        self._synced(f"kpi_values/{kpi_id}/{calc_group}/{calc}")
+        return rows
+
+    def close(self):
+        self._db.close()
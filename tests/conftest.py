@@ -0,0 +1,56 @@
+import json
+
+import pytest
+import requests
+
+
+class FakeTransport:
+    """
+    In-memory stand-in for HttpTransport, serving canned JSON payloads by URL path.
+    """
+    def __init__(self, routes):
+        self.routes = routes
+        self.calls = []
+        self.closed = False
+        # number of returned responses closed, a response left open holds a pooled connection
+        self.responses_closed = 0
+
+    def get(self, url, params=None, stream=False):
+        self.calls.append((url, dict(params or {})))
+        path = url.split("/v1/", 1)[-1]
+        payload = self.routes[path]
+        if callable(payload):
+            payload = payload(params or {})
+        if isinstance(payload, requests.Response):
+            response = payload
+        else:
+            response = requests.Response()
+            response.status_code = 200
+            response._content = json.dumps(payload).encode()
+            response._content_consumed = True
+        response.url = url
+        response.close = self._counted(response.close)
+        return response
+
+    def _counted(self, close):
+        def counted_close():
+            self.responses_closed += 1
+            close()
+        return counted_close
+
+    def close(self):
+        self.closed = True
+
+
+def make_response(status_code, payload=None, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(payload).encode()
+    response._content_consumed = True
+    response.headers.update(headers or {})
+    return response
+
+
+@pytest.fixture
+def fake_transport():
+    return FakeTransport
@@ -1,15 +1,34 @@
+import pytest
+
+from borsdata import constants
+from borsdata.borsdata_api import BorsdataAPI
 from borsdata.borsdata_client import BorsdataClient
+from borsdata.mock_server import MockBorsdataServer
+from borsdata.rate_limiter import TokenBucket
+
+
+@pytest.fixture
+def borsdata_client(tmp_path, monkeypatch):
+    # runs offline against the local stand-in for the API
+    monkeypatch.setattr(constants, "EXPORT_PATH", f"{tmp_path}/")
+    with MockBorsdataServer(universe_size=50) as server:
+        yield BorsdataClient(BorsdataAPI("offline", url_root=server.url_root, limiter=TokenBucket(1000, 1000)))
 
-def test_borsdata():
-    borsdata_client = BorsdataClient()
-    instruments_with_kpi_2_data = borsdata_client.instruments_with_kpi_data(kpi=2, save_to_csv=True)
-    instruments_with_kpi_3_data = borsdata_client.instruments_with_kpi_data(kpi=3, save_to_csv=True)
+
+def test_borsdata(borsdata_client, tmp_path):
+    instruments_with_kpi_2_data = borsdata_client.instruments_with_kpi_data(kpi_id=2, save_to_csv=True)
+    instruments_with_kpi_3_data = borsdata_client.instruments_with_kpi_data(kpi_id=3, save_to_csv=True)
     instruments_with_meta_data = borsdata_client.instruments_with_meta_data()
-    
+
     # 1. combine these dataframes
+    combined = instruments_with_meta_data.set_index('ins_id') \
+        .join(instruments_with_kpi_2_data['valueNum'].rename('pe')) \
+        .join(instruments_with_kpi_3_data['valueNum'].rename('ps'))
     # 2. filter out the instruments that have kpi 2 and 3 data
+    with_kpi_data = combined.dropna(subset=['pe', 'ps'])
     # 3. filter out the instruments that have a specific country
+    swedish = with_kpi_data[with_kpi_data['country'] == 'Sverige']
 
-    pass
-
-    
\ No newline at end of file
+    assert len(combined) == len(instruments_with_meta_data) == 51
+    assert 0 < len(swedish) < len(with_kpi_data)
+    assert (tmp_path / "instruments_with_kpi_2_data.csv").exists()
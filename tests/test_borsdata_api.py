@@ -0,0 +1,113 @@
+import os
+import subprocess
+import sys
+import pytest
+import requests
+from borsdata.borsdata_api import BorsdataAPI, INSTLIST_MAX_SIZE
+from borsdata.rate_limiter import TokenBucket
+from conftest import make_response
+
+
+def _stock_prices_list(params):
+    ins_ids = [int(ins_id) for ins_id in params["instList"].split(",")]
+    return {"stockPricesArrayList": [
+        {"instrument": ins_id, "stockPricesList": [{"d": "2024-01-02", "c": 1.0, "h": 1.0, "l": 1.0, "o": 1.0, "v": 5},
+                                                   {"d": "2024-01-03", "c": 2.0, "h": 2.0, "l": 2.0, "o": 2.0, "v": 6}]}
+        for ins_id in ins_ids]}
+
+
+def test_stock_prices_list_is_chunked(fake_transport):
+    transport = fake_transport({"instruments/stockprices": _stock_prices_list})
+    api = BorsdataAPI("key", transport=transport, limiter=TokenBucket(1000, 1000))
+    ins_ids = list(range(1, 2 * INSTLIST_MAX_SIZE + 21))
+    stock_prices = api.get_instrument_stock_prices_list(ins_ids)
+    assert len(transport.calls) == 3
+    assert all(len(params["instList"].split(",")) <= INSTLIST_MAX_SIZE for url, params in transport.calls)
+    assert stock_prices["stock_id"].tolist() == [ins_id for ins_id in ins_ids for _ in range(2)]
+    assert str(stock_prices["date"].dtype) == "datetime64[ns]"
+
+
+def test_kpi_matrix_is_cached_per_calculation(fake_transport):
+    updated = {"kpisCalcUpdated": "2024-01-01T06:00:00"}
+    routes = {"instruments/kpis/updated": lambda params: updated,
+              "instruments/kpis/2/1year/latest": {"values": [{"i": 3, "n": 12.5, "s": None}, {"i": 5, "n": 8.0, "s": None}]},
+              "instruments/kpis/7/1year/latest": {"values": [{"i": 4, "n": None, "s": "A"}, {"i": 3, "n": 1.0, "s": None}]}}
+    transport = fake_transport(routes)
+    api = BorsdataAPI("key", transport=transport, limiter=TokenBucket(1000, 1000))
+    matrix = api.get_kpi_matrix([2, 7], "1year", "latest")
+    assert matrix.index.tolist() == [3, 4, 5]
+    assert matrix[("valueNum", 2)].tolist()[::2] == [12.5, 8.0]
+    assert matrix.loc[4, ("valueStr", 7)] == "A"
+    assert ("valueStr", 2) not in matrix
+
+    api.get_kpi_matrix([2, 7], "1year", "latest")
+    assert len(transport.calls) == 4
+    updated["kpisCalcUpdated"] = "2024-01-02T06:00:00"
+    api.get_kpi_matrix([2], "1year", "latest")
+    assert len(transport.calls) == 6
+
+
+def _kpi_history_list(params):
+    ins_ids = [int(ins_id) for ins_id in params["instList"].split(",")]
+    return {"kpisList": [{"instrument": ins_id, "values": [{"y": 2023, "p": 5, "v": ins_id / 10},
+                                                           {"y": 2022, "p": 5, "v": None}]}
+                         for ins_id in ins_ids]}
+
+
+def test_kpi_history_list_is_batched(fake_transport):
+    transport = fake_transport({"instruments/kpis/2/year/mean/history": _kpi_history_list})
+    api = BorsdataAPI("key", transport=transport, limiter=TokenBucket(1000, 1000))
+    ins_ids = list(range(1, INSTLIST_MAX_SIZE + 11))
+    history = api.get_kpi_history_list(ins_ids, 2, "year", "mean", max_count=2)
+    assert len(transport.calls) == 2
+    assert all(params["maxCount"] == 2 for url, params in transport.calls)
+    assert history.index.names == ["insId", "year", "period"]
+    assert history.loc[(3, 2023, 5), "kpiValue"] == 0.3
+    assert history.index.get_level_values("year").tolist()[:2] == [2023, 2022]
+
+
+def test_kpi_history_list_falls_back_to_per_instrument_calls(fake_transport):
+    routes = {"instruments/kpis/2/year/mean/history": make_response(404, {}),
+              "instruments/3/kpis/2/year/mean/history": {"values": [{"y": 2023, "p": 5, "v": 1.5}]},
+              "instruments/4/kpis/2/year/mean/history": {"values": [{"y": 2023, "p": 5, "v": 2.5}]}}
+    api = BorsdataAPI("key", transport=fake_transport(routes), limiter=TokenBucket(1000, 1000))
+    history = api.get_kpi_history_list([4, 3], 2, "year", "mean")
+    assert history["kpiValue"].tolist() == [1.5, 2.5]
+
+
+def test_errors_are_raised_after_the_retries(fake_transport):
+    routes = {"instruments": make_response(404, {}), "instruments/3/stockprices": make_response(503, {}),
+              "instruments/kpis/2/year/mean/history": make_response(429, {})}
+    transport = fake_transport(routes)
+    api = BorsdataAPI("key", transport=transport, limiter=TokenBucket(1000, 1000), max_retries=0)
+    with pytest.raises(requests.HTTPError) as error:
+        api.get_instruments()
+    assert error.value.response.status_code == 404
+    with pytest.raises(requests.HTTPError):
+        api.get_instrument_stock_prices(3)
+    # only a 404 of the list form falls back to per-instrument calls
+    with pytest.raises(requests.HTTPError):
+        api.get_kpi_history_list([3, 4], 2, "year", "mean")
+    assert len(transport.calls) == 3
+
+
+def test_raw_formats_skip_the_frame(fake_transport):
+    transport = fake_transport({"instruments/stockprices": _stock_prices_list})
+    api = BorsdataAPI("key", transport=transport, limiter=TokenBucket(1000, 1000))
+    columns = api.get_instrument_stock_prices_list([3, 4], format="dict")
+    assert columns["date"] == ["2024-01-02", "2024-01-03"] * 2
+    assert columns["stock_id"] == [3, 3, 4, 4]
+    arrays = api.get_instrument_stock_prices_list([3, 4], format="numpy", stream=True)
+    assert str(arrays["date"].dtype) == "datetime64[ns]"
+    assert arrays["close"].tolist() == [1.0, 2.0, 1.0, 2.0]
+    assert api.get_instrument_stock_prices_list([3], format="dict", stream=True)["date"] == ["2024-01-02", "2024-01-03"]
+    with pytest.raises(ValueError):
+        api.get_instrument_stock_prices_list([3], format="records")
+
+
+@pytest.mark.parametrize("module", ["borsdata_client", "price_store", "excel_exporter", "parquet_exporter"])
+def test_api_import_does_not_load_pandas(module):
+    code = f"import sys, borsdata.{module}; print(any(m in sys.modules for m in ['pandas', 'numpy', 'matplotlib']))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result.stdout.strip() == "False"
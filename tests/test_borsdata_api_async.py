@@ -0,0 +1,52 @@
+import asyncio
+import threading
+
+from borsdata.borsdata_api_async import AsyncBorsdataAPI
+from borsdata.rate_limiter import TokenBucket
+
+
+def _prices(params):
+    return {"stockPricesList": [{"d": "2024-01-02", "c": 10.0, "h": 11.0, "l": 9.0, "o": 9.5, "v": 100}]}
+
+
+def test_gather_stock_prices(fake_transport):
+    transport = fake_transport({f"instruments/{ins_id}/stockprices": _prices for ins_id in range(1, 6)})
+
+    async def run():
+        async with AsyncBorsdataAPI("key", transport=transport, limiter=TokenBucket(100, 100)) as api:
+            return await api.get_instrument_stock_prices_many([1, 2, 3, 4, 5])
+
+    prices = asyncio.run(run())
+    assert sorted(prices) == [1, 2, 3, 4, 5]
+    assert prices[3]["close"].iloc[0] == 10.0
+    assert transport.closed
+
+
+def test_aclose_does_not_block_the_event_loop(fake_transport):
+    released = threading.Event()
+
+    def slow_prices(params):
+        released.wait(5)
+        return _prices(params)
+
+    transport = fake_transport({"instruments/1/stockprices": slow_prices})
+
+    async def run():
+        api = AsyncBorsdataAPI("key", transport=transport, limiter=TokenBucket(100, 100))
+        call = asyncio.ensure_future(api.get_instrument_stock_prices(1))
+        await asyncio.sleep(0.05)
+        closing = asyncio.ensure_future(api.aclose())
+        await asyncio.sleep(0.05)
+        # the loop still runs while aclose waits for the call in flight
+        assert not closing.done()
+        released.set()
+        await closing
+        return await call
+
+    assert len(asyncio.run(run())) == 1
+    assert transport.closed
+
+
+def test_every_get_method_is_a_coroutine():
+    assert asyncio.iscoroutinefunction(AsyncBorsdataAPI.get_branches)
+    assert asyncio.iscoroutinefunction(AsyncBorsdataAPI.get_kpi_history)
@@ -0,0 +1,43 @@
+import pandas as pd
+import pytest
+
+from borsdata import constants
+from borsdata.borsdata_api import BorsdataAPI
+from borsdata.borsdata_client import BorsdataClient
+from borsdata.rate_limiter import TokenBucket
+
+METADATA_ROUTES = {
+    "countries": {"countries": [{"id": 1, "name": "Sverige"}, {"id": 2, "name": "Norge"}]},
+    "markets": {"markets": [{"id": 1, "name": "Large Cap"}, {"id": 2, "name": "Index"}]},
+    "sectors": {"sectors": [{"id": 1, "name": "Industri"}]},
+    "branches": {"branches": [{"id": 5, "name": "Maskiner"}]},
+    "instruments": {"instruments": [
+        {"insId": 3, "name": "ABB", "ticker": "ABB", "isin": "CH1", "instrument": 0, "marketId": 1,
+         "countryId": 1, "sectorId": 1, "branchId": 5, "listingDate": "1999-06-22T00:00:00"},
+        {"insId": 643, "name": "OMXSLCPI", "ticker": "OMXSLCPI", "isin": None, "instrument": 2, "marketId": 2,
+         "countryId": 1, "sectorId": None, "branchId": None, "listingDate": None}]},
+}
+
+
+@pytest.fixture
+def client(fake_transport, tmp_path, monkeypatch):
+    monkeypatch.setattr(constants, "EXPORT_PATH", f"{tmp_path}/")
+    api = BorsdataAPI("key", transport=fake_transport(METADATA_ROUTES), limiter=TokenBucket(1000, 1000))
+    return BorsdataClient(api)
+
+
+def test_instruments_with_meta_data(client, tmp_path):
+    instruments = client.instruments_with_meta_data()
+    expected = pd.DataFrame([
+        {"name": "ABB", "ins_id": 3, "ticker": "ABB", "isin": "CH1", "instrument_type": "Aktie",
+         "market": "Large Cap", "country": "Sverige", "sector": "Industri", "branch": "Maskiner"},
+        {"name": "OMXSLCPI", "ins_id": 643, "ticker": "OMXSLCPI", "isin": None, "instrument_type": "Index",
+         "market": "Index", "country": "Sverige", "sector": "N/A", "branch": "N/A"}])
+    pd.testing.assert_frame_equal(instruments, expected)
+    assert (tmp_path / "instrument_with_meta_data.csv").exists()
+
+
+def test_with_metadata_joins_on_instrument_id(client):
+    prices = pd.DataFrame({"stock_id": [643, 3, 3], "close": [1.0, 2.0, 3.0]})
+    joined = client.with_metadata(prices)
+    assert joined["market"].tolist() == ["Index", "Large Cap", "Large Cap"]
@@ -0,0 +1,49 @@
+from borsdata.borsdata_api import BorsdataAPI
+from borsdata.cache import ResponseCache, endpoint_template
+from borsdata.rate_limiter import TokenBucket
+
+
+def test_endpoint_template():
+    assert endpoint_template("instruments/3/kpis/2/year/mean/history") == "instruments/{id}/kpis/{id}/year/mean/history"
+    assert endpoint_template("instruments/kpis/metadata") == "instruments/kpis/metadata"
+
+
+def test_metadata_is_served_from_cache(fake_transport, tmp_path):
+    transport = fake_transport({"markets": {"markets": [{"id": 1, "name": "Large Cap"}]}})
+    cache = ResponseCache(tmp_path)
+    BorsdataAPI("key-1", transport=transport, cache=cache).get_markets()
+    markets = BorsdataAPI("key-2", transport=transport, cache=ResponseCache(tmp_path)).get_markets()
+    assert markets.loc[1, "name"] == "Large Cap"
+    assert len(transport.calls) == 1
+    assert cache.stats()["entries"] == 1
+
+
+def test_lru_eviction(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=25)
+    cache.put("markets", {}, b"x" * 10)
+    cache.put("sectors", {}, b"x" * 10)
+    cache.get("markets", {})
+    cache.put("branches", {}, b"x" * 10)
+    assert cache.get("sectors", {}) is None
+    assert cache.get("markets", {}) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_refresh_cache_drops_updated_instruments(fake_transport, tmp_path):
+    updated = {"instruments": [{"insId": 1, "updatedAt": "2024-01-01T10:00:00"},
+                               {"insId": 2, "updatedAt": "2024-01-01T10:00:00"}]}
+    routes = {"instruments/updated": lambda params: updated,
+              "instruments/kpis/updated": {"kpisCalcUpdated": "2024-01-01T06:00:00"},
+              "instruments/1/stockprices": {"stockPricesList": []},
+              "instruments/2/stockprices": {"stockPricesList": []}}
+    transport = fake_transport(routes)
+    api = BorsdataAPI("key", transport=transport, cache=ResponseCache(tmp_path), limiter=TokenBucket(1000, 1000))
+    assert api.refresh_cache() == [1, 2]
+    api.get_instrument_stock_prices(1)
+    api.get_instrument_stock_prices(2)
+    updated["instruments"][1]["updatedAt"] = "2024-01-02T10:00:00"
+    assert api.refresh_cache() == [2]
+    calls = len(transport.calls)
+    api.get_instrument_stock_prices(1)
+    api.get_instrument_stock_prices(2)
+    assert [url for url, params in transport.calls[calls:]] == ["https://apiservice.borsdata.se/v1/instruments/2/stockprices"]
@@ -0,0 +1,32 @@
+import pandas as pd
+
+from borsdata import decode
+from borsdata.borsdata_api import STOCK_PRICE_COLUMNS
+
+
+def _reference(records):
+    df = pd.json_normalize(records)
+    df.rename(columns=STOCK_PRICE_COLUMNS, inplace=True)
+    df["date"] = pd.to_datetime(df["date"])
+    df.set_index("date", inplace=True)
+    df.sort_index(inplace=True, ascending=False)
+    return df
+
+
+def test_decoded_prices_match_json_normalize():
+    records = [{"d": "2024-01-02", "c": 10.5, "h": 11.0, "l": 9.0, "o": 10, "v": 100},
+               {"d": "2024-01-03", "c": None, "h": 11.5, "l": 9.5, "o": 10.0, "v": None},
+               {"d": "2024-01-04", "c": 12.0, "h": 12.5, "l": 11.5, "o": 11.0, "v": 300}]
+    columns = decode.records_to_columns(records, STOCK_PRICE_COLUMNS)
+    df = decode.set_index(decode.columns_to_frame(columns, date_columns=["date"]), "date", ascending=False)
+    pd.testing.assert_frame_equal(df, _reference(records))
+
+
+def test_nested_records_repeat_meta():
+    items = [{"instrument": 1, "stockPricesList": [{"d": "2024-01-02", "c": 1.0}, {"d": "2024-01-03", "c": 2.0}]},
+             {"instrument": 2, "stockPricesList": []},
+             {"instrument": 3, "stockPricesList": [{"d": "2024-01-02", "c": None}]}]
+    columns = decode.nested_records_to_columns(items, "stockPricesList", "instrument")
+    df = decode.columns_to_frame(columns, fillna=0)
+    expected = pd.json_normalize(items, "stockPricesList", ["instrument"]).infer_objects().fillna(0)
+    pd.testing.assert_frame_equal(df, expected)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from borsdata import decode
+from borsdata.borsdata_api import BorsdataAPI
+from borsdata.rate_limiter import TokenBucket
+
+
+def _stock_prices_list(params):
+    return {"stockPricesArrayList": [{"instrument": int(ins_id), "stockPricesList": [
+        {"d": "2024-01-02", "c": 1.5, "h": 2.0, "l": 1.0, "o": 1.25, "v": 10},
+        {"d": "2024-01-03", "c": 1.5, "h": 2.0, "l": 1.0, "o": 1.25, "v": None}]} for ins_id in params["instList"].split(",")]}
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_compact_stock_prices_list(fake_transport, stream):
+    api = BorsdataAPI("key", transport=fake_transport({"instruments/stockprices": _stock_prices_list}),
+                      limiter=TokenBucket(1000, 1000), dtype_policy="compact")
+    stock_prices = api.get_instrument_stock_prices_list([1, 2], stream=stream)
+    assert stock_prices.dtypes.astype(str).to_dict() == {
+        "date": "datetime64[ns]", "close": "float32", "high": "float32", "low": "float32", "open": "float32",
+        "volume": "uint32", "stock_id": "int32"}
+    assert stock_prices["volume"].tolist() == [10, 0, 10, 0]
+
+
+def test_compact_kpi_values(fake_transport):
+    routes = {"instruments/kpis/2/1year/latest": {"values": [{"i": 3, "n": 12.5, "s": None}, {"i": 4, "n": None, "s": "A"}]}}
+    api = BorsdataAPI("key", transport=fake_transport(routes), limiter=TokenBucket(1000, 1000), dtype_policy="compact")
+    kpis = api.get_kpi_data_all_instruments(2, "1year", "latest")
+    assert str(kpis.index.dtype) == "int32"
+    assert str(kpis["valueNum"].dtype) == "float32"
+    assert str(kpis["valueStr"].dtype) == "category"
+
+
+def test_unknown_dtype_policy():
+    with pytest.raises(ValueError):
+        BorsdataAPI("key", dtype_policy="tiny")
+
+
+def test_compact_volumes_that_do_not_fit_uint32(fake_transport):
+    volumes = {1: [10, 2 ** 32 + 5], 2: [10, -3], 3: [10, 2.5]}
+
+    def stock_prices_list(params):
+        return {"stockPricesArrayList": [{"instrument": int(ins_id), "stockPricesList": [
+            {"d": "2024-01-02", "c": 1.5, "h": 2.0, "l": 1.0, "o": 1.25, "v": volumes[int(ins_id)][0]},
+            {"d": "2024-01-03", "c": 1.5, "h": 2.0, "l": 1.0, "o": 1.25, "v": volumes[int(ins_id)][1]}]}
+            for ins_id in params["instList"].split(",")]}
+
+    api = BorsdataAPI("key", transport=fake_transport({"instruments/stockprices": stock_prices_list}),
+                      limiter=TokenBucket(1000, 1000), dtype_policy="compact")
+    # widened or kept as they are, never wrapped or truncated
+    expected = {1: ("int64", 2 ** 32 + 5), 2: ("int64", -3), 3: ("float64", 2.5)}
+    for ins_id, (dtype, volume) in expected.items():
+        for stream in [False, True]:
+            stock_prices = api.get_instrument_stock_prices_list([ins_id], stream=stream)
+            assert str(stock_prices["volume"].dtype) == dtype
+            assert stock_prices["volume"].tolist() == [10, volume]
+
+    assert str(decode.to_array(np.array([1.0, 2.0]), "uint32").dtype) == "uint32"
+    assert decode.to_array([2 ** 40], "uint32").tolist() == [2 ** 40]
@@ -0,0 +1,101 @@
+import os
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from borsdata import constants
+from borsdata.borsdata_api import BorsdataAPI
+from borsdata.excel_exporter import ExcelExporter
+from borsdata.rate_limiter import TokenBucket
+
+ROUTES = {
+    "countries": {"countries": [{"id": 1, "name": "Sverige"}]},
+    "markets": {"markets": [{"id": 1, "name": "Large Cap"}]},
+    "instruments": {"instruments": [
+        {"insId": ins_id, "name": f"Bolag {ins_id}", "marketId": 1, "countryId": 1, "listingDate": None}
+        for ins_id in (1, 2, 3)]},
+    "instruments/stockprices": lambda params: {"stockPricesArrayList": [
+        {"instrument": int(ins_id), "stockPricesList": [{"d": "2024-01-02", "c": 1.5, "h": 2.0, "l": 1.0, "o": 1.0, "v": 5},
+                                                        {"d": "2024-01-03", "c": 2.5, "h": 2.0, "l": 1.0, "o": 1.0, "v": 6}]}
+        for ins_id in params["instList"].split(",")]},
+    "instruments/reports": lambda params: {"reportList": [
+        {"instrument": int(ins_id), "reportsQuarter": [{"year": 2023, "period": 4, "revenues": 10.0}],
+         "reportsYear": [], "reportsR12": []}
+        for ins_id in params["instList"].split(",")]},
+}
+
+PRICES = [{"d": "2024-01-02", "c": 1.5, "h": None, "l": 1.0, "o": 1.0, "v": 5},
+          {"d": "2024-01-03", "c": 2.5, "h": 2.0, "l": 1.0, "o": None, "v": None}]
+REPORTS = {"reportsQuarter": [{"year": 2023, "period": 3, "revenues": None, "earnings_Per_Share": 1.5,
+                               "report_Date": "2023-10-20T00:00:00"},
+                              {"year": 2023, "period": 4, "revenues": 10.0, "earnings_Per_Share": None,
+                               "report_Date": None}],
+           "reportsYear": [{"year": 2023, "period": 5, "revenues": 12.0, "earnings_Per_Share": 2.0,
+                            "report_Date": "2024-02-10T00:00:00"}],
+           "reportsR12": []}
+
+
+@pytest.fixture
+def exporter(fake_transport, tmp_path, monkeypatch):
+    monkeypatch.setattr(constants, "EXPORT_PATH", f"{tmp_path}/")
+    api = BorsdataAPI("key", transport=fake_transport(ROUTES), limiter=TokenBucket(1000, 1000))
+    return ExcelExporter(api)
+
+
+def _workbooks(tmp_path):
+    return sorted(name for _, _, names in os.walk(tmp_path) for name in names if name.endswith(".xlsx"))
+
+
+def test_create_excel_files_with_writer_pool(exporter, tmp_path):
+    exporter.create_excel_files(workers=2)
+    assert _workbooks(tmp_path) == ["bolag_1.xlsx", "bolag_2.xlsx", "bolag_3.xlsx"]
+    path = next(tmp_path.glob("*/sverige/large_cap/bolag_2.xlsx"))
+    workbook = openpyxl.load_workbook(path)
+    assert workbook.sheetnames == ["stock_prices", "reports_quarter", "reports_year", "reports_r12"]
+    rows = list(workbook["stock_prices"].values)
+    assert rows[0] == ("date", "close", "high", "low", "open", "volume")
+    assert [row[1] for row in rows[1:]] == [2.5, 1.5]
+    assert list(workbook["reports_quarter"].values)[1][:3] == (2023, 4, 10.0)
+    assert not (tmp_path / "excel_export.journal").exists()
+
+
+def test_create_excel_files_resumes_from_journal(exporter, tmp_path):
+    # an export of 2023-12-29 that stopped after instrument 1, with a cut off line
+    (tmp_path / "excel_export.journal").write_text("date 2023-12-29\n1\n2")
+    exporter.create_excel_files(workers=0)
+    assert sorted(path.name for path in (tmp_path / "2023-12-29/sverige/large_cap").iterdir()) == \
+        ["bolag_2.xlsx", "bolag_3.xlsx"]
+    assert not (tmp_path / "excel_export.journal").exists()
+
+
+def test_sheets_match_the_single_instrument_calls(fake_transport, tmp_path, monkeypatch):
+    # the export was made from get_instrument_stock_prices and get_instrument_reports, the batched
+    # calls must give the same sheets: missing values kept, the same column names
+    monkeypatch.setattr(constants, "EXPORT_PATH", f"{tmp_path}/")
+    routes = dict(ROUTES)
+    routes["instruments/stockprices"] = lambda params: {"stockPricesArrayList": [
+        {"instrument": int(ins_id), "stockPricesList": PRICES} for ins_id in params["instList"].split(",")]}
+    routes["instruments/reports"] = lambda params: {"reportList": [
+        {"instrument": int(ins_id), **REPORTS} for ins_id in params["instList"].split(",")]}
+    routes["instruments/2/stockprices"] = {"stockPricesList": PRICES}
+    routes["instruments/2/reports"] = REPORTS
+    api = BorsdataAPI("key", transport=fake_transport(routes), limiter=TokenBucket(1000, 1000))
+    expected = [api.get_instrument_stock_prices(2), *api.get_instrument_reports(2)]
+    _, _, sheets = next(task for task in ExcelExporter(api)._fetch_batch([1, 2], "2024-01-31") if task[0] == 2)
+    for (_, sheet), frame in zip(sheets, expected):
+        if len(frame):
+            pd.testing.assert_frame_equal(sheet, frame, check_dtype=False)
+        else:
+            assert len(sheet) == 0
+    for streamed, report_frame in zip(api.get_instrument_report_list([1, 2], stream=True, fillna=None, lowercase=False),
+                                      api.get_instrument_report_list([1, 2], fillna=None, lowercase=False)):
+        if len(report_frame):
+            pd.testing.assert_frame_equal(streamed, report_frame, check_dtype=False)
+
+    ExcelExporter(api).create_excel_files(workers=0)
+    workbook = openpyxl.load_workbook(next(tmp_path.glob("*/sverige/large_cap/bolag_2.xlsx")))
+    rows = list(workbook["stock_prices"].values)
+    assert rows[1][:6] == (pd.Timestamp("2024-01-03"), 2.5, 2.0, 1.0, None, None)
+    assert list(workbook["reports_quarter"].values)[0] == ("year", "period", "revenues", "earningsPerShare",
+                                                           "reportDate")
@@ -0,0 +1,44 @@
+import json
+
+from conftest import make_response
+from borsdata.borsdata_api import BorsdataAPI
+from borsdata.cache import ResponseCache
+from borsdata.metrics import Metrics
+from borsdata.rate_limiter import TokenBucket
+from borsdata.singleflight import SingleFlight
+
+
+def _prices(params):
+    return {"stockPricesList": [{"d": "2024-01-02", "c": 10.0, "h": 11.0, "l": 9.0, "o": 9.5, "v": 100}]}
+
+
+def test_latency_histogram_and_hooks():
+    metrics = Metrics(latency_buckets=(0.1, 1, float("inf")))
+    spans = []
+    metrics.add_hook(lambda name, endpoint, start, duration, attributes: spans.append((name, endpoint, attributes)))
+    metrics.record("request", "instruments", 0.5, status=200, bytes=10)
+    metrics.record("request", "instruments", 2.0, status=500, bytes=0)
+    with metrics.span("decode", "instruments"):
+        pass
+    snapshot = metrics.snapshot()["instruments"]
+    assert snapshot["requests"] == 2 and snapshot["errors"] == 1 and snapshot["bytes"] == 10
+    assert snapshot["latency_histogram"] == {"0.1": 0, "1": 1, "inf": 1}
+    assert snapshot["decode_seconds"] > 0
+    assert [span[0] for span in spans] == ["request", "request", "decode"]
+    json.dumps(metrics.snapshot())
+
+
+def test_api_records_per_endpoint_metrics(fake_transport, tmp_path):
+    responses = [make_response(503), make_response(200, _prices({}))]
+    transport = fake_transport({"instruments/3/stockprices": lambda params: responses.pop(0)})
+    cache = ResponseCache(str(tmp_path))
+    api = BorsdataAPI("key", transport=transport, limiter=TokenBucket(1000, 1000), cache=cache,
+                      single_flight=SingleFlight())
+    api.get_instrument_stock_prices(3)
+    api.get_instrument_stock_prices(3)
+    metrics = api.metrics.snapshot()["instruments/{id}/stockprices"]
+    assert metrics["requests"] == 2 and metrics["errors"] == 1 and metrics["retries"] == 1
+    assert metrics["cache_hits"] == 1
+    assert metrics["bytes"] == len(b"null") + len(json.dumps(_prices({})))
+    assert metrics["frame_seconds"] > 0 and metrics["decode_seconds"] > 0
+    assert api.metrics.to_frame().loc["instruments/{id}/stockprices", "requests"] == 2
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from borsdata.ohlcv_cube import OHLCVCube
+from borsdata.price_store import PriceStore
+
+
+def _prices(days, close):
+    index = pd.DatetimeIndex(days, name="date")
+    return pd.DataFrame({"close": close, "high": close, "low": close, "open": close,
+                         "volume": [100] * len(days)}, index=index)
+
+
+def test_cube_appends_new_days_only(tmp_path):
+    store = PriceStore(str(tmp_path / "store"))
+    store.write_prices(3, _prices(["2024-01-02", "2024-01-03", "2024-01-04"], [10.0, 11.0, 12.0]))
+    store.write_prices(7, _prices(["2024-01-03", "2024-01-04"], [20.0, 21.0]))
+    path = str(tmp_path / "cube")
+    cube = store.write_cube(path)
+
+    panel = cube.panel()
+    assert panel.ins_ids.tolist() == [3, 7]
+    np.testing.assert_array_equal(panel["close"], [[10.0, np.nan], [11.0, 20.0], [12.0, 21.0]])
+    assert isinstance(cube["close"], np.memmap)
+    assert np.shares_memory(cube.panel(start="2024-01-03")["close"], cube["close"])
+    selected = cube.panel([7, 99], end="2024-01-03")
+    assert selected.ins_ids.tolist() == [7]
+    np.testing.assert_array_equal(selected["close"], [[np.nan], [20.0]])
+
+    size = os.path.getsize(os.path.join(path, "close.1.f8"))
+    store.write_prices(3, _prices(["2024-01-05"], [13.0]), append=True)
+    cube = cube.update(store)
+    # one row of two float64 values appended
+    assert os.path.getsize(os.path.join(path, "close.1.f8")) == size + 2 * 8
+    reopened = OHLCVCube(path)
+    assert reopened.dates[-1] == np.datetime64("2024-01-05")
+    np.testing.assert_array_equal(reopened["close"][-1], [13.0, np.nan])
+
+    # a lagging instrument's days the cube already covers are written into their slots
+    store.write_prices(7, _prices(["2024-01-05"], [22.0]), append=True)
+    cube = cube.update(store)
+    np.testing.assert_array_equal(cube["close"][-1], [13.0, 22.0])
+    assert cube.meta["last_dates"] == {"3": "2024-01-05", "7": "2024-01-05"}
+    assert os.path.getsize(os.path.join(path, "close.1.f8")) == size + 2 * 8
+
+    # a new instrument rebuilds the cube as a new generation, open readers keep theirs
+    store.write_prices(9, _prices(["2024-01-04"], [30.0]))
+    rebuilt = cube.update(store)
+    assert rebuilt.meta["generation"] == 2
+    np.testing.assert_array_equal(rebuilt["close"][:, 2], [np.nan, np.nan, 30.0, np.nan])
+    assert cube["close"].shape == (4, 2)
+
+    # a history refetched after a split rebuilds the cube with the refetched rows
+    store.write_prices(7, _prices(["2024-01-03", "2024-01-04"], [10.0, 10.5]), splits=["2024-01-04"])
+    rebuilt = rebuilt.update(store)
+    assert rebuilt.meta["generation"] == 3
+    np.testing.assert_array_equal(rebuilt["close"][1:3, 1], [10.0, 10.5])
+
+
+def test_late_days_of_a_lagging_instrument_are_backfilled(tmp_path):
+    store = PriceStore(str(tmp_path / "store"))
+    store.write_prices(3, _prices(["2024-01-02", "2024-01-03", "2024-01-05"], [10.0, 11.0, 12.0]))
+    store.write_prices(7, _prices(["2024-01-02"], [5.0]))
+    cube = store.write_cube(str(tmp_path / "cube"))
+    store.write_prices(7, _prices(["2024-01-03"], [6.0]), append=True)
+    cube = cube.update(store)
+    np.testing.assert_array_equal(cube["close"][:, 1], [5.0, 6.0, np.nan])
+    assert OHLCVCube(str(tmp_path / "cube")).meta["last_dates"]["7"] == "2024-01-03"
+
+    # a late day the calendar does not have yet rebuilds the cube
+    store.write_prices(7, _prices(["2024-01-04", "2024-01-08"], [7.0, 7.5]), append=True)
+    cube = cube.update(store)
+    assert cube.meta["generation"] == 2
+    assert [str(date) for date in cube.dates] == ["2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05",
+                                                  "2024-01-08"]
+    np.testing.assert_array_equal(cube["close"][:, 1], [5.0, 6.0, 7.0, np.nan, 7.5])
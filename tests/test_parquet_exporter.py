@@ -0,0 +1,54 @@
+import pytest
+
+from borsdata.borsdata_api import BorsdataAPI
+from borsdata.rate_limiter import TokenBucket
+
+pytest.importorskip("pyarrow")
+from borsdata.parquet_exporter import ParquetExporter, read_dataset  # noqa: E402
+
+PRICES = {1: [{"d": "2023-12-29", "c": 1.0, "h": 1.0, "l": 1.0, "o": 1.0, "v": 5},
+              {"d": "2024-01-02", "c": 2.0, "h": 2.0, "l": 2.0, "o": 2.0, "v": 6}],
+          2: [{"d": "2024-01-02", "c": 3, "h": 3, "l": 3, "o": 3, "v": 7}]}
+REPORTS = {1: [{"year": 2023, "period": 3, "revenues": 10.0, "report_Date": "2023-10-20T00:00:00"}],
+           2: [{"year": 2023, "period": 3, "revenues": 20, "report_Date": None}]}
+
+
+def _routes():
+    return {
+        "countries": {"countries": [{"id": 1, "name": "Sverige"}, {"id": 2, "name": "Norge"}]},
+        "markets": {"markets": [{"id": 1, "name": "Large Cap"}]},
+        "instruments": {"instruments": [{"insId": 1, "name": "A", "marketId": 1, "countryId": 1},
+                                        {"insId": 2, "name": "B", "marketId": 1, "countryId": 2}]},
+        "instruments/stockprices": lambda params: {"stockPricesArrayList": [
+            {"instrument": int(ins_id), "stockPricesList": [price for price in PRICES[int(ins_id)]
+                                                            if price["d"] >= params.get("from", "")]}
+            for ins_id in params["instList"].split(",")]},
+        "instruments/reports": lambda params: {"reportList": [
+            {"instrument": int(ins_id), "reportsQuarter": REPORTS[int(ins_id)], "reportsYear": [], "reportsR12": []}
+            for ins_id in params["instList"].split(",")]},
+    }
+
+
+def test_export_appends_new_rows_only(fake_transport, tmp_path):
+    transport = fake_transport(_routes())
+    api = BorsdataAPI("key", transport=transport, limiter=TokenBucket(1000, 1000))
+    exporter = ParquetExporter(tmp_path, api)
+    assert exporter.export() == {"stock_prices": 3, "reports_quarter": 2, "reports_year": 0, "reports_r12": 0}
+    assert (tmp_path / "stock_prices/country=Sverige/market=Large%20Cap/year=2023").is_dir()
+
+    PRICES[2].append({"d": "2024-01-03", "c": 4.5, "h": 4, "l": 4, "o": 4, "v": 8})
+    REPORTS[2].append({"year": 2023, "period": 4, "revenues": 30.0, "report_Date": "2024-02-01T00:00:00"})
+    try:
+        written = ParquetExporter(tmp_path, api).export()
+    finally:
+        PRICES[2].pop()
+        REPORTS[2].pop()
+    assert written["stock_prices"] == 1 and written["reports_quarter"] == 1
+    assert transport.calls[-2][1]["from"] == "2024-01-03"
+
+    prices = read_dataset(tmp_path, columns=["stock_id", "date", "close"], filters=[("country", "=", "Norge")])
+    assert prices.sort_values("date")["close"].tolist() == [3.0, 4.5]
+    reports = read_dataset(tmp_path, "reports_quarter", filters=[("year", "=", 2023)])
+    assert sorted(reports["revenues"].tolist()) == [10.0, 20.0, 30.0]
+    assert reports["report_date"].isna().sum() == 1
+    assert read_dataset(tmp_path, "instruments")["country"].tolist() == ["Sverige", "Norge"]
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from borsdata.price_panel import PricePanel
+
+
+def _long_frame():
+    rng = np.random.default_rng(1)
+    dates = pd.bdate_range("2024-01-01", periods=60)
+    frames = [pd.DataFrame({"date": dates, "stock_id": 1, "close": rng.uniform(90, 110, 60)}),
+              # listed later and missing one day
+              pd.DataFrame({"date": dates[10:].delete(20), "stock_id": 2, "close": rng.uniform(40, 60, 49)})]
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_rolling_mean_and_returns_match_pandas():
+    long_frame = _long_frame()
+    panel = PricePanel.from_long_frame(long_frame)
+    for ins_id, column in [(1, 0), (2, 1)]:
+        close = long_frame[long_frame["stock_id"] == ins_id].set_index("date")["close"]
+        close = close.reindex(pd.DatetimeIndex(panel.dates))
+        np.testing.assert_allclose(panel.rolling_mean(10)[:, column], close.rolling(10).mean(), equal_nan=True)
+        np.testing.assert_allclose(panel.returns(5)[:, column], close.pct_change(5, fill_method=None), equal_nan=True)
+
+
+def test_fill_gaps_and_breadth():
+    panel = PricePanel.from_long_frame(_long_frame()).fill_gaps()
+    assert np.isnan(panel["close"][:10, 1]).all()
+    assert not np.isnan(panel["close"][10:]).any()
+    breadth = panel.above_ma_count(5)
+    expected = (panel.frame() > panel.frame().rolling(5).mean()).sum(axis=1)
+    assert breadth.tolist() == expected.tolist()
+    assert panel.last(panel.returns(1)).index.tolist() == [1, 2]
+
+
+def test_empty_panel_and_missing_prices():
+    empty = PricePanel(np.array([], dtype="datetime64[ns]"), np.array([], dtype=np.int64),
+                       {"close": np.empty((0, 0))})
+    assert len(empty.fill_gaps().last(empty.returns(1))) == 0
+    # closes the API wrapper filled with 0 are gaps
+    long_frame = pd.DataFrame({"date": pd.bdate_range("2024-01-01", periods=3), "stock_id": 1,
+                               "close": [10.0, 0.0, 11.0], "volume": [5, 0, 6]})
+    panel = PricePanel.from_long_frame(long_frame).fill_gaps()
+    assert panel["close"][:, 0].tolist() == [10.0, 10.0, 11.0]
+    assert panel["volume"][:, 0].tolist() == [5.0, 0.0, 6.0]
+    assert panel.last(panel.returns(1)).round(2).tolist() == [0.1]
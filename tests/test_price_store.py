@@ -0,0 +1,29 @@
+from borsdata.borsdata_api import BorsdataAPI
+from borsdata.price_store import PriceStore
+from borsdata.rate_limiter import TokenBucket
+
+DAYS = ["2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05"]
+
+
+def _prices(params):
+    days = [day for day in DAYS if day >= params.get("from", "")]
+    return {"stockPricesList": [{"d": day, "c": 10.0 + i, "h": 11.0, "l": 9.0, "o": 10.0, "v": 100} for i, day in enumerate(days)]}
+
+
+def test_sync_prices_fetches_only_new_days(fake_transport, tmp_path):
+    splits = {"stockSplitList": []}
+    transport = fake_transport({"instruments/3/stockprices": _prices, "instruments/stocksplits": lambda params: splits})
+    api = BorsdataAPI("key", transport=transport, limiter=TokenBucket(1000, 1000))
+    store = PriceStore(tmp_path, api)
+    DAYS.pop()
+    assert store.sync_prices([3]) == {3: 3}
+    DAYS.append("2024-01-05")
+    assert store.sync_prices([3]) == {3: 1}
+    assert transport.calls[-1][1]["from"] == "2024-01-05"
+    assert PriceStore(tmp_path).last_date(3) == "2024-01-05"
+    assert list(store.read_prices(3).index.strftime("%Y-%m-%d")) == DAYS[::-1]
+
+    splits["stockSplitList"].append({"instrumentId": 3, "splitType": "Split", "ratio": "2:1", "splitDate": "2024-01-04"})
+    assert store.sync_prices([3]) == {3: 4}
+    assert "from" not in transport.calls[-1][1]
+    assert store.splits(3) == ["2024-01-04"]
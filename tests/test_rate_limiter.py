@@ -0,0 +1,50 @@
+import threading
+
+from borsdata.borsdata_api import BorsdataAPI
+from borsdata.rate_limiter import TokenBucket
+from conftest import make_response
+
+
+def test_token_bucket_burst_then_rate():
+    bucket = TokenBucket(rate=100, capacity=5)
+    waits = [bucket.reserve() for _ in range(7)]
+    assert waits[:5] == [0] * 5
+    assert 0.005 < waits[5] < waits[6] <= 0.021
+
+
+def test_token_bucket_is_thread_safe():
+    bucket = TokenBucket(rate=0.001, capacity=1000)
+    threads = [threading.Thread(target=lambda: [bucket.reserve() for _ in range(100)]) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert abs(bucket._tokens) < 0.01
+
+
+def test_pause_blocks_all_callers():
+    bucket = TokenBucket(rate=100, capacity=10)
+    bucket.pause(0.5)
+    assert 0.45 < bucket.reserve() <= 0.52
+
+
+def test_call_api_honours_retry_after(fake_transport):
+    responses = [make_response(429, headers={"Retry-After": "0.2"}),
+                 make_response(200, {"countries": [{"id": 1, "name": "Sverige"}]})]
+    transport = fake_transport({"countries": lambda params: responses.pop(0)})
+    limiter = TokenBucket(rate=100, capacity=10)
+    api = BorsdataAPI("key", transport=transport, limiter=limiter)
+    countries = api.get_countries()
+    assert countries.loc[1, "name"] == "Sverige"
+    assert len(transport.calls) == 2
+
+
+def test_failed_streamed_responses_are_closed_before_retrying(fake_transport):
+    payload = {"stockPricesArrayList": [{"instrument": 3, "stockPricesList": [
+        {"d": "2024-01-02", "c": 1.0, "h": 1.0, "l": 1.0, "o": 1.0, "v": 10}]}]}
+    responses = [make_response(503), make_response(429, headers={"Retry-After": "0.01"}), make_response(200, payload)]
+    transport = fake_transport({"instruments/stockprices": lambda params: responses.pop(0)})
+    api = BorsdataAPI("key", transport=transport, limiter=TokenBucket(rate=100, capacity=10))
+    assert len(api.get_instrument_stock_prices_list([3], stream=True)) == 1
+    # the two failed responses before their retries, the streamed one once it is read
+    assert len(transport.calls) == 3 and transport.responses_closed == 3
@@ -0,0 +1,51 @@
+import json
+
+import pandas as pd
+
+from borsdata.borsdata_api import BorsdataAPI
+from borsdata.mock_server import MockBorsdataServer
+from borsdata.rate_limiter import TokenBucket
+from borsdata.replay import RecordingTransport, ReplayTransport
+from borsdata.transport import HttpTransport
+
+
+def test_record_and_replay(tmp_path):
+    with MockBorsdataServer(universe_size=10) as server:
+        recording = RecordingTransport(str(tmp_path), HttpTransport())
+        api = BorsdataAPI("secret-key", transport=recording, url_root=server.url_root, limiter=TokenBucket(1000, 1000))
+        prices = api.get_instrument_stock_prices(3, from_date="2024-01-01")
+        reports = api.get_instrument_report_list([1, 2, 3], stream=True)
+        api.close()
+    fixtures = list(tmp_path.iterdir())
+    assert len(fixtures) == 2
+    assert not any("secret-key" in fixture.read_text() for fixture in fixtures)
+
+    replay = BorsdataAPI("other-key", transport=ReplayTransport(str(tmp_path)), limiter=TokenBucket(1000, 1000))
+    pd.testing.assert_frame_equal(replay.get_instrument_stock_prices(3, from_date="2024-01-01"), prices)
+    for replayed, recorded in zip(replay.get_instrument_report_list([1, 2, 3], stream=True), reports):
+        pd.testing.assert_frame_equal(replayed, recorded)
+
+    # the server answers from the fixtures, too
+    with MockBorsdataServer(fixtures=str(tmp_path), universe_size=0) as server:
+        api = BorsdataAPI("key", url_root=server.url_root, limiter=TokenBucket(1000, 1000))
+        pd.testing.assert_frame_equal(api.get_instrument_stock_prices(3, from_date="2024-01-01"), prices)
+        with HttpTransport() as transport:
+            # not recorded, and not in the synthetic universe either
+            assert transport.get(server.url_root + "instruments/3/stockprices", {"authKey": "key"}).status_code == 404
+
+
+def test_mock_server_is_deterministic_and_throttles():
+    with MockBorsdataServer(universe_size=20, seed=1, rate_limit=(2, 10)) as server:
+        transport = HttpTransport()
+        params = {"authKey": "key", "instList": "1,2"}
+        first = transport.get(server.url_root + "instruments/stockprices", params)
+        assert first.status_code == 200
+        assert transport.get(server.url_root + "instruments/stockprices", params).content == first.content
+        throttled = transport.get(server.url_root + "instruments/stockprices", params)
+        assert throttled.status_code == 429 and 0 < int(throttled.headers["Retry-After"]) <= 10
+        # other keys have their own quota
+        assert transport.get(server.url_root + "countries", {"authKey": "other"}).status_code == 200
+        assert server.throttled == 1
+        transport.close()
+    prices = json.loads(first.content)["stockPricesArrayList"]
+    assert [item["instrument"] for item in prices] == [1, 2]
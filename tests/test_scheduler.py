@@ -0,0 +1,52 @@
+import json
+
+from borsdata.borsdata_api import BorsdataAPI
+from borsdata.mock_server import MockBorsdataServer
+from borsdata.rate_limiter import TokenBucket
+from borsdata.scheduler import RefreshScheduler
+from borsdata.transport import HttpTransport
+from borsdata.warehouse import Warehouse
+
+
+class LoggingTransport(HttpTransport):
+    def __init__(self):
+        super().__init__()
+        self.paths = []
+
+    def get(self, url, params=None, stream=False):
+        self.paths.append(url.split("/v1/", 1)[-1])
+        return super().get(url, params=params, stream=stream)
+
+
+def test_refresh_only_what_changed(tmp_path):
+    watermarks = tmp_path / "watermarks.json"
+    with MockBorsdataServer(universe_size=20) as server:
+        transport = LoggingTransport()
+        api = BorsdataAPI("key", transport=transport, url_root=server.url_root, limiter=TokenBucket(1000, 1000))
+        warehouse = Warehouse(str(tmp_path), api)
+
+        def scheduler():
+            return RefreshScheduler(api, warehouse, str(watermarks), ins_ids=[1, 2, 3],
+                                    kpi_history=[(2, "year", "mean")], kpi_values=[(2, "1year", "latest")], workers=1)
+
+        progress = scheduler().run()
+        assert progress["done"] == 5 and progress["failed"] == 0 and progress["rows"] > 0
+        # prices before reports before KPIs before metadata
+        kinds = [path.split("?")[0] for path in transport.paths[2:]]
+        assert kinds[0] == "instruments/stockprices" and kinds[1] == "instruments/reports"
+        assert kinds[-1] == "instruments"
+        saved = json.loads(watermarks.read_text())
+        assert sorted(saved["instruments"]) == ["1", "2", "3"] and saved["kpis_calc_updated"]
+
+        # nothing changed since
+        assert scheduler().plan() == 0
+
+        # a new updatedAt of one instrument refetches its reports and KPI history only
+        saved["instruments"]["2"] = "2000-01-01T00:00:00"
+        watermarks.write_text(json.dumps(saved))
+        transport.paths.clear()
+        progress = scheduler().run()
+        assert progress["tasks"]["reports"]["done"] == 1 and progress["tasks"]["kpi_history"]["done"] == 1
+        assert progress["done"] == 2
+        assert json.loads(watermarks.read_text()) != saved
+        warehouse.close()
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from borsdata.borsdata_api import BorsdataAPI
+from borsdata.borsdata_api_async import AsyncBorsdataAPI
+from borsdata.rate_limiter import TokenBucket
+from borsdata.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_flight():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def call():
+        calls.append(1)
+        release.wait(5)
+        return {"value": 1}
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(single_flight.do, "key", call) for _ in range(4)]
+        while single_flight.stats()["saved"] < 3:
+            time.sleep(0.001)
+        release.set()
+        results = [future.result() for future in futures]
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert single_flight.stats() == {"calls": 1, "saved": 3, "in_flight": 0}
+    # a later call is a new flight
+    assert single_flight.do("key", lambda: 2) == 2
+
+
+def test_errors_are_shared_and_not_kept():
+    single_flight = SingleFlight()
+    with pytest.raises(ValueError):
+        single_flight.do("key", lambda: int("x"))
+    assert single_flight.do("key", lambda: 3) == 3
+
+
+def _slow_instruments(params):
+    time.sleep(0.1)
+    return {"instruments": [{"insId": 3, "name": "ABB"}]}
+
+
+def test_identical_api_calls_are_coalesced(fake_transport):
+    transport = fake_transport({"instruments": _slow_instruments})
+    single_flight = SingleFlight()
+    apis = [BorsdataAPI("key", transport=transport, limiter=TokenBucket(1000, 1000), single_flight=single_flight)
+            for _ in range(2)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        instruments = list(executor.map(lambda i: apis[i % 2].get_instruments(), range(4)))
+    assert len(transport.calls) == 1
+    assert all(df["name"].tolist() == ["ABB"] for df in instruments)
+    assert apis[0].single_flight_stats()["saved"] == 3
+
+
+def test_async_calls_are_coalesced(fake_transport):
+    transport = fake_transport({"instruments": _slow_instruments})
+
+    async def run():
+        async with AsyncBorsdataAPI("key", transport=transport, limiter=TokenBucket(1000, 1000),
+                                    single_flight=SingleFlight()) as api:
+            return await asyncio.gather(*[api.get_instruments() for _ in range(3)])
+
+    assert len(asyncio.run(run())) == 3
+    assert len(transport.calls) == 1
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+from borsdata.borsdata_api import BorsdataAPI
+from borsdata.price_panel import PricePanel
+from borsdata.price_store import PriceStore
+from borsdata.rate_limiter import TokenBucket
+from borsdata.splits import SplitAdjuster, split_factor
+
+
+def _prices(ins_id, dates, close):
+    return pd.DataFrame({"stock_id": ins_id, "date": pd.to_datetime(dates), "open": close, "high": close,
+                         "low": close, "close": close, "volume": [100] * len(dates)})
+
+
+def test_split_factor():
+    assert split_factor("2:1") == 2.0
+    assert split_factor("1:10") == 0.1
+    with pytest.raises(ValueError):
+        split_factor("0:1")
+
+
+def test_adjust_prices_before_splits():
+    adjuster = SplitAdjuster(splits={3: [("2024-01-03", "2:1"), ("2024-01-05", "3:1")]})
+    dates = ["2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05"]
+    stock_prices = _prices(3, dates, [120.0, 60.0, 60.0, 20.0]).set_index("date").sort_index(ascending=False)
+    adjusted = adjuster.adjust(stock_prices, 3)
+    assert adjusted["close"].tolist() == [20.0, 20.0, 20.0, 20.0]
+    assert adjusted["volume"].tolist() == [100, 300, 300, 600]
+    assert adjusted["volume"].dtype == stock_prices["volume"].dtype
+
+    long_frame = pd.concat([_prices(3, dates, [120.0, 60.0, 60.0, 20.0]), _prices(4, dates, [1.0, 2.0, 3.0, 4.0])])
+    adjusted = adjuster.adjust(long_frame)
+    assert adjusted["close"].tolist() == [20.0] * 4 + [1.0, 2.0, 3.0, 4.0]
+
+    panel = adjuster.adjust_panel(PricePanel.from_long_frame(long_frame))
+    assert panel["close"][:, 0].tolist() == [20.0] * 4
+    assert panel["volume"][:, 1].tolist() == [100.0] * 4
+
+
+def test_refresh_adds_new_splits_only(fake_transport):
+    splits = [{"instrumentId": 3, "splitType": "Split", "ratio": "2:1", "splitDate": "2024-01-03T00:00:00"}]
+    transport = fake_transport({"instruments/stocksplits": lambda params: {"stockSplitList": splits}})
+    adjuster = SplitAdjuster(BorsdataAPI("key", transport=transport, limiter=TokenBucket(1000, 1000)))
+    assert adjuster.refresh() == [3]
+    assert adjuster.refresh() == []
+    # the API lists recent splits, earlier ones are kept
+    splits[0] = {"instrumentId": 3, "splitType": "Split", "ratio": "1:2", "splitDate": "2024-02-01T00:00:00"}
+    assert adjuster.refresh() == [3]
+    factors = adjuster.factors(3, np.array(["2024-01-02", "2024-01-10", "2024-02-01"], dtype="datetime64[ns]"))
+    assert factors.tolist() == [1.0, 0.5, 1.0]
+
+
+def test_split_through_store_cube_and_adjuster(fake_transport, tmp_path):
+    # the API prices as traded, a 2:1 split on 2024-01-04 halves the price
+    days = {"2024-01-02": 100.0, "2024-01-03": 102.0}
+    splits = []
+
+    def stock_prices(params):
+        return {"stockPricesList": [{"d": day, "c": close, "h": close, "l": close, "o": close, "v": 100}
+                                    for day, close in days.items() if day >= params.get("from", "")]}
+
+    transport = fake_transport({"instruments/3/stockprices": stock_prices,
+                                "instruments/stocksplits": lambda params: {"stockSplitList": splits}})
+    api = BorsdataAPI("key", transport=transport, limiter=TokenBucket(1000, 1000))
+    store = PriceStore(str(tmp_path / "store"), api)
+    store.sync_prices([3])
+    cube = store.write_cube(str(tmp_path / "cube"))
+
+    days.update({"2024-01-04": 52.0, "2024-01-05": 53.0})
+    splits.append({"instrumentId": 3, "splitType": "Split", "ratio": "2:1", "splitDate": "2024-01-04T00:00:00"})
+    store.sync_prices([3])
+    # the store and the cube keep the prices as traded
+    assert store.read_prices(3)["close"].tolist() == [53.0, 52.0, 102.0, 100.0]
+    cube = cube.update(store)
+    np.testing.assert_array_equal(cube["close"][:, 0], [100.0, 102.0, 52.0, 53.0])
+
+    adjuster = SplitAdjuster(api)
+    adjuster.refresh()
+    panel = adjuster.adjust_panel(cube.panel())
+    np.testing.assert_array_equal(panel["close"][:, 0], [50.0, 51.0, 52.0, 53.0])
+    np.testing.assert_array_equal(panel["volume"][:, 0], [200.0, 200.0, 100.0, 100.0])
+    adjusted = adjuster.adjust(store.read_prices(3), 3)
+    assert adjusted["close"].tolist() == [53.0, 52.0, 51.0, 50.0]
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+from borsdata.borsdata_api import BorsdataAPI
+from borsdata.cache import ResponseCache
+from borsdata.rate_limiter import TokenBucket
+from borsdata.streaming import ColumnBuffer, SharedStream, iter_array_items
+
+
+def _report(year, period):
+    return {"year": year, "period": period, "revenues": 100.5 if period != 2 else None,
+            "earnings_Per_Share": 1.5, "report_Date": "2023-05-01T00:00:00" if period != 3 else None}
+
+
+def _report_list(params):
+    ins_ids = [int(ins_id) for ins_id in params["instList"].split(",")]
+    return {"reportList": [{"instrument": ins_id,
+                            "reportsQuarter": [_report(2023, period) for period in (1, 2, 3, 4)],
+                            "reportsYear": [_report(2023, 5)],
+                            "reportsR12": [] if ins_id == 2 else [_report(2023, 4)]} for ins_id in ins_ids]}
+
+
+def test_iter_array_items_across_chunk_boundaries():
+    body = b'{"kpiId": 1, "reportList": [ {"a": [1, 2]}, {"b": "\xc3\xa5"} ,{"c": {}}]}'
+    chunks = [body[i:i + 3] for i in range(0, len(body), 3)]
+    assert list(iter_array_items(chunks, "reportList")) == [{"a": [1, 2]}, {"b": "å"}, {"c": {}}]
+
+
+def test_iter_array_items_with_escapes_split_across_chunks():
+    body = b'{"list": [{"s": "a\\"}]\\\\", "t": ["{", 1]}, "x\\"y", 12, true]}'
+    items = list(iter_array_items([body[i:i + 1] for i in range(len(body))], "list"))
+    assert items == [{"s": 'a"}]\\', "t": ["{", 1]}, 'x"y', 12, True]
+
+
+def test_shared_stream_keeps_chunks_for_all_readers_and_closes_once():
+    closed = []
+    stream = SharedStream(iter([b"a", b"b", b"c"]), close=lambda: closed.append(True))
+    stream.share(2)
+    first, second = stream.reader(), stream.reader()
+    assert next(first) == b"a" and next(first) == b"b"
+    assert list(second) == [b"a", b"b", b"c"]
+    assert not closed
+    # the first reader stops early, the response is closed now that both are done
+    first.close()
+    assert closed == [True]
+
+
+def test_streamed_calls_are_cached(fake_transport, tmp_path):
+    transport = fake_transport({"instruments/reports": _report_list})
+    api = BorsdataAPI("key", transport=transport, limiter=TokenBucket(1000, 1000), cache=ResponseCache(tmp_path))
+    first = api.get_instrument_report_list([1, 2], stream=True)
+    second = api.get_instrument_report_list([1, 2], stream=True)
+    assert len(transport.calls) == 1
+    for df_first, df_second in zip(first, second):
+        pd.testing.assert_frame_equal(df_first, df_second)
+
+
+def test_column_buffer_with_many_missing_values():
+    buffer = ColumnBuffer()
+    buffer.append(1)
+    buffer.append(None)
+    # converted to float64 once, later floats and nulls are appended in place
+    data = buffer._data
+    values = [None if i % 3 else i * 0.5 for i in range(80_000)]
+    for value in values:
+        buffer.append(value)
+    assert buffer._data is data and data.typecode == "d"
+    expected = np.array([1.0, np.nan] + [np.nan if value is None else value for value in values])
+    np.testing.assert_array_equal(buffer.to_numpy(), expected)
+
+
+def test_streamed_report_list_matches_json_normalize(fake_transport):
+    api = BorsdataAPI("key", transport=fake_transport({"instruments/reports": _report_list}),
+                      limiter=TokenBucket(1000, 1000))
+    ins_ids = list(range(1, 60))
+    streamed = api.get_instrument_report_list(ins_ids, stream=True)
+    decoded = api.get_instrument_report_list(ins_ids)
+    report_list = _report_list({"instList": "1"})["reportList"] + _report_list({"instList": ",".join(map(str, ins_ids[1:]))})["reportList"]
+    for df_streamed, df_decoded, report_type in zip(streamed, decoded, ["reportsQuarter", "reportsYear", "reportsR12"]):
+        reference = pd.json_normalize(report_list, record_path=report_type, meta=["instrument"])
+        reference = reference.rename(columns=str.lower).rename(columns={"instrument": "stock_id"})
+        reference = reference.infer_objects().fillna(0).infer_objects()
+        pd.testing.assert_frame_equal(df_decoded, reference)
+        pd.testing.assert_frame_equal(df_streamed, reference)
+
+
+def test_streamed_stock_prices_list(fake_transport):
+    def stock_prices_list(params):
+        return {"stockPricesArrayList": [{"instrument": int(ins_id), "stockPricesList": [
+            {"d": "2024-01-02", "c": 1.0, "h": 1.5, "l": 0.5, "o": 1, "v": 10},
+            {"d": "2024-01-03", "c": None, "h": 1.5, "l": 0.5, "o": 1, "v": 10}]} for ins_id in params["instList"].split(",")]}
+    api = BorsdataAPI("key", transport=fake_transport({"instruments/stockprices": stock_prices_list}),
+                      limiter=TokenBucket(1000, 1000))
+    pd.testing.assert_frame_equal(api.get_instrument_stock_prices_list([1, 2, 3], stream=True),
+                                  api.get_instrument_stock_prices_list([1, 2, 3]))
@@ -0,0 +1,17 @@
+from borsdata.borsdata_api import BorsdataAPI
+from borsdata.transport import HttpTransport
+
+
+def test_api_uses_injected_transport(fake_transport):
+    transport = fake_transport({"branches": {"branches": [{"id": 2, "name": "B"}, {"id": 1, "name": "A"}]}})
+    with BorsdataAPI("key", transport=transport) as api:
+        branches = api.get_branches()
+    assert list(branches.index) == [1, 2]
+    assert transport.calls[0][1]["authKey"] == "key"
+    assert transport.closed
+
+
+def test_http_transport_negotiates_compression():
+    with HttpTransport(pool_size=4) as transport:
+        assert transport._session.headers["Accept-Encoding"] == "gzip, deflate"
+        assert transport._session.get_adapter("https://apiservice.borsdata.se")._pool_maxsize == 4
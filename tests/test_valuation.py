@@ -0,0 +1,58 @@
+import math
+from borsdata.borsdata_api import BorsdataAPI
+from borsdata.rate_limiter import TokenBucket
+from borsdata.valuation import ValuationSeries
+
+DATES = ["2024-02-19", "2024-02-20", "2024-02-21", "2024-05-20", "2024-05-21"]
+
+
+def _r12(year, period, profit, report_date):
+    return {"year": year, "period": period, "revenues": 400.0, "operating_Income": 50.0, "profit_To_Equity_Holders": profit,
+            "net_Debt": 100.0, "number_Of_Shares": 10.0, "report_Date": report_date}
+
+
+def _routes(reports, last_date):
+    def stock_prices(params):
+        dates = [date for date in DATES if params.get("from", "") <= date <= last_date[0]]
+        return {"stockPricesArrayList": [{"instrument": int(ins_id), "stockPricesList": [
+            {"d": date, "c": 20.0, "h": 20.0, "l": 20.0, "o": 20.0, "v": 1} for date in dates]}
+            for ins_id in params["instList"].split(",")]}
+
+    def report_list(params):
+        return {"reportList": [{"instrument": int(ins_id), "reportsQuarter": [], "reportsYear": [],
+                                "reportsR12": reports.get(int(ins_id), [])} for ins_id in params["instList"].split(",")]}
+    return {"instruments/stockprices": stock_prices, "instruments/reports": report_list}
+
+
+def test_reports_are_joined_as_of_their_release(fake_transport):
+    reports = {3: [_r12(2023, 4, 40.0, "2024-02-20T00:00:00"), _r12(2023, 3, 20.0, "2023-11-10T00:00:00")]}
+    last_date = ["2024-02-21"]
+    transport = fake_transport(_routes(reports, last_date))
+    series = ValuationSeries(BorsdataAPI("key", transport=transport, limiter=TokenBucket(1000, 1000)))
+    valuations = series.update([3])
+    # market cap 20 * 10 = 200, the Q4 report counts from its release day on
+    assert valuations["pe"].tolist() == [10.0, 5.0, 5.0]
+    assert valuations["ps"].tolist() == [0.5] * 3
+    assert valuations["ev_ebit"].tolist() == [6.0] * 3
+
+    # a new trading day and a new report, only days after the cached ones are fetched
+    reports[3].insert(0, _r12(2024, 1, -10.0, "2024-05-21T00:00:00"))
+    last_date[0] = "2024-05-21"
+    valuations = series.update([3])
+    assert [params.get("from") for url, params in transport.calls if url.endswith("stockprices")] == [None, "2024-02-22"]
+    assert valuations["pe"].tolist()[:4] == [10.0, 5.0, 5.0, 5.0]
+    assert math.isnan(valuations["pe"].iloc[-1])
+
+
+def test_partial_update_does_not_skip_days(fake_transport):
+    reports = {3: [_r12(2023, 3, 20.0, "2023-11-10T00:00:00")], 4: [_r12(2023, 3, 20.0, "2023-11-10T00:00:00")]}
+    last_date = ["2024-02-19"]
+    transport = fake_transport(_routes(reports, last_date))
+    series = ValuationSeries(BorsdataAPI("key", transport=transport, limiter=TokenBucket(1000, 1000)))
+    series.update([3, 4])
+    last_date[0] = "2024-02-21"
+    series.update([3])
+    valuations = series.update([3, 4])
+    # instrument 4 is fetched from the day after its own last day
+    assert transport.calls[-2][1]["from"] == "2024-02-20"
+    assert valuations.groupby("stock_id")["date"].count().tolist() == [3, 3]
@@ -0,0 +1,45 @@
+import pandas as pd
+
+from borsdata import constants
+from borsdata.borsdata_api import BorsdataAPI
+from borsdata.borsdata_client import BorsdataClient
+from borsdata.mock_server import MockBorsdataServer
+from borsdata.rate_limiter import TokenBucket
+from borsdata.warehouse import Warehouse, column_name
+
+
+def test_column_name():
+    assert column_name("insId") == "ins_id"
+    assert column_name("stock_id") == "ins_id"
+    assert column_name("profit_To_Equity_Holders") == "profit_to_equity_holders"
+
+
+def test_sync_is_incremental(tmp_path, monkeypatch):
+    monkeypatch.setattr(constants, "EXPORT_PATH", f"{tmp_path}/exports/")
+    with MockBorsdataServer(universe_size=20) as server:
+        api = BorsdataAPI("key", url_root=server.url_root, limiter=TokenBucket(1000, 1000))
+        warehouse = Warehouse(str(tmp_path), api)
+        assert warehouse.last_sync("metadata") is None
+        warehouse.sync_metadata()
+        instruments = warehouse.instruments(market="Large Cap", country="Sverige")
+        assert set(instruments["market"]) == {"Large Cap"} and set(instruments["country"]) == {"Sverige"}
+        ins_ids = instruments["ins_id"].tolist()[:3]
+
+        assert warehouse.sync_stock_prices(ins_ids) > 0
+        # nothing newer than the stored days
+        assert warehouse.sync_stock_prices(ins_ids) == 0
+        prices = warehouse.query("SELECT ins_id, COUNT(*) AS days FROM stock_prices GROUP BY ins_id")
+        assert prices["ins_id"].tolist() == sorted(ins_ids)
+
+        # loading again updates the rows in place
+        rows = warehouse.sync_reports(ins_ids)
+        assert warehouse.sync_reports(ins_ids) == rows
+        assert warehouse.query("SELECT COUNT(*) AS n FROM reports")["n"][0] == rows
+        warehouse.sync_kpi_history(ins_ids, 2, "year", "mean")
+        assert set(warehouse.query("SELECT DISTINCT ins_id FROM kpi_history")["ins_id"]) == set(ins_ids)
+        assert warehouse.sync_kpi_values(2, "1year", "latest") > 0
+
+        expected = BorsdataClient(api).top_performers("Large Cap", "Sverige", 5, 20)
+        top = BorsdataClient(api, warehouse=warehouse).top_performers("Large Cap", "Sverige", 5, 20)
+        pd.testing.assert_frame_equal(top, expected)
+        warehouse.close()